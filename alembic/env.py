@@ -14,11 +14,17 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Use the application's (synchronous) connection string; the API's async engine is
+# built from the same setting, Alembic keeps running on the sync driver
+from app.Core.config import Database_Connection  # noqa: E402
+from app.Database.database import Base  # noqa: E402
+from app.Database.models import model  # noqa: E402,F401  (registers the tables)
+
+config.set_main_option("sqlalchemy.url", Database_Connection.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -0,0 +1,38 @@
+"""add download_history.file_path
+
+Revision ID: 3f9c2a7d1b40
+Revises:
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7d1b40"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables are created by the application on startup (Base.metadata.create_all);
+    # only databases created before this column existed need it added
+    if context.is_offline_mode():
+        op.add_column("download_history", sa.Column("file_path", sa.Text()))
+        return
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("download_history"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("download_history")}
+    if "file_path" not in columns:
+        op.add_column("download_history", sa.Column("file_path", sa.Text()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("download_history", "file_path")
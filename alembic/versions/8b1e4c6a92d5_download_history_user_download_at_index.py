@@ -0,0 +1,47 @@
+"""index download_history on (user_id, download_at DESC)
+
+Revision ID: 8b1e4c6a92d5
+Revises: 3f9c2a7d1b40
+Create Date: 2026-10-18 10:31:07.902615
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8b1e4c6a92d5"
+down_revision: Union[str, None] = "3f9c2a7d1b40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # On a fresh database the table (and this index) is created by the application
+    if not context.is_offline_mode() and not sa.inspect(op.get_bind()).has_table(
+        "download_history"
+    ):
+        return
+    # Build the index without locking writes on a large table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_download_history_user_id_download_at",
+            "download_history",
+            ["user_id", sa.text("download_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_download_history_user_id_download_at",
+            table_name="download_history",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
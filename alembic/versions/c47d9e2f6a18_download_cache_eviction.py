@@ -0,0 +1,66 @@
+"""download_cache eviction columns and file_path index
+
+Revision ID: c47d9e2f6a18
+Revises: 8b1e4c6a92d5
+Create Date: 2026-10-18 14:02:55.481337
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c47d9e2f6a18"
+down_revision: Union[str, None] = "8b1e4c6a92d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # On a fresh database the table is created by the application with these columns
+    columns = {"accurate_trim", "evicted_at"}
+    if not context.is_offline_mode():
+        inspector = sa.inspect(op.get_bind())
+        if not inspector.has_table("download_cache"):
+            return
+        columns -= {
+            column["name"] for column in inspector.get_columns("download_cache")
+        }
+
+    if "accurate_trim" in columns:
+        op.add_column(
+            "download_cache",
+            sa.Column(
+                "accurate_trim",
+                sa.Boolean(),
+                nullable=False,
+                server_default=sa.false(),
+            ),
+        )
+    if "evicted_at" in columns:
+        op.add_column("download_cache", sa.Column("evicted_at", sa.DateTime()))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_download_cache_file_path",
+            "download_cache",
+            ["file_path"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_download_cache_file_path",
+            table_name="download_cache",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("download_cache", "evicted_at")
+    op.drop_column("download_cache", "accurate_trim")
@@ -0,0 +1,245 @@
+"""key video_metadata by YouTube video ID and merge duplicates
+
+Revision ID: e2b7c9a4d1f3
+Revises: c47d9e2f6a18
+Create Date: 2026-10-18 17:46:12.530918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b7c9a4d1f3"
+down_revision: Union[str, None] = "c47d9e2f6a18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Seconds from the old duration strings ("3m43s", or "HH:MM:SS"); 0 if unparseable
+def duration_seconds(column: str) -> str:
+    return f"""
+        CASE
+            WHEN {column} ~ '^[0-9]+m[0-9]+s$' THEN
+                split_part({column}, 'm', 1)::int * 60
+                + rtrim(split_part({column}, 'm', 2), 's')::int
+            WHEN {column} ~ '^[0-9]+:[0-9]{{2}}:[0-9]{{2}}$' THEN
+                extract(epoch FROM {column}::interval)::int
+            ELSE 0
+        END
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not context.is_offline_mode():
+        inspector = sa.inspect(op.get_bind())
+        # On a fresh database the tables are created by the application in the new form
+        if not inspector.has_table("video_metadata"):
+            return
+        columns = {column["name"] for column in inspector.get_columns("video_metadata")}
+        if "user_id" not in columns:
+            return
+
+    # 1. The YouTube ID of every old row: from the thumbnail URL (i.ytimg.com/vi/<id>/),
+    #    else from the URL of a download that used it; rows where neither gives an ID
+    #    keep their own id, so their history stays attached
+    op.add_column("video_metadata", sa.Column("youtube_id", sa.String()))
+    op.execute("""
+        UPDATE video_metadata m
+        SET youtube_id = coalesce(
+            substring(m.thumbnail_url FROM '/vi[_a-z]*/([A-Za-z0-9_-]{11})/'),
+            (
+                SELECT coalesce(
+                    substring(h.url FROM '[?&]v=([A-Za-z0-9_-]{11})'),
+                    substring(h.url FROM 'youtu[.]be/([A-Za-z0-9_-]{11})')
+                )
+                FROM download_history h
+                WHERE h.video_id = m.id
+                LIMIT 1
+            ),
+            m.id::text
+        )
+        """)
+
+    # 2. One row per video: the counters of its latest row, the date it was first seen
+    op.create_table(
+        "video_metadata_merged",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("duration", sa.Integer(), nullable=False),
+        sa.Column("views", sa.BigInteger(), nullable=False),
+        sa.Column("likes", sa.BigInteger()),
+        sa.Column("channel", sa.String(), nullable=False),
+        sa.Column("thumbnail_url", sa.String(), nullable=False),
+        sa.Column("published_date", sa.Date(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.execute(f"""
+        INSERT INTO video_metadata_merged
+        SELECT DISTINCT ON (youtube_id)
+            youtube_id,
+            title,
+            {duration_seconds("duration")},
+            views,
+            likes,
+            channel,
+            thumbnail_url,
+            CASE
+                WHEN published_date ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}'
+                THEN left(published_date, 10)::date
+                ELSE DATE '1970-01-01'
+            END,
+            created_at,
+            min(created_at) OVER (PARTITION BY youtube_id)
+        FROM video_metadata
+        ORDER BY youtube_id, created_at DESC NULLS LAST
+        """)
+
+    # 3. Point the history at the merged rows
+    op.drop_constraint(
+        "download_history_video_id_fkey", "download_history", type_="foreignkey"
+    )
+    op.add_column("download_history", sa.Column("youtube_id", sa.String()))
+    op.execute("""
+        UPDATE download_history h
+        SET youtube_id = m.youtube_id
+        FROM video_metadata m
+        WHERE m.id = h.video_id
+        """)
+    op.drop_column("download_history", "video_id")
+    op.alter_column(
+        "download_history", "youtube_id", new_column_name="video_id", nullable=False
+    )
+
+    op.drop_table("video_metadata")
+    op.rename_table("video_metadata_merged", "video_metadata")
+    op.execute("ALTER INDEX video_metadata_merged_pkey RENAME TO video_metadata_pkey")
+    op.create_foreign_key(
+        "download_history_video_id_fkey",
+        "download_history",
+        "video_metadata",
+        ["video_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+    # 4. Cached metadata is copied into new results: give it the new id and duration
+    if context.is_offline_mode() or sa.inspect(op.get_bind()).has_table(
+        "download_cache"
+    ):
+        op.execute(f"""
+            UPDATE download_cache
+            SET video_metadata = video_metadata || jsonb_build_object(
+                'id',
+                video_id,
+                'duration',
+                CASE
+                    WHEN jsonb_typeof(video_metadata -> 'duration') = 'string'
+                    THEN to_jsonb({duration_seconds("(video_metadata ->> 'duration')")})
+                    ELSE video_metadata -> 'duration'
+                END
+            )
+            WHERE video_metadata ->> 'id' IS DISTINCT FROM video_id
+                OR jsonb_typeof(video_metadata -> 'duration') = 'string'
+            """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Back to one metadata row per download, owned by the user who downloaded it (the
+    # counters are those of the merged row). Metadata of videos nobody downloaded
+    # (lookups through /metadata) had no place in the old schema and is dropped.
+    op.create_table(
+        "video_metadata_split",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("duration", sa.String(), nullable=False),
+        sa.Column("views", sa.Integer(), nullable=False),
+        sa.Column("likes", sa.Integer()),
+        sa.Column("channel", sa.String(), nullable=False),
+        sa.Column("thumbnail_url", sa.String(), nullable=False),
+        sa.Column("published_date", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "download_history",
+        sa.Column(
+            "metadata_id",
+            postgresql.UUID(as_uuid=True),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+    )
+    op.execute("""
+        INSERT INTO video_metadata_split
+        SELECT
+            h.metadata_id,
+            m.title,
+            to_char(make_interval(secs => m.duration), 'HH24:MI:SS'),
+            least(m.views, 2147483647),
+            least(m.likes, 2147483647),
+            coalesce(m.channel, ''),
+            coalesce(m.thumbnail_url, ''),
+            to_char(m.published_date, 'YYYY-MM-DD'),
+            coalesce(m.created_at, h.download_at),
+            h.user_id
+        FROM download_history h
+        JOIN video_metadata m ON m.id = h.video_id
+        """)
+
+    op.drop_constraint(
+        "download_history_video_id_fkey", "download_history", type_="foreignkey"
+    )
+    op.drop_column("download_history", "video_id")
+    op.alter_column(
+        "download_history",
+        "metadata_id",
+        new_column_name="video_id",
+        server_default=None,
+    )
+
+    op.drop_table("video_metadata")
+    op.rename_table("video_metadata_split", "video_metadata")
+    op.execute("ALTER INDEX video_metadata_split_pkey RENAME TO video_metadata_pkey")
+    op.execute(
+        "ALTER TABLE video_metadata RENAME CONSTRAINT "
+        "video_metadata_split_user_id_fkey TO video_metadata_user_id_fkey"
+    )
+    op.create_foreign_key(
+        "download_history_video_id_fkey",
+        "download_history",
+        "video_metadata",
+        ["video_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+    # Cached metadata goes back to duration strings (its id is not used by the old code)
+    if context.is_offline_mode() or sa.inspect(op.get_bind()).has_table(
+        "download_cache"
+    ):
+        op.execute("""
+            UPDATE download_cache
+            SET video_metadata = jsonb_set(
+                video_metadata,
+                '{duration}',
+                to_jsonb(
+                    to_char(
+                        make_interval(secs => (video_metadata ->> 'duration')::int),
+                        'HH24:MI:SS'
+                    )
+                )
+            )
+            WHERE jsonb_typeof(video_metadata -> 'duration') = 'number'
+            """)
@@ -0,0 +1,247 @@
+import time
+import uuid
+import random
+import threading
+from typing import Optional
+from redis.exceptions import RedisError
+from ...Core.config import (
+    AUDIO_FRAGMENT_CONCURRENCY,
+    VIDEO_FRAGMENT_CONCURRENCY,
+    LARGE_FRAGMENT_CONCURRENCY,
+    BANDWIDTH_LIMIT_TOTAL,
+    AUDIO_BANDWIDTH_LIMIT,
+    VIDEO_BANDWIDTH_LIMIT,
+    LARGE_BANDWIDTH_LIMIT,
+    USER_BANDWIDTH_LIMIT,
+    CONNECTION_LIMIT_TOTAL,
+    USER_CONNECTION_LIMIT,
+)
+from ...Core.redis_client import get_redis
+from .scheduling import AUDIO_QUEUE, VIDEO_QUEUE, LARGE_QUEUE
+
+FRAGMENT_CONCURRENCY = {
+    AUDIO_QUEUE: AUDIO_FRAGMENT_CONCURRENCY,
+    VIDEO_QUEUE: VIDEO_FRAGMENT_CONCURRENCY,
+    LARGE_QUEUE: LARGE_FRAGMENT_CONCURRENCY,
+}
+QUEUE_BANDWIDTH_LIMITS = {
+    AUDIO_QUEUE: AUDIO_BANDWIDTH_LIMIT,
+    VIDEO_QUEUE: VIDEO_BANDWIDTH_LIMIT,
+    LARGE_QUEUE: LARGE_BANDWIDTH_LIMIT,
+}
+
+# Bytes downloaded between two token bucket calls (one Redis round trip per chunk)
+THROTTLE_CHUNK_BYTES = 1024 * 1024
+# Bucket capacity in seconds of traffic (how far a job can burst above the rate)
+BURST_SECONDS = 2
+
+# Connection slots are leased and renewed from the progress hook, so slots of a
+# crashed worker come back on their own
+CONNECTION_LEASE_MS = 120 * 1000
+CONNECTION_RENEW_SECONDS = 30
+# How long a job waits for a free connection before giving up (and being retried)
+CONNECTION_WAIT_SECONDS = 30
+
+# Debit `n` bytes from every bucket in KEYS and return how long (ms) the caller has to
+# pause for the slowest bucket to be back in credit. Buckets refill continuously at
+# their rate (ARGV: n, then rate and capacity per key) and may go into debt, so
+# concurrent jobs share the rate without a retry loop.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local n = tonumber(ARGV[1])
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate / 1000) - n
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 60000)
+    if tokens < 0 then
+        wait = math.max(wait, -tokens * 1000 / rate)
+    end
+end
+return math.ceil(wait)
+"""
+
+# Take up to ARGV[3] connection slots from every semaphore in KEYS (sorted sets of
+# leased slots scored by expiry; ARGV: holder, lease ms, wanted, then one limit per
+# key). Returns the number of slots granted, 0 when none is free.
+CONNECTION_ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local grant = tonumber(ARGV[3])
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    grant = math.min(grant, tonumber(ARGV[3 + i]) - redis.call('ZCARD', key))
+end
+if grant < 1 then
+    return 0
+end
+for _, key in ipairs(KEYS) do
+    for slot = 1, grant do
+        redis.call('ZADD', key, now + tonumber(ARGV[2]), ARGV[1] .. ':' .. slot)
+    end
+    redis.call('PEXPIRE', key, tonumber(ARGV[2]))
+end
+return grant
+"""
+
+# Push the expiry of a holder's slots forward (ARGV: holder, lease ms, slots)
+CONNECTION_RENEW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+for _, key in ipairs(KEYS) do
+    for slot = 1, tonumber(ARGV[3]) do
+        redis.call('ZADD', key, 'XX', now + tonumber(ARGV[2]), ARGV[1] .. ':' .. slot)
+    end
+    redis.call('PEXPIRE', key, tonumber(ARGV[2]))
+end
+return 1
+"""
+
+
+# Token buckets (key, bytes per second) that apply to a job; unlimited ones are left out
+def bandwidth_buckets(queue: Optional[str], user_id: Optional[str]) -> list:
+    buckets = [
+        ("bandwidth:total", BANDWIDTH_LIMIT_TOTAL),
+        (f"bandwidth:queue:{queue}", QUEUE_BANDWIDTH_LIMITS.get(queue, 0)),
+    ]
+    if user_id:
+        buckets.append((f"bandwidth:user:{user_id}", USER_BANDWIDTH_LIMIT))
+    return [(key, rate) for key, rate in buckets if rate > 0]
+
+
+# Connection semaphores (key, limit) that apply to a job
+def connection_semaphores(user_id: Optional[str]) -> list:
+    semaphores = [("connections:total", CONNECTION_LIMIT_TOTAL)]
+    if user_id:
+        semaphores.append((f"connections:user:{user_id}", USER_CONNECTION_LIMIT))
+    return [(key, limit) for key, limit in semaphores if limit > 0]
+
+
+# Debit downloaded bytes from the buckets; returns the pause in seconds
+def consume(buckets: list, n: int) -> float:
+    args = [n]
+    for _, rate in buckets:
+        args += [rate, rate * BURST_SECONDS]
+    try:
+        wait_ms = get_redis().eval(
+            TOKEN_BUCKET_SCRIPT, len(buckets), *[key for key, _ in buckets], *args
+        )
+    except RedisError:
+        # The limits are a shared budget, not a safety mechanism: fail open
+        return 0.0
+    return wait_ms / 1000
+
+
+# Bandwidth and connection budget of one download job.
+# `acquire()` takes up to `fragments` connection slots before the download starts
+# (the job then downloads that many fragments in parallel) and `hook` is registered
+# as a yt-dlp progress hook: it debits the bytes downloaded so far from the token
+# buckets and sleeps when the job is over its share. Hooks run on the download
+# threads, so a pause slows exactly the connections that used the bandwidth.
+class DownloadBudget:
+    def __init__(self, queue: Optional[str], user_id: Optional[str], fragments: int):
+        self.buckets = bandwidth_buckets(queue, user_id)
+        self.semaphores = connection_semaphores(user_id)
+        self.fragments = max(1, fragments)
+        self.holder = uuid.uuid4().hex
+        self.slots = 0
+        self._downloaded = {}
+        self._pending = 0
+        self._renewed_at = 0.0
+        self._lock = threading.Lock()
+
+    # Returns the number of connections the job may open, 0 if none came free in time
+    def acquire(self) -> int:
+        if not self.semaphores:
+            self.slots = self.fragments
+            return self.slots
+
+        keys = [key for key, _ in self.semaphores]
+        limits = [limit for _, limit in self.semaphores]
+        deadline = time.monotonic() + CONNECTION_WAIT_SECONDS
+        while True:
+            try:
+                self.slots = get_redis().eval(
+                    CONNECTION_ACQUIRE_SCRIPT,
+                    len(keys),
+                    *keys,
+                    self.holder,
+                    CONNECTION_LEASE_MS,
+                    self.fragments,
+                    *limits,
+                )
+            except RedisError:
+                self.semaphores = []
+                self.slots = self.fragments
+            if self.slots or time.monotonic() >= deadline:
+                self._renewed_at = time.monotonic()
+                return self.slots
+            time.sleep(0.5 + random.random())
+
+    def release(self) -> None:
+        if not self.semaphores or not self.slots:
+            return
+        members = [f"{self.holder}:{slot}" for slot in range(1, self.slots + 1)]
+        try:
+            with get_redis().pipeline() as pipe:
+                for key, _ in self.semaphores:
+                    pipe.zrem(key, *members)
+                pipe.execute()
+        except RedisError:
+            pass
+        self.slots = 0
+
+    def renew(self) -> None:
+        try:
+            get_redis().eval(
+                CONNECTION_RENEW_SCRIPT,
+                len(self.semaphores),
+                *[key for key, _ in self.semaphores],
+                self.holder,
+                CONNECTION_LEASE_MS,
+                self.slots,
+            )
+        except RedisError:
+            pass
+
+    def hook(self, d: dict) -> None:
+        if d["status"] != "downloading":
+            return
+        with self._lock:
+            # downloaded_bytes is cumulative per file; charge only what is new
+            name = d.get("tmpfilename") or d.get("filename")
+            downloaded = d.get("downloaded_bytes") or 0
+            delta = downloaded - self._downloaded.get(name, 0)
+            self._downloaded[name] = downloaded
+            if delta > 0:
+                self._pending += delta
+
+            renew = (
+                self.semaphores
+                and self.slots
+                and time.monotonic() - self._renewed_at > CONNECTION_RENEW_SECONDS
+            )
+            if renew:
+                self._renewed_at = time.monotonic()
+
+            n = 0
+            if self.buckets and self._pending >= THROTTLE_CHUNK_BYTES:
+                n, self._pending = self._pending, 0
+
+        if renew:
+            self.renew()
+        if n:
+            wait = consume(self.buckets, n)
+            if wait > 0:
+                time.sleep(wait)
+
+
+# Parallel fragment downloads for jobs on a queue (unknown queues use the video setting)
+def fragment_concurrency(queue: Optional[str]) -> int:
+    return FRAGMENT_CONCURRENCY.get(queue, VIDEO_FRAGMENT_CONCURRENCY)
@@ -1,53 +1,459 @@
 import os
+import time
 import uuid
+import shutil
+import http.client
 from yt_dlp import YoutubeDL
-from datetime import datetime
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import download_range_func, ContentTooShortError, ExtractorError
 from typing import Optional
-from celery import shared_task
-from fastapi import HTTPException
-from ...Core.config import MAX_DURATION, MAX_SIZE
-import subprocess
+from celery import shared_task, group, chord, current_task
+from celery.utils.log import get_task_logger
+from ...Core.config import (
+    MAX_DURATION,
+    MAX_SIZE,
+    PLAYLIST_MAX_ENTRIES,
+    DOWNLOAD_DIR,
+    DOWNLOAD_MAX_RETRIES,
+    DOWNLOAD_RETRY_BACKOFF,
+    DOWNLOAD_RETRY_BACKOFF_MAX,
+)
+from ...Utils.utils import (
+    extract_video_id,
+    canonical_video_url,
+    is_playlist_url,
+    to_seconds,
+    clip_range,
+)
+from ...Core import metrics
+from . import (
+    bandwidth,
+    download_cache,
+    info_cache,
+    janitor,
+    progress,
+    scheduling,
+    storage,
+    transcode,
+    video_metadata,
+)
+
+logger = get_task_logger(__name__)
 
 # Mapping of quality labels to video height (used by yt_dlp for filterin
 QUALITY_MAP = {"360p": 360, "480p": 480, "720p": 720, "1080p": 1080, "4k": 2160}
 
-# Save to Desktop/Downloads
-# Set base download directory to the user's Downloads folder
-# BASE_DOWNLOAD_DIR = os.path.expanduser("~/Downloads")
-# os.makedirs(BASE_DOWNLOAD_DIR, exist_ok=True)
-BASE_DOWNLOAD_DIR = r"C:\Users\cheta\Downloads"  # Host machine Downloads folder
-os.makedirs(BASE_DOWNLOAD_DIR, exist_ok=True)
+# Stream-copy audio formats and the yt-dlp selection of a track already in that codec
+AUDIO_PASSTHROUGH = {
+    "m4a": "bestaudio[ext=m4a]/bestaudio/best",
+    "opus": "bestaudio[acodec=opus]/bestaudio/best",
+}
+
+
+# HTTP statuses worth retrying (403: the signed media URLs have expired)
+TRANSIENT_HTTP_STATUSES = {403, 408, 425, 429, 500, 502, 503, 504}
+
+
+# A failure that is worth retrying (network errors, throttling, server errors)
+class TransientDownloadError(RuntimeError):
+    pass
+
+
+# A failure that will not go away by retrying (limits, unavailable videos, bad input)
+class PermanentDownloadError(RuntimeError):
+    pass
+
+
+# Download tasks retry transient failures with exponential backoff and full jitter
+RETRY_OPTIONS = {
+    "autoretry_for": (TransientDownloadError,),
+    "max_retries": DOWNLOAD_MAX_RETRIES,
+    "retry_backoff": DOWNLOAD_RETRY_BACKOFF,
+    "retry_backoff_max": DOWNLOAD_RETRY_BACKOFF_MAX,
+    "retry_jitter": True,
+}
 
 
 # Define a Celery task for downloading videos (supports individual videos or playlists)
 # @celery_app.task(name="app.Core.Service.download.download_video")
-@shared_task
+@shared_task(bind=True, **RETRY_OPTIONS)
 def download_video(
+    self,
     url: str,
     quality: str = "1080p",
     file_format: str = "mp4",
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+    user_id: Optional[str] = None,
 ) -> list:  # tuple
-    extension = "mp3" if file_format == "mp3" else file_format
-    output_path = os.path.join(BASE_DOWNLOAD_DIR, "%(id)s.%(ext)s")
+    # mp3: fetch the m4a track here (I/O-bound) and hand the encoding over to the
+    # transcode queue; the replacement keeps this job's ID and callbacks
+    if file_format == transcode.MP3:
+        cached = cached_download(
+            url, file_format, quality, *clip_range(start_time, end_time, accurate_trim)
+        )
+        if cached:
+            return cached
+        source = run_download(
+            self,
+            url,
+            quality,
+            transcode.MP3_SOURCE_FORMAT,
+            start_time,
+            end_time,
+            accurate_trim,
+            user_id=user_id,
+        )
+        priority = (self.request.delivery_info or {}).get("priority") or 0
+        return self.replace(
+            transcode_audio.s(
+                source, url, quality, start_time, end_time, accurate_trim
+            ).set(queue=scheduling.TRANSCODE_QUEUE, priority=priority)
+        )
+
+    return run_download(
+        self,
+        url,
+        quality,
+        file_format,
+        start_time,
+        end_time,
+        accurate_trim,
+        user_id=user_id,
+    )
+
+
+# Run fetch_video in the task's work directory, named after the task ID so a retry of
+# the job finds the .part files and fragments of the previous attempt and resumes
+# them. The directory is removed once the job has finished one way or the other.
+def run_download(task, *args, user_id: Optional[str] = None) -> list:
+    work_dir = os.path.join(storage.WORK_DIR, task.request.id or str(uuid.uuid4()))
+    queue = (task.request.delivery_info or {}).get("routing_key")
+    finished = True
+    try:
+        return fetch_video(
+            *args,
+            work_dir=work_dir,
+            user_id=user_id,
+            queue=queue,
+            job_id=progress.job_id_of(task),
+        )
+    except TransientDownloadError:
+        finished = task.request.retries >= task.max_retries
+        raise
+    finally:
+        if finished:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# Define a Celery task for playlists: probe the list once, then fan every entry out
+# as its own task so the whole worker pool downloads the playlist in parallel
+@shared_task(bind=True)
+def download_playlist(
+    self,
+    url: str,
+    quality: str = "1080p",
+    file_format: str = "mp4",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+    user_id: Optional[str] = None,
+):
+    # Flat extraction only lists the entries, formats are resolved by each entry task
+    ydl_opts = {
+        "extract_flat": "in_playlist",
+        "noplaylist": False,
+        "quiet": True,
+        "playlistend": PLAYLIST_MAX_ENTRIES,
+    }
+    try:
+        with YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise RuntimeError(f"Download failed: {str(e)}")
+
+    if not info:
+        raise RuntimeError("Failed to extract playlist information.")
+
+    entries = [entry for entry in info.get("entries") or [info] if entry]
+    entry_urls = [
+        entry.get("url") or canonical_video_url(entry.get("id"))
+        for entry in entries[:PLAYLIST_MAX_ENTRIES]
+    ]
+    if not entry_urls:
+        raise RuntimeError("Playlist has no downloadable entries.")
+
+    # Entries rank behind the user's other queued jobs, one priority step per entry,
+    # so a long playlist is interleaved with other users' jobs instead of blocking them.
+    # mp3 entries fetch the m4a track and are encoded by a chained transcode task.
+    priority = (self.request.delivery_info or {}).get("priority") or 0
+    fetch_format = (
+        transcode.MP3_SOURCE_FORMAT if file_format == transcode.MP3 else file_format
+    )
+    signatures = []
+    for index, entry_url in enumerate(entry_urls):
+        entry_priority = min(priority + 1 + index, scheduling.MAX_PRIORITY)
+        signature = download_playlist_entry.s(
+            entry_url,
+            quality,
+            fetch_format,
+            start_time,
+            end_time,
+            accurate_trim,
+            user_id=user_id,
+        ).set(
+            queue=scheduling.choose_queue(
+                entry_url, quality, file_format, start_time, end_time
+            ),
+            priority=entry_priority,
+        )
+        if file_format == transcode.MP3:
+            signature |= transcode_playlist_entry.s(
+                quality, start_time, end_time, accurate_trim
+            ).set(queue=scheduling.TRANSCODE_QUEUE, priority=entry_priority)
+        signatures.append(signature)
+
+    header = group(signatures)
+    # The chord takes over this task's ID and callbacks (e.g. record_download),
+    # so the job result becomes the aggregated playlist result
+    return self.replace(chord(header, collect_playlist.s(url)))
+
+
+# Define a Celery task for one playlist entry; transient failures are retried, final
+# failures are returned instead of raised so a single broken video does not fail
+# the whole playlist
+@shared_task(bind=True, **RETRY_OPTIONS)
+def download_playlist_entry(
+    self,
+    url: str,
+    quality: str = "1080p",
+    file_format: str = "mp4",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+    user_id: Optional[str] = None,
+) -> dict:
+    try:
+        result = run_download(
+            self,
+            url,
+            quality,
+            file_format,
+            start_time,
+            end_time,
+            accurate_trim,
+            user_id=user_id,
+        )
+        return {"url": url, "result": result, "error": None}
+    except TransientDownloadError as e:
+        if self.request.retries < self.max_retries:
+            raise
+        return {"url": url, "result": [], "error": str(e)}
+    except Exception as e:
+        return {"url": url, "result": [], "error": str(e)}
+
+
+# Define a Celery task that encodes fetched audio to mp3 (CPU-bound, transcode queue)
+@shared_task(bind=True)
+def transcode_audio(
+    self,
+    result: list,
+    url: str,
+    quality: str = "1080p",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+) -> list:
+    job_id = progress.job_id_of(self)
+    return [
+        encode_download(
+            url,
+            file_path,
+            metadata,
+            quality,
+            start_time,
+            end_time,
+            accurate_trim,
+            job_id=job_id,
+        )
+        for file_path, metadata in result
+    ]
+
+
+# Define a Celery task that encodes one playlist entry to mp3; like the entry task it
+# returns failures instead of raising them
+@shared_task(bind=True)
+def transcode_playlist_entry(
+    self,
+    entry_result: dict,
+    quality: str = "1080p",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+) -> dict:
+    if entry_result["error"]:
+        return entry_result
+    url = entry_result["url"]
+    job_id = progress.job_id_of(self)
+    try:
+        result = [
+            encode_download(
+                url,
+                file_path,
+                metadata,
+                quality,
+                start_time,
+                end_time,
+                accurate_trim,
+                job_id=job_id,
+            )
+            for file_path, metadata in entry_result["result"]
+        ]
+        return {"url": url, "result": result, "error": None}
+    except Exception as e:
+        return {"url": url, "result": [], "error": str(e)}
+
+
+# Encode a stored audio file to mp3, store the mp3 and index it in the download cache;
+# returns the (file_path, metadata) of the mp3
+def encode_download(
+    url: str,
+    file_path: str,
+    metadata: dict,
+    quality: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+    job_id: Optional[str] = None,
+) -> tuple:
+    start_time, end_time, accurate_trim = clip_range(
+        start_time, end_time, accurate_trim
+    )
+    cached = cached_download(
+        url, transcode.MP3, quality, start_time, end_time, accurate_trim
+    )
+    if cached:
+        return cached[0]
+
+    work_dir = os.path.join(storage.WORK_DIR, f"transcode-{uuid.uuid4().hex}")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        # S3 sources are downloaded into the work directory first
+        source = storage.fetch(file_path, work_dir)
+        target = os.path.join(work_dir, transcode.mp3_name(file_path))
+        started = time.perf_counter()
+        event = {"event": "postprocess", "postprocessor": transcode.MP3}
+        if job_id:
+            progress.publish(job_id, {**event, "status": "started"})
+        try:
+            cpu_seconds = transcode.encode_mp3(source, target)
+        except Exception:
+            metrics.DOWNLOADS_TOTAL.labels(transcode.MP3, quality, "failed").inc()
+            raise
+        if job_id:
+            progress.publish(job_id, {**event, "status": "finished"})
+        metrics.DOWNLOAD_PHASE_SECONDS.labels(
+            "transcode", transcode.MP3, quality
+        ).observe(time.perf_counter() - started)
+        metrics.TRANSCODE_CPU_SECONDS.observe(cpu_seconds)
+
+        mp3_path = os.path.join(DOWNLOAD_DIR, os.path.basename(target))
+        os.replace(target, mp3_path)
+        file_size = os.path.getsize(mp3_path)
+        mp3_location = storage.save(mp3_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    video_id = extract_video_id(url)
+    if video_id:
+        download_cache.store(
+            video_id,
+            transcode.MP3,
+            quality,
+            start_time,
+            end_time,
+            mp3_location,
+            file_size,
+            metadata,
+            accurate_trim,
+        )
+    metrics.DOWNLOAD_RESULT_BYTES.labels(transcode.MP3, quality).observe(file_size)
+    metrics.DOWNLOADS_TOTAL.labels(transcode.MP3, quality, "downloaded").inc()
+    janitor.check_budget()
+    return mp3_location, metadata
+
+
+# Define a Celery task that merges the entry results into the usual (file_path, metadata) list
+@shared_task
+def collect_playlist(entry_results: list, url: str) -> list:
     result = []
+    failed = []
+    for entry_result in entry_results:
+        result.extend(entry_result["result"])
+        if entry_result["error"]:
+            failed.append(f"{entry_result['url']}: {entry_result['error']}")
+
+    for failure in failed:
+        logger.warning("Playlist %s entry failed: %s", url, failure)
+
+    if not result:
+        raise RuntimeError(
+            f"Download failed: every playlist entry failed ({'; '.join(failed)})"
+        )
+
+    return result
 
-    # Define yt_dlp options based on file format
-    if file_format == "mp3":
+
+# Download a video (or playlist) and return a list of (file_path, metadata) tuples
+def fetch_video(
+    url: str,
+    quality: str = "1080p",
+    file_format: str = "mp4",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+    work_dir: Optional[str] = None,
+    user_id: Optional[str] = None,
+    queue: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> list:
+    if file_format == transcode.MP3:
+        raise RuntimeError(
+            "mp3 is encoded by transcode_audio; fetch transcode.MP3_SOURCE_FORMAT instead"
+        )
+    extension = file_format
+    start_time, end_time, accurate_trim = clip_range(
+        start_time, end_time, accurate_trim
+    )
+    # Name files per variant so different qualities of one video don't overwrite each other
+    variant = "audio" if file_format in scheduling.AUDIO_FORMATS else quality
+    if start_time:
+        # Clips get their own file, named after the requested range
+        variant += f".{start_time}-{end_time}".replace(":", "")
+        if accurate_trim:
+            variant += ".accurate"
+    output_path = f"%(id)s.{variant}.%(ext)s"
+    # Finished files go to DOWNLOAD_DIR, partial data to the job's work directory
+    paths = {"home": DOWNLOAD_DIR}
+    if work_dir:
+        paths["temp"] = work_dir
+    result = []
+
+    # Define yt_dlp options based on file format. Audio formats pick the track that
+    # already has the requested codec, so FFmpegExtractAudio only remuxes it (stream
+    # copy, no decode/encode); other tracks are only converted as a fallback.
+    if file_format in AUDIO_PASSTHROUGH:
         ydl_opts = {
-            "format": "bestaudio/best",
+            "format": AUDIO_PASSTHROUGH[file_format],
             "outtmpl": output_path,
+            "paths": paths,
             "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
+                {"key": "FFmpegExtractAudio", "preferredcodec": file_format}
             ],
             "noplaylist": False,
             "quiet": True,
-            "playlistend": 10,
+            "playlistend": PLAYLIST_MAX_ENTRIES,
         }
     else:
         if quality not in QUALITY_MAP:
@@ -67,17 +473,61 @@ def download_video(
         ydl_opts = {
             "format": format_string,
             "outtmpl": output_path,
+            "paths": paths,
             "merge_output_format": file_format,
             "noplaylist": False,
             "quiet": True,
-            "playlistend": 10,
+            "playlistend": PLAYLIST_MAX_ENTRIES,
         }
+
+    # Fetch only the fragments covering the requested range instead of the whole
+    # video; accurate mode re-encodes around the cuts so they land exactly on time
+    if start_time:
+        clip_start = to_seconds(start_time)
+        clip_end = to_seconds(end_time)
+        if clip_end <= clip_start:
+            raise RuntimeError("end_time must be after start_time.")
+        ydl_opts["download_ranges"] = download_range_func(
+            None, [(clip_start, clip_end)]
+        )
+        ydl_opts["force_keyframes_at_cuts"] = accurate_trim
+
+    # Serve single videos straight from the download cache when the variant is already on disk
+    cached = cached_download(
+        url, file_format, quality, start_time, end_time, accurate_trim
+    )
+    if cached:
+        return cached
+
+    # Take this job's share of the cluster's connection budget; every connection
+    # downloads one fragment in parallel, and bytes are metered by the budget's hook
+    budget = bandwidth.DownloadBudget(
+        queue, user_id, bandwidth.fragment_concurrency(queue)
+    )
+    connections = budget.acquire()
+    if not connections:
+        raise TransientDownloadError(
+            "Download failed: no download connection available"
+        )
+    ydl_opts["concurrent_fragment_downloads"] = connections
+
+    phase_seconds = metrics.DOWNLOAD_PHASE_SECONDS
     try:
         with YoutubeDL(ydl_opts) as ydl:
-            # Extract info without downloading to validate duration & size
-            check = ydl.extract_info(url, download=False)
-            if not check:
-                raise RuntimeError("Failed to extract video information.")
+            # Probe once (or reuse a cached probe) to validate duration & size;
+            # the same info dict is then handed to yt-dlp for the download
+            check = info_cache.get_info(url)
+            if check is None:
+                with phase_seconds.labels("probe", file_format, quality).time():
+                    check = ydl.extract_info(url, download=False)
+                if not check:
+                    raise RuntimeError("Failed to extract video information.")
+                check = ydl.sanitize_info(check)
+                info_cache.set_info(url, check)
+            else:
+                # Cached probes carry no format selection: select this request's
+                # formats (no network, the formats are in the cached dict)
+                check = ydl.process_ie_result(check, download=False)
 
             try:
                 max_duration = MAX_DURATION
@@ -89,24 +539,58 @@ def download_video(
             filesize = check.get("filesize") or 0
             duration = check.get("duration") or 0
 
+            # Only the clip is downloaded, so the limits apply to the clip
+            if start_time and duration:
+                clip_duration = min(clip_end, duration) - clip_start
+                filesize = filesize * max(clip_duration, 0) // duration
+                duration = clip_duration
+
             # Validate duration
             if duration > max_duration:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Video duration exceeds 5 hours. (Got {duration // 3600}h {duration % 3600 // 60}m)",
+                raise PermanentDownloadError(
+                    f"Video duration exceeds 5 hours. (Got {duration // 3600}h {duration % 3600 // 60}m)"
                 )
 
             # Validate file size
             if filesize > max_size:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Video file size exceeds 3 GB. (Got {filesize / (1024**3):.2f} GB)",
+                raise PermanentDownloadError(
+                    f"Video file size exceeds 3 GB. (Got {filesize / (1024**3):.2f} GB)"
                 )
-            # Proceed with download
-            info = ydl.extract_info(url, download=True)
+            # Single-file downloads without post-processing can be streamed to the
+            # client while yt-dlp is still writing them (see /jobs/{job_id}/file)
+            if is_streamable(check, file_format, start_time):
+                ydl.add_progress_hook(stream_path_hook())
+
+            # Time spent in post-processors (merge, audio extraction) is measured by
+            # hook; the rest of process_ie_result is the network fetch
+            postprocess_timer = PostprocessTimer()
+            ydl.add_postprocessor_hook(postprocess_timer.hook)
+            ydl.add_progress_hook(budget.hook)
+
+            # Progress events for /jobs/{job_id}/events (rate-limited in the hook)
+            if job_id:
+                publisher = progress.ProgressPublisher(job_id)
+                ydl.add_progress_hook(publisher.hook)
+                ydl.add_postprocessor_hook(publisher.postprocessor_hook)
+
+            # Proceed with download, reusing the probed info instead of extracting again
+            started = time.perf_counter()
+            info = ydl.process_ie_result(check, download=True)
+            elapsed = time.perf_counter() - started
             if not info:
                 raise RuntimeError("Failed to extract video information.")
 
+            # Clip requests are cut while fetching (download ranges), so their fetch
+            # is reported as the trim phase
+            fetch_phase = "trim" if start_time else "fetch"
+            phase_seconds.labels(fetch_phase, file_format, quality).observe(
+                max(0.0, elapsed - postprocess_timer.total)
+            )
+            if postprocess_timer.total:
+                phase_seconds.labels("postprocess", file_format, quality).observe(
+                    postprocess_timer.total
+                )
+
             # Support for playlists and single video
             entries = info.get("entries", [])
             if not entries:
@@ -115,62 +599,164 @@ def download_video(
             for entry in entries:
 
                 original_id = entry.get("id")
-                original_file_path = os.path.join(
-                    BASE_DOWNLOAD_DIR, f"{original_id}.{extension}"
+                # With download ranges the file yt-dlp wrote is already the clip
+                file_path = downloaded_file_path(entry, variant, extension)
+
+                # Prepare video metadata (the VideoMetadata row, keyed by video ID)
+                metadata = video_metadata.from_info(entry)
+
+                # Move the file to its final storage; from here on it is
+                # identified by its storage location
+                file_size = os.path.getsize(file_path)
+                file_path = storage.save(file_path)
+
+                # Index the file so the next request for this variant skips the download
+                download_cache.store(
+                    original_id,
+                    file_format,
+                    quality,
+                    start_time,
+                    end_time,
+                    file_path,
+                    file_size,
+                    metadata,
+                    accurate_trim,
+                )
+
+                metrics.DOWNLOAD_RESULT_BYTES.labels(file_format, quality).observe(
+                    file_size
                 )
-                original_file_path
-
-                # If trimming requested
-                if start_time and end_time:
-                    trimmed_file_path = os.path.join(
-                        BASE_DOWNLOAD_DIR, f"{uuid.uuid4()}.{extension}"
-                    )
-                    try:
-                        ffmpeg_cmd = [
-                            "ffmpeg",
-                            "-y",
-                            "-i",
-                            original_file_path,
-                            "-ss",
-                            start_time,
-                            "-to",
-                            end_time,
-                            "-c",
-                            "copy",
-                            trimmed_file_path,
-                        ]
-                        subprocess.run(ffmpeg_cmd, check=True)
-                        os.remove(original_file_path)
-                        trimmed_file_path
-                    except Exception as e:
-                        raise RuntimeError(f"Trimming failed: {str(e)}")
-
-                video_id = str(uuid.uuid4())
-                file_path = os.path.join(BASE_DOWNLOAD_DIR, f"{video_id}.{extension}")
-
-                # Prepare video metadata
-                metadata = {
-                    "id": video_id,
-                    "title": entry.get("title"),
-                    "duration": format_duration(entry.get("duration", 0)),
-                    "views": entry.get("view_count", 0),
-                    "likes": entry.get("like_count", 0),
-                    "channel": entry.get("uploader"),
-                    "thumbnail_url": entry.get("thumbnail"),
-                    "published_date": datetime.strptime(
-                        entry.get("upload_date", "19700101"), "%Y%m%d"
-                    ).date(),
-                }
+                metrics.DOWNLOADS_TOTAL.labels(file_format, quality, "downloaded").inc()
 
                 # Append result (for each video in playlist or single)
                 result.append((file_path, metadata))
 
+        # New files were stored: make sure the storage budget still holds
+        janitor.check_budget()
         return result
     except Exception as e:
-        raise RuntimeError(f"Download failed: {str(e)}")
+        if is_transient(e):
+            metrics.DOWNLOADS_TOTAL.labels(file_format, quality, "retryable").inc()
+            # The probe's signed media URLs may be what failed, probe again on retry
+            info_cache.delete_info(url)
+            raise TransientDownloadError(f"Download failed: {str(e)}") from e
+        metrics.DOWNLOADS_TOTAL.labels(file_format, quality, "failed").inc()
+        raise PermanentDownloadError(f"Download failed: {str(e)}") from e
+    finally:
+        budget.release()
+
+
+# Look a single video up in the download cache; returns the usual result list on a hit
+def cached_download(
+    url: str,
+    file_format: str,
+    quality: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+) -> Optional[list]:
+    video_id = extract_video_id(url)
+    if not video_id or is_playlist_url(url):
+        return None
+    cached = download_cache.lookup(
+        video_id, file_format, quality, start_time, end_time, accurate_trim
+    )
+    if not cached:
+        return None
+    file_path, metadata = cached
+    # Entries cached before metadata was keyed by video ID carry a random id
+    metadata["id"] = video_id
+    metrics.DOWNLOADS_TOTAL.labels(file_format, quality, "cache_hit").inc()
+    return [(file_path, metadata)]
+
+
+# Tell transient failures from permanent ones by walking the exception chain
+# (yt-dlp wraps the underlying error in DownloadError.exc_info / ExtractorError.cause)
+def is_transient(exc: Optional[BaseException]) -> bool:
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, PermanentDownloadError):
+            return False
+        if isinstance(exc, HTTPError):
+            return exc.status in TRANSIENT_HTTP_STATUSES
+        if isinstance(
+            exc,
+            (
+                TransportError,
+                ContentTooShortError,
+                http.client.IncompleteRead,
+                ConnectionError,
+                TimeoutError,
+            ),
+        ):
+            return True
+        # Expected extractor errors are the video's fault (private, removed, ...)
+        if isinstance(exc, ExtractorError) and exc.expected:
+            return False
+        exc_info = getattr(exc, "exc_info", None)
+        exc = (
+            (exc_info[1] if exc_info else None)
+            or getattr(exc, "cause", None)
+            or exc.__cause__
+            or exc.__context__
+        )
+    return False
+
+
+# Collects the time spent in yt-dlp post-processors through postprocessor_hooks
+class PostprocessTimer:
+    def __init__(self):
+        self.total = 0.0
+        self._started = {}
+
+    def hook(self, d: dict) -> None:
+        if d["status"] == "started":
+            self._started[d["postprocessor"]] = time.perf_counter()
+        elif d["status"] == "finished" and d["postprocessor"] in self._started:
+            self.total += time.perf_counter() - self._started.pop(d["postprocessor"])
+
+
+# Utility function to check whether the file yt-dlp writes is already the final file
+# (no audio/video merge, audio remux or trimming afterwards)
+def is_streamable(info: dict, file_format: str, start_time: Optional[str]) -> bool:
+    return (
+        file_format not in scheduling.AUDIO_FORMATS
+        and not start_time
+        and info.get("_type", "video") == "video"
+        and not info.get("requested_formats")
+    )
+
+
+# Build a yt-dlp progress hook that publishes the partial file path in the task state
+# (state DOWNLOADING) once, and flips the state back to STARTED when the file is complete
+def stream_path_hook():
+    published = False
+
+    def hook(d: dict) -> None:
+        nonlocal published
+        task = current_task
+        # current_task is a proxy: falsy outside of a task
+        if not task or not task.request.id:
+            return
+        if d["status"] == "downloading" and not published:
+            published = True
+            task.update_state(
+                state="DOWNLOADING",
+                meta={
+                    "stream_path": d.get("tmpfilename") or d.get("filename"),
+                    "filename": d.get("filename"),
+                },
+            )
+        elif d["status"] == "finished" and published:
+            task.update_state(state="STARTED", meta={"filename": d.get("filename")})
+
+    return hook
 
 
-# Utility function to format seconds into "XmYs"
-def format_duration(seconds: int) -> str:
-    mins, secs = divmod(seconds, 60)
-    return f"{mins}m{secs}s"
+# Utility function to find the file yt-dlp actually wrote for an entry (after post-processing)
+def downloaded_file_path(entry: dict, variant: str, extension: str) -> str:
+    downloads = entry.get("requested_downloads") or []
+    if downloads and downloads[-1].get("filepath"):
+        return downloads[-1]["filepath"]
+    return os.path.join(DOWNLOAD_DIR, f"{entry.get('id')}.{variant}.{extension}")
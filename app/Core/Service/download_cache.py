@@ -0,0 +1,149 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...Database.database import sessionLocal
+from ...Database.models.model import DownloadCache
+from . import storage
+from .scheduling import AUDIO_FORMATS
+
+# Minimum time between two last-access updates for the same file
+ACCESS_TOUCH_INTERVAL = timedelta(minutes=1)
+
+
+# Build the cache key for a download variant.
+# Quality has no effect on audio downloads, so it is left out of the key for them.
+def make_cache_key(
+    video_id: str,
+    file_format: str,
+    quality: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+) -> str:
+    if file_format in AUDIO_FORMATS:
+        quality = "audio"
+    raw = "|".join([video_id, file_format, quality, start_time or "", end_time or ""])
+    # Keyframe-accurate clips differ from stream-copied ones, keep them apart
+    if start_time and accurate_trim:
+        raw += "|accurate"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# Look up a cached file; returns (file_path, metadata) on a hit and bumps last access.
+# Entries whose file has disappeared from storage are marked evicted and reported as a miss.
+def lookup(
+    video_id: str,
+    file_format: str,
+    quality: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    accurate_trim: bool = False,
+) -> Optional[tuple]:
+    key = make_cache_key(
+        video_id, file_format, quality, start_time, end_time, accurate_trim
+    )
+
+    db = sessionLocal()
+    try:
+        row = db.execute(
+            update(DownloadCache)
+            .where(DownloadCache.cache_key == key, DownloadCache.evicted_at.is_(None))
+            .values(last_accessed_at=datetime.utcnow())
+            .returning(DownloadCache.file_path, DownloadCache.video_metadata)
+        ).first()
+
+        if row is None:
+            return None
+
+        if not storage.exists(row.file_path):
+            db.execute(
+                update(DownloadCache)
+                .where(DownloadCache.cache_key == key)
+                .values(evicted_at=datetime.utcnow())
+            )
+            db.commit()
+            return None
+
+        db.commit()
+        return row.file_path, dict(row.video_metadata)
+    finally:
+        db.close()
+
+
+# Record a finished download (by storage location) in the cache index,
+# replacing any previous entry for the key
+def store(
+    video_id: str,
+    file_format: str,
+    quality: str,
+    start_time: Optional[str],
+    end_time: Optional[str],
+    file_path: str,
+    file_size: int,
+    metadata: dict,
+    accurate_trim: bool = False,
+) -> None:
+    key = make_cache_key(
+        video_id, file_format, quality, start_time, end_time, accurate_trim
+    )
+    now = datetime.utcnow()
+
+    # JSON has no date type, store the published date as an ISO string
+    stored_metadata = dict(metadata)
+    published_date = stored_metadata.get("published_date")
+    if hasattr(published_date, "isoformat"):
+        stored_metadata["published_date"] = published_date.isoformat()
+
+    values = {
+        "cache_key": key,
+        "video_id": video_id,
+        "format": file_format,
+        "quality": quality,
+        "start_time": start_time,
+        "end_time": end_time,
+        "accurate_trim": bool(start_time and accurate_trim),
+        "file_path": file_path,
+        "file_size": file_size,
+        "video_metadata": stored_metadata,
+        "created_at": now,
+        "last_accessed_at": now,
+        "evicted_at": None,
+    }
+    stmt = insert(DownloadCache).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DownloadCache.cache_key],
+        set_={k: v for k, v in values.items() if k != "cache_key"},
+    )
+
+    db = sessionLocal()
+    try:
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+# Record a read of a stored file (from /files). Only writes when the last recorded
+# access is older than ACCESS_TOUCH_INTERVAL, so repeated reads stay read-only.
+async def touch(db: AsyncSession, file_path: str) -> None:
+    now = datetime.utcnow()
+    await db.execute(
+        update(DownloadCache)
+        .where(
+            DownloadCache.file_path == file_path,
+            DownloadCache.evicted_at.is_(None),
+            DownloadCache.last_accessed_at < now - ACCESS_TOUCH_INTERVAL,
+        )
+        .values(last_accessed_at=now)
+    )
+    await db.commit()
+
+
+# Cache entry behind a stored file (evicted or not), None for files not in the index
+async def find_by_location(db: AsyncSession, file_path: str):
+    return await db.scalar(
+        select(DownloadCache).where(DownloadCache.file_path == file_path).limit(1)
+    )
@@ -0,0 +1,240 @@
+import json
+from datetime import date, datetime
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from redis.exceptions import RedisError
+from sqlalchemy import insert, update, select, func, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ...Core.config import RESULTS_FLUSH_BATCH_SIZE
+from ...Core.redis_client import get_redis
+from . import janitor, quota, scheduling
+from ...Database.database import sessionLocal
+from ...Database.models.model import VideoMetadata, DownloadHistory
+
+logger = get_task_logger(__name__)
+
+# Finished jobs waiting to be written; whichever worker holds the flush lock writes
+# everything queued so far in one transaction (group commit across concurrent jobs)
+RESULTS_QUEUE_KEY = "download:results"
+FLUSH_LOCK_KEY = "download:results:flush"
+FLUSH_LOCK_TIMEOUT = 60
+# Sequence of DownloadHistory.id (serial column)
+HISTORY_ID_SEQUENCE = func.pg_get_serial_sequence("download_history", "id")
+# Jobs that could not be written even on their own, kept for inspection and replay
+DEAD_RESULTS_KEY = "download:results:dead"
+
+METADATA_COLUMNS = (
+    "id",
+    "title",
+    "duration",
+    "views",
+    "likes",
+    "channel",
+    "thumbnail_url",
+    "published_date",
+    "fetched_at",
+)
+
+
+# Completion step for a download job: runs on the worker once `download_video`
+# has finished and stores the metadata and history rows for the user.
+# The HTTP handler no longer waits for the download, so this is linked to the
+# download task as a callback (`link=record_download.s(user_id, url)`).
+@shared_task
+def record_download(result: list, user_id: str, url: str) -> int:
+    # The job no longer counts as in flight for the fair scheduler
+    scheduling.release(user_id)
+    return record_result(result, user_id, url)
+
+
+# Queue the metadata and history rows of a finished job for the user and flush them
+def record_result(result: list, user_id: str, url: str) -> int:
+    entries = [[filepath, metadata] for filepath, metadata in result or [] if filepath]
+    if not entries:
+        return 0
+
+    # The quota reserved one download at submit time, playlists use one per video
+    if len(entries) > 1:
+        quota.charge(user_id, len(entries) - 1)
+
+    job = {"user_id": user_id, "url": url, "result": entries}
+    try:
+        get_redis().rpush(RESULTS_QUEUE_KEY, json.dumps(job, default=str))
+    except RedisError:
+        # No queue available, write this job on its own
+        save_download_results([job])
+        return len(entries)
+
+    flush_download_results()
+    return len(entries)
+
+
+# Drain the queue of finished jobs and write them in batches.
+# Returns immediately if another worker is already flushing: that worker checks
+# the queue again after releasing the lock, so nothing queued is left behind.
+def flush_download_results() -> None:
+    redis_client = get_redis()
+    while True:
+        lock = redis_client.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                raw_jobs = redis_client.lpop(
+                    RESULTS_QUEUE_KEY, RESULTS_FLUSH_BATCH_SIZE
+                )
+                if not raw_jobs:
+                    break
+                try:
+                    save_download_results([json.loads(raw) for raw in raw_jobs])
+                except Exception:
+                    # One bad job must not hold up the others: write them one by one
+                    logger.exception(
+                        "Writing %d finished jobs failed, writing them one by one",
+                        len(raw_jobs),
+                    )
+                    save_each(redis_client, raw_jobs)
+        finally:
+            lock.release()
+
+        if not redis_client.llen(RESULTS_QUEUE_KEY):
+            return
+
+
+# Write finished jobs in a transaction each; the jobs that still fail are moved to
+# the dead-letter list instead of going back to the queue
+def save_each(redis_client, raw_jobs: list) -> None:
+    for raw in raw_jobs:
+        try:
+            save_download_results([json.loads(raw)])
+        except Exception:
+            logger.exception(
+                "Could not write finished job, moved to %s: %.500s",
+                DEAD_RESULTS_KEY,
+                raw,
+            )
+            redis_client.rpush(DEAD_RESULTS_KEY, raw)
+
+
+# VideoMetadata row of a result entry. Results travel as JSON (result backend,
+# results queue, download cache), so dates may arrive as ISO strings.
+def metadata_row(metadata: dict) -> dict:
+    row = {column: metadata.get(column) for column in METADATA_COLUMNS}
+    if isinstance(row["published_date"], str):
+        row["published_date"] = date.fromisoformat(row["published_date"][:10])
+    if isinstance(row["fetched_at"], str):
+        row["fetched_at"] = datetime.fromisoformat(row["fetched_at"])
+    return row
+
+
+# When the counters of a row were read (rows without it are older than any other)
+def fetched_at(row: dict) -> datetime:
+    return row["fetched_at"] or datetime.min
+
+
+# Upsert of the metadata of many videos: new videos are inserted, known ones get the
+# counters refreshed when the incoming ones were read later than the stored ones
+# (results served from the download cache carry older counters). Rows whose
+# counters did not change are not rewritten.
+def upsert_metadata(rows: list):
+    stmt = pg_insert(VideoMetadata).values(rows)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[VideoMetadata.id],
+        set_={
+            "views": excluded.views,
+            "likes": excluded.likes,
+            "fetched_at": excluded.fetched_at,
+        },
+        where=and_(
+            or_(
+                VideoMetadata.fetched_at.is_(None),
+                excluded.fetched_at > VideoMetadata.fetched_at,
+            ),
+            or_(
+                excluded.views.is_distinct_from(VideoMetadata.views),
+                excluded.likes.is_distinct_from(VideoMetadata.likes),
+            ),
+        ),
+    )
+
+
+# Write the metadata and history rows of one or more jobs in a single transaction
+# (one metadata upsert and one history INSERT). The ids are taken from the sequence
+# first, so every row is inserted with its final download_url.
+def save_download_results(jobs: list) -> None:
+    now = datetime.utcnow()
+    # One row per video: a statement may not upsert the same row twice
+    metadata_rows = {}
+    history_rows = []
+    for job in jobs:
+        for filepath, metadata_dict in job["result"]:
+            row = metadata_row(metadata_dict)
+            known = metadata_rows.get(row["id"])
+            if not known or fetched_at(row) > fetched_at(known):
+                metadata_rows[row["id"]] = row
+            history_rows.append(
+                {
+                    "url": job["url"],
+                    "video_id": metadata_dict["id"],
+                    "status": "Success",
+                    "download_at": now,
+                    "file_path": filepath,
+                    "user_id": job["user_id"],
+                }
+            )
+
+    if not history_rows:
+        return
+
+    db = sessionLocal()
+    try:
+        db.execute(upsert_metadata(list(metadata_rows.values())))
+        history_ids = (
+            db.execute(
+                select(func.nextval(HISTORY_ID_SEQUENCE)).select_from(
+                    func.generate_series(1, len(history_rows))
+                )
+            )
+            .scalars()
+            .all()
+        )
+        for row, history_id in zip(history_rows, history_ids):
+            row["id"] = history_id
+            # Clients fetch the file through the API, not from the worker's disk
+            row["download_url"] = f"/files/{history_id}"
+        db.execute(insert(DownloadHistory), history_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Completion step for re-downloading an evicted file (requested through /files/{id}):
+# points the evicted history rows at the new copy instead of adding new rows
+@shared_task
+def restore_download(result: list, file_path: str) -> int:
+    locations = [location for location, _ in result or [] if location]
+    if not locations:
+        return 0
+
+    db = sessionLocal()
+    try:
+        restored = db.execute(
+            update(DownloadHistory)
+            .where(
+                DownloadHistory.file_path == file_path,
+                DownloadHistory.status == janitor.EVICTED_STATUS,
+            )
+            .values(file_path=locations[0], status="Success")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return restored
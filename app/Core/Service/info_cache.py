@@ -0,0 +1,149 @@
+import json
+import hashlib
+from typing import Optional
+from redis.exceptions import RedisError
+from ...Core.config import INFO_CACHE_TTL, INFO_CACHE_SIZE
+from ...Core.redis_client import get_redis
+from ...Utils.cache import TTLCache
+from ...Utils.utils import extract_video_id, is_playlist_url
+
+# Two tier cache for sanitized yt-dlp info dicts:
+# a per-process LRU in front of a Redis tier shared by all workers.
+# The TTL has to stay below the lifetime of the signed format URLs inside the dict.
+# Entries are kept as JSON so every caller gets its own copy (yt-dlp mutates the dict).
+# Requests for one video differ in format and quality, so the format selection of the
+# request that probed is not cached: every download selects its own formats again.
+_local = TTLCache(maxsize=INFO_CACHE_SIZE, ttl=INFO_CACHE_TTL)
+
+
+# Keys yt-dlp adds to a video's info dict for the formats a request selected, besides
+# the fields of the selected format itself (which it merges into the dict)
+SELECTION_KEYS = {"requested_formats", "requested_downloads", "format_id"}
+
+# Fields yt-dlp gives a merged selection (video+audio) on top of those of its formats
+MERGED_FORMAT_KEYS = {
+    "format",
+    "ext",
+    "protocol",
+    "language",
+    "format_note",
+    "filesize_approx",
+    "tbr",
+    "width",
+    "height",
+    "resolution",
+    "fps",
+    "dynamic_range",
+    "vcodec",
+    "vbr",
+    "stretched_ratio",
+    "aspect_ratio",
+    "acodec",
+    "abr",
+    "asr",
+    "audio_channels",
+}
+
+
+# The info dict (or playlist) without the format selection of the request that probed
+# it; fields of the video that no selected format has are kept
+def unselected(info: dict) -> dict:
+    if info.get("entries"):
+        return {
+            **info,
+            "entries": [entry and unselected(entry) for entry in info["entries"]],
+        }
+    if not info.get("formats"):
+        return info
+    requested = info.get("requested_formats")
+    if requested:
+        selected = set().union(*requested, MERGED_FORMAT_KEYS)
+    else:
+        selected = set().union(
+            *(
+                fmt
+                for fmt in info["formats"]
+                if fmt.get("format_id") == info.get("format_id")
+            )
+        )
+    return {
+        key: value
+        for key, value in info.items()
+        if key not in selected and key not in SELECTION_KEYS
+    }
+
+
+# Promote an entry of the shared tier for as long as it has left there
+def promote(key: str, raw, pttl: int) -> None:
+    if pttl > 0:
+        _local.set(key, raw, ttl=pttl / 1000)
+
+
+# Single videos are keyed by their video ID so different URL spellings share an entry
+def cache_key(url: str) -> str:
+    video_id = extract_video_id(url)
+    if video_id and not is_playlist_url(url):
+        return f"ytinfo:video:{video_id}"
+    return f"ytinfo:url:{hashlib.sha256(url.encode()).hexdigest()}"
+
+
+# Return the cached info dict for a URL, or None
+def get_info(url: str) -> Optional[dict]:
+    key = cache_key(url)
+    raw = _local.get(key)
+    if raw is None:
+        try:
+            with get_redis().pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                raw, pttl = pipe.execute()
+        except RedisError:
+            # The shared tier is an optimisation only, fall back to extracting
+            return None
+        if raw is None:
+            return None
+        promote(key, raw, pttl)
+
+    return json.loads(raw)
+
+
+# Cached info dicts for several URLs (None for misses), with a single Redis round trip
+def get_infos(urls: list) -> list:
+    keys = [cache_key(url) for url in urls]
+    raws = [_local.get(key) for key in keys]
+    missing = [i for i, raw in enumerate(raws) if raw is None]
+    if missing:
+        try:
+            with get_redis().pipeline(transaction=False) as pipe:
+                for i in missing:
+                    pipe.get(keys[i])
+                    pipe.pttl(keys[i])
+                replies = pipe.execute()
+        except RedisError:
+            replies = [None, -2] * len(missing)
+        for i, raw, pttl in zip(missing, replies[0::2], replies[1::2]):
+            if raw is not None:
+                promote(keys[i], raw, pttl)
+                raws[i] = raw
+    return [json.loads(raw) if raw is not None else None for raw in raws]
+
+
+# Store a sanitized (JSON serialisable) info dict for a URL
+def set_info(url: str, info: dict) -> None:
+    key = cache_key(url)
+    raw = json.dumps(unselected(info))
+    _local.set(key, raw)
+    try:
+        get_redis().set(key, raw, ex=INFO_CACHE_TTL)
+    except RedisError:
+        pass
+
+
+# Drop a cached info dict (e.g. its signed format URLs stopped working)
+def delete_info(url: str) -> None:
+    key = cache_key(url)
+    _local.delete(key)
+    try:
+        get_redis().delete(key)
+    except RedisError:
+        pass
@@ -0,0 +1,281 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+from datetime import datetime, timedelta
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from redis.exceptions import RedisError
+from sqlalchemy import select, update, func
+from ...Core.config import DOWNLOAD_DIR, STORAGE_MAX_BYTES, STORAGE_MAX_AGE_DAYS
+from ...Core.redis_client import get_redis, get_async_redis
+from ...Database.database import sessionLocal
+from ...Database.models.model import DownloadCache, DownloadHistory
+from . import storage
+
+logger = get_task_logger(__name__)
+
+# Status of history rows whose file was evicted (downloaded again when requested)
+EVICTED_STATUS = "Evicted"
+
+# Only one janitor runs at a time
+JANITOR_LOCK_KEY = "storage:janitor"
+JANITOR_LOCK_TIMEOUT = 15 * 60
+
+# The on-write budget check sums the stored bytes at most once per interval
+CHECK_KEY = "storage:janitor:checked"
+CHECK_INTERVAL = 60
+
+# Evict down to this share of the budget so the janitor does not run after every write
+LOW_WATERMARK = 0.9
+
+# Files in DOWNLOAD_DIR that no cache entry or history row points to (partial
+# downloads, format intermediates, leftovers of failed jobs) are removed once they
+# have not been written for this long. Only names produced by the downloader are
+# touched: `<video id>.<variant>...`
+ORPHAN_GRACE_SECONDS = 60 * 60
+ORPHAN_NAME_REGEX = re.compile(r"^[\w-]{11}\.(audio|\w+p|4k)\.")
+
+# Files being streamed to clients are leased and never evicted while leased
+STREAM_LEASE_TTL = 60 * 60
+
+
+def lease_key(location: str) -> str:
+    return f"storage:lease:{hashlib.sha1(location.encode()).hexdigest()}"
+
+
+# Lease a stored file for `ttl` seconds (several readers can hold leases at once)
+def lease(location: str, ttl: int = STREAM_LEASE_TTL) -> None:
+    key = lease_key(location)
+    try:
+        with get_redis().pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+            pipe.execute()
+    except RedisError:
+        pass
+
+
+async def lease_async(location: str, ttl: int = STREAM_LEASE_TTL) -> None:
+    key = lease_key(location)
+    try:
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+def release_lease(location: str) -> None:
+    try:
+        get_redis().decr(lease_key(location))
+    except RedisError:
+        pass
+
+
+async def release_lease_async(location: str) -> None:
+    try:
+        await get_async_redis().decr(lease_key(location))
+    except RedisError:
+        pass
+
+
+def is_leased(location: str) -> bool:
+    try:
+        return int(get_redis().get(lease_key(location)) or 0) > 0
+    except RedisError:
+        # Without Redis a lease cannot be ruled out, keep the file
+        return True
+
+
+# Bytes held by stored downloads
+def stored_bytes(db) -> int:
+    return db.scalar(
+        select(func.coalesce(func.sum(DownloadCache.file_size), 0)).where(
+            DownloadCache.evicted_at.is_(None)
+        )
+    )
+
+
+# Evict the given cache entries (oldest first) until `bytes_needed` bytes are freed
+# (None: evict all of them). Returns (files evicted, bytes freed).
+def evict(db, rows, bytes_needed=None) -> tuple:
+    evicted_paths = []
+    freed = 0
+    for row in rows:
+        if bytes_needed is not None and freed >= bytes_needed:
+            break
+        if is_leased(row.file_path):
+            continue
+
+        # Claim the entry first: a cache hit since the rows were read has bumped
+        # last access and keeps the file, and no new hit can return it afterwards
+        claimed = db.execute(
+            update(DownloadCache)
+            .where(
+                DownloadCache.id == row.id,
+                DownloadCache.evicted_at.is_(None),
+                DownloadCache.last_accessed_at == row.last_accessed_at,
+            )
+            .values(evicted_at=datetime.utcnow())
+            .returning(DownloadCache.id)
+        ).first()
+        db.commit()
+        if claimed is None:
+            continue
+
+        try:
+            storage.delete(row.file_path)
+        except Exception:
+            logger.exception("Could not delete %s", row.file_path)
+        evicted_paths.append(row.file_path)
+        freed += row.file_size
+
+    # History rows pointing at the evicted files are downloaded again on request
+    if evicted_paths:
+        db.execute(
+            update(DownloadHistory)
+            .where(
+                DownloadHistory.file_path.in_(evicted_paths),
+                DownloadHistory.status == "Success",
+            )
+            .values(status=EVICTED_STATUS)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    return len(evicted_paths), freed
+
+
+# Remove untracked downloader files and abandoned work directories from DOWNLOAD_DIR
+def sweep_orphans(db) -> int:
+    tracked = set(
+        db.scalars(
+            select(DownloadCache.file_path).where(DownloadCache.evicted_at.is_(None))
+        )
+    )
+    # Files recorded before the cache index existed are only known to the history
+    tracked.update(
+        db.scalars(
+            select(DownloadHistory.file_path)
+            .where(
+                DownloadHistory.status == "Success",
+                DownloadHistory.file_path.is_not(None),
+            )
+            .distinct()
+        )
+    )
+
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    removed = 0
+    for entry in os.scandir(DOWNLOAD_DIR):
+        if not entry.is_file() or not ORPHAN_NAME_REGEX.match(entry.name):
+            continue
+        path = os.path.abspath(entry.path)
+        if path in tracked or entry.stat().st_mtime > cutoff or is_leased(path):
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    # Work directories of jobs that died without cleaning up (crashed workers);
+    # directories of jobs waiting for a retry are written well within the grace period
+    if os.path.isdir(storage.WORK_DIR):
+        for entry in os.scandir(storage.WORK_DIR):
+            if entry.is_dir() and last_modified(entry.path) < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    return removed
+
+
+# Newest modification time of a directory and the files directly inside it
+def last_modified(path: str) -> float:
+    mtimes = [os.stat(path).st_mtime]
+    for entry in os.scandir(path):
+        try:
+            mtimes.append(entry.stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(mtimes)
+
+
+# Periodic janitor (Celery beat, and triggered by check_budget when a write goes over
+# the budget): evicts files unused for STORAGE_MAX_AGE_DAYS, then least recently
+# used files until the stored bytes are back under the budget, then orphans
+@shared_task
+def enforce_storage_budget() -> dict:
+    lock = get_redis().lock(JANITOR_LOCK_KEY, timeout=JANITOR_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return {"skipped": True}
+
+    evicted = freed = 0
+    db = sessionLocal()
+    try:
+        columns = (
+            DownloadCache.id,
+            DownloadCache.file_path,
+            DownloadCache.file_size,
+            DownloadCache.last_accessed_at,
+        )
+        if STORAGE_MAX_AGE_DAYS:
+            cutoff = datetime.utcnow() - timedelta(days=STORAGE_MAX_AGE_DAYS)
+            rows = db.execute(
+                select(*columns).where(
+                    DownloadCache.evicted_at.is_(None),
+                    DownloadCache.last_accessed_at < cutoff,
+                )
+            ).all()
+            count, size = evict(db, rows)
+            evicted += count
+            freed += size
+
+        if STORAGE_MAX_BYTES:
+            total = stored_bytes(db)
+            if total > STORAGE_MAX_BYTES:
+                rows = db.execute(
+                    select(*columns)
+                    .where(DownloadCache.evicted_at.is_(None))
+                    .order_by(DownloadCache.last_accessed_at, DownloadCache.id)
+                ).all()
+                count, size = evict(
+                    db, rows, total - int(STORAGE_MAX_BYTES * LOW_WATERMARK)
+                )
+                evicted += count
+                freed += size
+
+        orphans = sweep_orphans(db)
+    finally:
+        db.close()
+        lock.release()
+
+    logger.info(
+        "Storage janitor evicted %d files (%d bytes), removed %d orphans",
+        evicted,
+        freed,
+        orphans,
+    )
+    return {"evicted": evicted, "freed_bytes": freed, "orphans_removed": orphans}
+
+
+# On-write check (after a download stored a new file): start the janitor right away
+# when the budget is exceeded instead of waiting for the next beat
+def check_budget() -> None:
+    if not STORAGE_MAX_BYTES:
+        return
+    try:
+        if not get_redis().set(CHECK_KEY, 1, nx=True, ex=CHECK_INTERVAL):
+            return
+    except RedisError:
+        return
+
+    db = sessionLocal()
+    try:
+        total = stored_bytes(db)
+    finally:
+        db.close()
+    if total > STORAGE_MAX_BYTES:
+        enforce_storage_budget.delay()
@@ -0,0 +1,50 @@
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from ...Core.config import JOB_OWNER_TTL
+from ...Core.redis_client import get_redis, get_async_redis
+
+# Owners of jobs and batches: the user who submitted one and the users whose identical
+# submissions joined it (see singleflight). Job IDs are handed to several users, so
+# the job routes answer 404 to everyone else instead of trusting the ID alone.
+
+
+def owners_key(job_id: str) -> str:
+    return f"job:owners:{job_id}"
+
+
+def unavailable() -> HTTPException:
+    return HTTPException(status_code=503, detail="Job ownership cannot be checked")
+
+
+# Record (job ID, user ID) pairs in one round trip; called before the job is published
+async def grant(grants: list) -> None:
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            for job_id, user_id in grants:
+                pipe.sadd(owners_key(job_id), str(user_id))
+                pipe.expire(owners_key(job_id), JOB_OWNER_TTL)
+            await pipe.execute()
+    except RedisError:
+        raise unavailable()
+
+
+# Which of `job_ids` belong to the user (one round trip)
+def owned(job_ids: list, user_id) -> list:
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.sismember(owners_key(job_id), str(user_id))
+            return [bool(member) for member in pipe.execute()]
+    except RedisError:
+        raise unavailable()
+
+
+def owns(job_id: str, user_id) -> bool:
+    return owned([job_id], user_id)[0]
+
+
+async def owns_async(job_id: str, user_id) -> bool:
+    try:
+        return bool(await get_async_redis().sismember(owners_key(job_id), str(user_id)))
+    except RedisError:
+        raise unavailable()
@@ -0,0 +1,208 @@
+import json
+import time
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Optional
+from celery.signals import task_prerun, task_retry, task_success, task_failure
+from redis.exceptions import RedisError
+from ...Core.config import PROGRESS_EVENT_INTERVAL, PROGRESS_SUBSCRIBER_BUFFER
+from ...Core.redis_client import get_redis, get_async_redis
+
+# Download progress events. Workers publish them to one Redis pub/sub channel per
+# job (a playlist's entries publish to the playlist job's channel) and keep the last
+# one so late subscribers start from the current progress. Every API process holds a
+# single pattern subscription and fans the events out to its WebSocket/SSE clients.
+CHANNEL_PREFIX = "jobs:events:"
+CHANNEL_PATTERN = CHANNEL_PREFIX + "*"
+LAST_EVENT_TTL = 60 * 60
+
+# Job states that end the event stream
+TERMINAL_STATES = {"SUCCESS", "FAILURE"}
+
+# Tasks that make up a download job (bookkeeping callbacks publish nothing)
+DOWNLOAD_TASK_PREFIX = "app.Core.Service.download."
+
+
+def channel(job_id: str) -> str:
+    return CHANNEL_PREFIX + job_id
+
+
+def last_event_key(job_id: str) -> str:
+    return f"jobs:events:last:{job_id}"
+
+
+# Job a task reports to: the root of its workflow (the playlist job for entries,
+# the job itself for single videos and for tasks that replaced the job's task)
+def job_id_of(task) -> Optional[str]:
+    return task.request.root_id or task.request.id
+
+
+# Publish one event (one round trip: PUBLISH and the last-event copy pipelined).
+# Events are best effort and never fail a download.
+def publish(job_id: str, event: dict) -> None:
+    event["job_id"] = job_id
+    event["ts"] = time.time()
+    raw = json.dumps(event)
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.publish(channel(job_id), raw)
+            pipe.set(last_event_key(job_id), raw, ex=LAST_EVENT_TTL)
+            pipe.execute()
+    except RedisError:
+        pass
+
+
+# yt-dlp progress and postprocessor hooks publishing the events of one download.
+# Progress is published at most every PROGRESS_EVENT_INTERVAL seconds; in between
+# a hook call costs a clock read, so the hooks do not slow fragment downloads down.
+class ProgressPublisher:
+    def __init__(self, job_id: str, interval: float = PROGRESS_EVENT_INTERVAL):
+        self.job_id = job_id
+        self.interval = interval
+        self._next_at = 0.0
+
+    def hook(self, d: dict) -> None:
+        status = d["status"]
+        now = time.monotonic()
+        if status == "downloading" and now < self._next_at:
+            return
+        self._next_at = now + self.interval
+
+        downloaded = d.get("downloaded_bytes")
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        event = {
+            "event": "progress",
+            "status": status,
+            "video_id": (d.get("info_dict") or {}).get("id"),
+            "downloaded_bytes": downloaded,
+            "total_bytes": total,
+            "percent": (
+                round(downloaded * 100 / total, 1) if downloaded and total else None
+            ),
+            "speed": d.get("speed"),
+            "eta": d.get("eta"),
+            "fragment_index": d.get("fragment_index"),
+            "fragment_count": d.get("fragment_count"),
+        }
+        if status == "finished":
+            event["percent"] = 100.0
+        publish(self.job_id, event)
+
+    def postprocessor_hook(self, d: dict) -> None:
+        if d["status"] in ("started", "finished"):
+            publish(
+                self.job_id,
+                {
+                    "event": "postprocess",
+                    "status": d["status"],
+                    "postprocessor": d["postprocessor"],
+                    "video_id": (d.get("info_dict") or {}).get("id"),
+                },
+            )
+
+
+# ---------------------- Job state events (worker signals) ----------------------
+def is_job_task(task) -> bool:
+    return task is not None and task.name.startswith(DOWNLOAD_TASK_PREFIX)
+
+
+# Only the task that is the job itself reports the job's state (not playlist entries)
+def reports_state(task) -> bool:
+    return is_job_task(task) and task.request.id == job_id_of(task)
+
+
+@task_prerun.connect
+def publish_started(task=None, **kwargs):
+    if reports_state(task):
+        publish(job_id_of(task), {"event": "state", "state": "STARTED"})
+
+
+@task_retry.connect
+def publish_retry(sender=None, reason=None, **kwargs):
+    if reports_state(sender):
+        publish(
+            job_id_of(sender),
+            {"event": "state", "state": "RETRY", "error": str(reason)},
+        )
+
+
+@task_success.connect
+def publish_success(sender=None, **kwargs):
+    if reports_state(sender):
+        publish(job_id_of(sender), {"event": "state", "state": "SUCCESS"})
+
+
+@task_failure.connect
+def publish_failure(sender=None, exception=None, **kwargs):
+    if reports_state(sender):
+        publish(
+            job_id_of(sender),
+            {"event": "state", "state": "FAILURE", "error": str(exception)},
+        )
+
+
+# ---------------------- Fan-out (API) ----------------------
+def is_terminal(raw) -> bool:
+    event = json.loads(raw)
+    return event.get("event") == "state" and event.get("state") in TERMINAL_STATES
+
+
+# In-process fan-out of job events. One pattern subscription per process feeds every
+# subscriber, so the number of clients does not add Redis connections or traffic.
+# Each subscriber has a bounded buffer; a slow client loses its oldest events
+# instead of holding up the others.
+class EventHub:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._reader = None
+
+    def _ensure_reader(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        while True:
+            pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(CHANNEL_PATTERN)
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    job_id = message["channel"].decode()[len(CHANNEL_PREFIX) :]
+                    for queue in self._subscribers.get(job_id, ()):
+                        deliver(queue, message["data"])
+            except (RedisError, OSError):
+                # Reconnect; subscribers keep waiting (SSE/WebSocket heartbeats go on)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str):
+        queue = asyncio.Queue(maxsize=PROGRESS_SUBSCRIBER_BUFFER)
+        self._subscribers[job_id].add(queue)
+        self._ensure_reader()
+        try:
+            yield queue
+        finally:
+            self._subscribers[job_id].discard(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+
+def deliver(queue: asyncio.Queue, raw) -> None:
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(raw)
+
+
+hub = EventHub()
+
+
+# Last event published for a job (None if it has not reported anything yet)
+async def last_event(job_id: str) -> Optional[bytes]:
+    try:
+        return await get_async_redis().get(last_event_key(job_id))
+    except RedisError:
+        return None
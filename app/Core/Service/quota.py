@@ -0,0 +1,192 @@
+import time
+import uuid
+from typing import Optional
+from datetime import datetime, timedelta
+from celery import shared_task
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...Core.config import DOWNLOAD_LIMIT_PER_DAY, RATE_LIMIT_PER_MINUTE
+from ...Core.redis_client import get_redis, get_async_redis
+from ...Core import metrics
+from . import scheduling
+from ...Database.models.model import DownloadHistory
+
+RATE_LIMIT_WINDOW_MS = 60 * 1000
+
+# Reserve `n` downloads in one atomic step: the daily counter and the one-minute
+# sliding window (a sorted set of submission timestamps) are checked and updated together.
+# Returns {1, 0} when reserved, {0, retry_after_seconds} when over a limit and
+# {-1, 0} when the daily counter is missing and has to be seeded from the database.
+# The daily counter outlives its day by an hour, so the daily limit's retry delay is
+# passed in (ARGV[7], seconds until midnight UTC) instead of read from its TTL.
+RESERVE_SCRIPT = """
+local n = tonumber(ARGV[1])
+local daily_limit = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local window = tonumber(ARGV[4])
+local rate_limit = tonumber(ARGV[5])
+
+local used = redis.call('GET', KEYS[1])
+if not used then
+    return {-1, 0}
+end
+if tonumber(used) + n > daily_limit then
+    return {0, tonumber(ARGV[7])}
+end
+
+if rate_limit > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], 0, now - window)
+    if redis.call('ZCARD', KEYS[2]) + n > rate_limit then
+        local oldest = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+        local wait_ms = window
+        if oldest[2] then
+            wait_ms = tonumber(oldest[2]) + window - now
+        end
+        return {0, math.max(1, math.ceil(wait_ms / 1000))}
+    end
+    for i = 1, n do
+        redis.call('ZADD', KEYS[2], now, ARGV[6] .. ':' .. i)
+    end
+    redis.call('PEXPIRE', KEYS[2], window)
+end
+
+redis.call('INCRBY', KEYS[1], n)
+return {1, 0}
+"""
+
+# Add to a daily counter only if it exists (a missing counter is re-seeded from the database)
+CHARGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+def daily_key(user_id, day: str) -> str:
+    return f"quota:daily:{user_id}:{day}"
+
+
+def rate_key(user_id) -> str:
+    return f"quota:rate:{user_id}"
+
+
+# Seconds until the daily quota resets (midnight UTC)
+def seconds_until_reset(now: datetime) -> int:
+    tomorrow = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+# Count today's downloads from DownloadHistory (used to seed the Redis counter and
+# as the fallback when Redis is unavailable)
+async def count_downloads_today(db: AsyncSession, user_id, now: datetime) -> int:
+    start_of_day = datetime(now.year, now.month, now.day)
+    end_of_day = start_of_day + timedelta(days=1)
+    return await db.scalar(
+        select(func.count(DownloadHistory.id)).where(
+            DownloadHistory.user_id == user_id,
+            DownloadHistory.download_at >= start_of_day,
+            DownloadHistory.download_at < end_of_day,
+        )
+    )
+
+
+def limit_exceeded(detail: str, retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=429, detail=detail, headers={"Retry-After": str(retry_after)}
+    )
+
+
+# Reserve `n` downloads for the user before enqueuing them.
+# Returns the day the reservation was made for and its token (both needed to release
+# it on failure) and raises 429 with a Retry-After header when the user is over a limit.
+async def reserve(db: AsyncSession, user_id, n: int = 1) -> tuple:
+    with metrics.QUOTA_CHECK_SECONDS.time():
+        return await _reserve(db, user_id, n)
+
+
+async def _reserve(db: AsyncSession, user_id, n: int) -> tuple:
+    now = datetime.utcnow()
+    day = now.strftime("%Y%m%d")
+    token = uuid.uuid4().hex
+    keys = [daily_key(user_id, day), rate_key(user_id)]
+    args = [
+        n,
+        DOWNLOAD_LIMIT_PER_DAY,
+        int(time.time() * 1000),
+        RATE_LIMIT_WINDOW_MS,
+        RATE_LIMIT_PER_MINUTE,
+        token,
+        seconds_until_reset(now),
+    ]
+
+    try:
+        redis_client = get_async_redis()
+        reserved, retry_after = await redis_client.eval(RESERVE_SCRIPT, 2, *keys, *args)
+        if reserved == -1:
+            # First download of the day, or Redis lost its data: seed from the database
+            used = await count_downloads_today(db, user_id, now)
+            await redis_client.set(
+                keys[0], used, ex=seconds_until_reset(now) + 3600, nx=True
+            )
+            reserved, retry_after = await redis_client.eval(
+                RESERVE_SCRIPT, 2, *keys, *args
+            )
+    except RedisError:
+        # Degrade to the (non-atomic) database count rather than refusing downloads
+        used = await count_downloads_today(db, user_id, now)
+        reserved = 1 if used + n <= DOWNLOAD_LIMIT_PER_DAY else 0
+        retry_after = seconds_until_reset(now)
+
+    if reserved != 1:
+        raise limit_exceeded(
+            "Download limit reached. Login with another account or try again later.",
+            retry_after if retry_after and retry_after > 0 else 60,
+        )
+
+    return day, token
+
+
+# Members of the rate window added by a reservation
+def rate_members(token: str, n: int) -> list:
+    return [f"{token}:{i}" for i in range(1, n + 1)]
+
+
+# Give back a reservation (enqueue failed before any task ran): the daily counter and,
+# given the reservation's token, its entries in the rate window (one round trip)
+async def release(user_id, day: str, n: int = 1, token: Optional[str] = None) -> None:
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            pipe.eval(CHARGE_SCRIPT, 1, daily_key(user_id, day), -n)
+            if token:
+                pipe.zrem(rate_key(user_id), *rate_members(token, n))
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+# Charge extra downloads once a job turns out to contain more than one video (playlists)
+def charge(user_id, n: int) -> None:
+    day = datetime.utcnow().strftime("%Y%m%d")
+    try:
+        get_redis().eval(CHARGE_SCRIPT, 1, daily_key(user_id, day), n)
+    except RedisError:
+        pass
+
+
+# Errback linked to download tasks: a failed download does not count against the quota
+# (and no longer counts as in flight for the fair scheduler)
+@shared_task
+def release_quota(request, exc, traceback, user_id: str, day: str, n: int = 1) -> None:
+    scheduling.release(user_id)
+    refund(user_id, day, n)
+
+
+# Give back a reservation from a worker (the download it was made for failed)
+def refund(user_id, day: str, n: int = 1) -> None:
+    try:
+        get_redis().eval(CHARGE_SCRIPT, 1, daily_key(user_id, day), -n)
+    except RedisError:
+        pass
@@ -0,0 +1,167 @@
+import asyncio
+from typing import Optional
+from redis.exceptions import RedisError
+from ...Core.config import LARGE_DOWNLOAD_BYTES, LARGE_DOWNLOAD_HEIGHT
+from ...Core.redis_client import get_redis, get_async_redis
+from ...Utils.utils import to_seconds, is_playlist_url
+from . import info_cache
+
+# Download queues by expected cost. Bookkeeping tasks (history, quota, playlist
+# probing and collection) stay on Celery's default queue.
+DEFAULT_QUEUE = "celery"
+AUDIO_QUEUE = "downloads.audio"
+VIDEO_QUEUE = "downloads.video"
+LARGE_QUEUE = "downloads.large"
+# MP3 encoding is CPU-bound and runs apart from the I/O-bound fetch queues
+TRANSCODE_QUEUE = "transcode"
+# Metadata probes (no download) for /metadata, kept off the download workers
+METADATA_QUEUE = "metadata"
+
+# Audio-only formats: m4a and opus are stream copies of YouTube's audio tracks, mp3
+# is encoded from the m4a track on the transcode queue
+AUDIO_FORMATS = {"mp3", "m4a", "opus"}
+
+# Celery priorities on the Redis broker: 0 is served first, 9 last
+MAX_PRIORITY = 9
+
+# Jobs per user that are queued or running; expires so a lost decrement heals itself
+INFLIGHT_TTL = 24 * 60 * 60
+
+
+def inflight_key(user_id) -> str:
+    return f"sched:inflight:{user_id}"
+
+
+# Length of a requested clip in seconds (None for full videos)
+def clip_seconds(start_time: Optional[str], end_time: Optional[str]) -> Optional[int]:
+    if not start_time or not end_time:
+        return None
+    return max(0, to_seconds(end_time) - to_seconds(start_time))
+
+
+def quality_height(quality: str) -> Optional[int]:
+    digits = quality.rstrip("p")
+    return int(digits) if digits.isdigit() else None
+
+
+# Estimate the download size in bytes from a probed info dict: best video format
+# up to the requested height plus the best audio track, scaled down for clips
+def estimate_size(
+    info: dict, quality: str, clip_length: Optional[int] = None
+) -> Optional[int]:
+    duration = info.get("duration") or 0
+    height = quality_height(quality)
+
+    def format_size(fmt: dict) -> int:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size and fmt.get("tbr") and duration:
+            size = fmt["tbr"] * 1000 / 8 * duration
+        return int(size or 0)
+
+    video_sizes = []
+    audio_sizes = []
+    for fmt in info.get("formats") or []:
+        if fmt.get("vcodec") not in (None, "none"):
+            if height is None or (fmt.get("height") or 0) <= height:
+                video_sizes.append(format_size(fmt))
+        elif fmt.get("acodec") not in (None, "none"):
+            audio_sizes.append(format_size(fmt))
+
+    size = max(video_sizes, default=0) + max(audio_sizes, default=0)
+    if not size:
+        return None
+    if clip_length is not None and duration:
+        size = size * min(1.0, clip_length / duration)
+    return int(size)
+
+
+# Pick the queue for a download. Audio goes to its own queue; video is split on the
+# estimated size when the video was probed recently (cached info dict), otherwise
+# on the requested quality. Submissions never probe, that would add seconds to the API.
+def choose_queue(
+    url: str,
+    quality: str,
+    file_format: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    info: Optional[dict] = None,
+) -> str:
+    if file_format in AUDIO_FORMATS:
+        return AUDIO_QUEUE
+
+    if info is None:
+        info = info_cache.get_info(url)
+    if info is not None and info.get("_type", "video") == "video":
+        size = estimate_size(info, quality, clip_seconds(start_time, end_time))
+        if size is not None:
+            return LARGE_QUEUE if size > LARGE_DOWNLOAD_BYTES else VIDEO_QUEUE
+
+    height = quality_height(quality)
+    if height is not None and height > LARGE_DOWNLOAD_HEIGHT:
+        return LARGE_QUEUE
+    return VIDEO_QUEUE
+
+
+# Per-user fairness: a job's priority is the number of the user's jobs already in
+# flight, so workers take every user's first job, then every user's second job and
+# so on (round-robin between users instead of first come, first served)
+# A batch of `n` jobs is claimed at once and gets the priority of its first job.
+async def claim(user_id, n: int = 1) -> int:
+    key = inflight_key(user_id)
+    try:
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.incrby(key, n)
+            pipe.expire(key, INFLIGHT_TTL)
+            inflight, _ = await pipe.execute()
+    except RedisError:
+        # Fairness is best effort, schedule normally without Redis
+        return 0
+    # The counter can dip below zero if it expired while jobs were running
+    return max(0, min(inflight - n, MAX_PRIORITY))
+
+
+# Give the in-flight slot back (from the worker once the job has finished)
+def release(user_id) -> None:
+    try:
+        get_redis().decr(inflight_key(user_id))
+    except RedisError:
+        pass
+
+
+async def release_async(user_id, n: int = 1) -> None:
+    try:
+        await get_async_redis().decrby(inflight_key(user_id), n)
+    except RedisError:
+        pass
+
+
+# Queue and priority for a new job; the cached probe lookup runs off the event loop
+async def plan(
+    user_id,
+    url: str,
+    quality: str,
+    file_format: str,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> tuple:
+    queue = await asyncio.to_thread(
+        choose_queue, url, quality, file_format, start_time, end_time
+    )
+    return queue, await claim(user_id)
+
+
+# Queue and priority for every job of a batch: cached probes are read in one round
+# trip, the in-flight slots are claimed together and the jobs of the batch follow each
+# other like playlist entries. Items are (url, quality, format, start_time, end_time).
+async def plan_batch(user_id, items: list) -> list:
+    infos = await asyncio.to_thread(info_cache.get_infos, [item[0] for item in items])
+    first = await claim(user_id, len(items))
+    plans = []
+    for index, (item, info) in enumerate(zip(items, infos)):
+        if is_playlist_url(item[0]):
+            queue = DEFAULT_QUEUE
+        else:
+            # A probe that is not cached falls back to the quality (no second lookup)
+            queue = choose_queue(*item, info=info or {})
+        plans.append((queue, min(first + index, MAX_PRIORITY)))
+    return plans
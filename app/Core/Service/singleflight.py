@@ -0,0 +1,139 @@
+import json
+from typing import Optional
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from redis.exceptions import RedisError
+from ...Core.config import SINGLE_FLIGHT_TTL
+from ...Core.redis_client import get_redis, get_async_redis
+from . import history, quota
+
+logger = get_task_logger(__name__)
+
+# Single-flight downloads: the first submission of a variant (video ID, format,
+# quality, range — the download cache key) becomes the leader and enqueues the task;
+# identical submissions while it runs join the leader's job and are put on its waiter
+# list. When the leader finishes, every waiter gets its own history rows
+# (their quota was reserved at submit time); when it fails, their quota is given back.
+
+
+def flight_key(cache_key: str) -> str:
+    return f"flight:{cache_key}"
+
+
+def waiters_key(cache_key: str) -> str:
+    return f"flight:{cache_key}:waiters"
+
+
+# Become the leader of a flight (KEYS[1] set to ARGV[1], the leader's job ID) or, if
+# there is one, append ARGV[2] to its waiter list (KEYS[2]) and return its job ID.
+# Both steps are atomic, so no waiter can join after the leader settled the flight.
+JOIN_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    return leader
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return false
+"""
+
+# End a flight led by ARGV[1] and return its waiters (nothing if the flight has
+# expired and another job leads it now)
+SETTLE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {}
+end
+local waiters = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2])
+return waiters
+"""
+
+
+# Join the flight for `cache_key` as `waiter` ({"user_id", "url", "day"}).
+# Returns the job ID of the running download to attach to, or None when the caller
+# is the leader and has to enqueue `job_id` itself.
+async def join(cache_key: str, job_id: str, waiter: dict) -> Optional[str]:
+    try:
+        leader = await get_async_redis().eval(
+            JOIN_SCRIPT,
+            2,
+            flight_key(cache_key),
+            waiters_key(cache_key),
+            job_id,
+            json.dumps(waiter),
+            SINGLE_FLIGHT_TTL,
+        )
+    except RedisError:
+        # Without Redis every submission runs its own download
+        return None
+    return leader.decode() if leader else None
+
+
+# join() for several flights in one round trip; `flights` are (cache_key, job_id,
+# waiter) tuples and the result holds the leader's job ID (or None) for each
+async def join_many(flights: list) -> list:
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            for cache_key, job_id, waiter in flights:
+                pipe.eval(
+                    JOIN_SCRIPT,
+                    2,
+                    flight_key(cache_key),
+                    waiters_key(cache_key),
+                    job_id,
+                    json.dumps(waiter),
+                    SINGLE_FLIGHT_TTL,
+                )
+            leaders = await pipe.execute()
+    except RedisError:
+        return [None] * len(flights)
+    return [leader.decode() if leader else None for leader in leaders]
+
+
+def settle(cache_key: str, job_id: str) -> list:
+    try:
+        waiters = get_redis().eval(
+            SETTLE_SCRIPT, 2, flight_key(cache_key), waiters_key(cache_key), job_id
+        )
+    except RedisError:
+        return []
+    return [json.loads(waiter) for waiter in waiters]
+
+
+# The leader could not be enqueued: end the flight and give the waiters' quota back
+async def abandon(cache_key: str, job_id: str) -> None:
+    try:
+        waiters = await get_async_redis().eval(
+            SETTLE_SCRIPT, 2, flight_key(cache_key), waiters_key(cache_key), job_id
+        )
+    except RedisError:
+        return
+    for waiter in waiters:
+        waiter = json.loads(waiter)
+        await quota.release(waiter["user_id"], waiter["day"])
+
+
+# Completion step linked to a leader download: record the result for every waiter
+@shared_task
+def complete_flight(result: list, cache_key: str, job_id: str) -> int:
+    waiters = settle(cache_key, job_id)
+    # The flight is settled already: a waiter that cannot be recorded must not cost
+    # the others their history rows
+    for waiter in waiters:
+        try:
+            history.record_result(result, waiter["user_id"], waiter["url"])
+        except Exception:
+            logger.exception(
+                "Could not record %s for user %s", waiter["url"], waiter["user_id"]
+            )
+    return len(waiters)
+
+
+# Errback linked to a leader download: the waiters' downloads failed with it
+@shared_task
+def fail_flight(request, exc, traceback, cache_key: str, job_id: str) -> int:
+    waiters = settle(cache_key, job_id)
+    for waiter in waiters:
+        quota.refund(waiter["user_id"], waiter["day"])
+    return len(waiters)
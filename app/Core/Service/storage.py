@@ -0,0 +1,193 @@
+import os
+import mimetypes
+from typing import Optional
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from ...Core.config import (
+    STORAGE_BACKEND,
+    DOWNLOAD_DIR,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+    S3_PRESIGN_EXPIRES,
+    S3_MULTIPART_CHUNK_SIZE,
+    S3_MAX_CONCURRENCY,
+)
+
+# yt-dlp always writes into DOWNLOAD_DIR first; the storage backend decides where the
+# finished file lives. Files are identified by a location string stored in the
+# database: an absolute path for local files, "s3://bucket/key" for S3 objects.
+os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+# Partial downloads of each job are kept in a work directory below this one
+WORK_DIR = os.path.join(DOWNLOAD_DIR, ".work")
+
+S3_SCHEME = "s3://"
+
+
+# Finished files stay where yt-dlp wrote them; the API serves them from disk
+class LocalStorage:
+    def save(self, path: str) -> str:
+        return os.path.abspath(path)
+
+    def exists(self, location: str) -> bool:
+        return os.path.isfile(location)
+
+    def size(self, location: str) -> int:
+        return os.path.getsize(location)
+
+    def delete(self, location: str) -> None:
+        try:
+            os.remove(location)
+        except FileNotFoundError:
+            pass
+
+    # Local files have no direct URL, they are streamed by /files/{id}
+    def url(self, location: str) -> Optional[str]:
+        return None
+
+    def local_path(self, location: str) -> Optional[str]:
+        return location
+
+    # Local files are read in place
+    def fetch(self, location: str, directory: str) -> str:
+        return location
+
+
+# Finished files are uploaded to a bucket and handed out through presigned URLs, so
+# neither workers nor API nodes need a shared volume
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION
+        )
+        # Files above one part are sent as a multipart upload, parts in parallel
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+
+    @staticmethod
+    def split(location: str) -> tuple:
+        bucket, _, key = location[len(S3_SCHEME) :].partition("/")
+        return bucket, key
+
+    # Upload a finished download and remove the local copy
+    def save(self, path: str) -> str:
+        key = self.prefix + os.path.basename(path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.client.upload_file(
+            path,
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config,
+        )
+        os.remove(path)
+        return f"{S3_SCHEME}{self.bucket}/{key}"
+
+    def exists(self, location: str) -> bool:
+        bucket, key = self.split(location)
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def size(self, location: str) -> int:
+        bucket, key = self.split(location)
+        return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+    def delete(self, location: str) -> None:
+        bucket, key = self.split(location)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    # Presigned GET (signed locally, no request to S3) that downloads as an attachment
+    def url(self, location: str) -> Optional[str]:
+        bucket, key = self.split(location)
+        filename = os.path.basename(key)
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "ResponseContentDisposition": f'attachment; filename="{filename}"',
+            },
+            ExpiresIn=S3_PRESIGN_EXPIRES,
+        )
+
+    def local_path(self, location: str) -> Optional[str]:
+        return None
+
+    # Download a stored file into `directory` (ranged GETs in parallel)
+    def fetch(self, location: str, directory: str) -> str:
+        bucket, key = self.split(location)
+        path = os.path.join(directory, os.path.basename(key))
+        self.client.download_file(bucket, key, path, Config=self.transfer_config)
+        return path
+
+
+# Backends are created on first use so importing this module never talks to S3
+_local = LocalStorage()
+_s3 = None
+
+
+def get_s3_storage() -> S3Storage:
+    global _s3
+    if _s3 is None:
+        _s3 = S3Storage(S3_BUCKET, S3_PREFIX)
+    return _s3
+
+
+# Backend that stores new downloads
+def get_storage():
+    if STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("S3_BUCKET must be set when STORAGE_BACKEND is 's3'")
+        return get_s3_storage()
+    return _local
+
+
+# Backend holding an existing file; rows written before switching backends keep
+# working because the location says where the file is
+def storage_for(location: str):
+    if location.startswith(S3_SCHEME):
+        return get_s3_storage()
+    return _local
+
+
+def save(path: str) -> str:
+    return get_storage().save(path)
+
+
+def exists(location: str) -> bool:
+    return storage_for(location).exists(location)
+
+
+def size(location: str) -> int:
+    return storage_for(location).size(location)
+
+
+def delete(location: str) -> None:
+    storage_for(location).delete(location)
+
+
+def url(location: str) -> Optional[str]:
+    return storage_for(location).url(location)
+
+
+def local_path(location: str) -> Optional[str]:
+    return storage_for(location).local_path(location)
+
+
+# Path of a readable copy of a stored file, downloaded into `directory` if needed
+def fetch(location: str, directory: str) -> str:
+    return storage_for(location).fetch(location, directory)
@@ -0,0 +1,55 @@
+import os
+import resource
+import subprocess
+from ...Core.config import FFMPEG_THREADS, MP3_BITRATE
+
+MP3 = "mp3"
+
+# mp3 is encoded from the m4a (AAC) track: every YouTube video has one, and fetching
+# it goes through the stream-copy path, so the m4a lands in the download cache as well
+MP3_SOURCE_FORMAT = "m4a"
+
+
+# Name of the mp3 encoded from a stored file ("<id>.audio[.<clip>].mp3")
+def mp3_name(location: str) -> str:
+    return os.path.splitext(os.path.basename(location))[0] + ".mp3"
+
+
+# Encode an audio file to a constant bitrate mp3 with ffmpeg and return the CPU time
+# (user + system seconds) the encode used.
+# libmp3lame encodes on a single thread, so more ffmpeg threads only add contention;
+# throughput comes from the transcode pool running one encode per core instead.
+def encode_mp3(source: str, target: str, threads: int = FFMPEG_THREADS) -> float:
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    completed = subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-threads",
+            str(threads),
+            "-i",
+            source,
+            "-vn",
+            "-map_metadata",
+            "0",
+            "-codec:a",
+            "libmp3lame",
+            "-b:a",
+            MP3_BITRATE,
+            "-threads",
+            str(threads),
+            "-filter_threads",
+            str(threads),
+            target,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {completed.stderr.strip()[-500:]}")
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
@@ -0,0 +1,233 @@
+import uuid
+import asyncio
+from datetime import datetime
+from celery import shared_task, states
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from yt_dlp import YoutubeDL
+from ...Core.config import METADATA_PROBE_TIMEOUT
+from ...Core.redis_client import get_redis, get_async_redis, get_async_backend_redis
+from ...Core import metrics
+from ...Database.database import sessionLocal
+from ...Database.models.model import VideoMetadata
+from ...Utils.utils import canonical_video_url
+from . import download, history, info_cache
+from .scheduling import METADATA_QUEUE
+
+# Metadata of videos without downloading them (/metadata). A lookup is served from
+# the video_metadata table, then from the probe cache of the downloads (info_cache),
+# and only the videos found in neither are probed. A probe extracts the video page
+# without format selection or download, runs on the metadata queue and stores its
+# result in video_metadata; concurrent lookups of a video wait on the same probe.
+
+# A lookup that finds a probe key joins that probe instead of starting another one
+PROBE_KEY_TTL = 60
+
+# How often waiting lookups read the results of their probes
+PROBE_POLL_INTERVAL = 0.1
+
+# Lookup errors
+NOT_FOUND = "Video not found or unavailable"
+UNAVAILABLE = "YouTube could not be reached, try again later"
+TIMED_OUT = "Timed out while fetching the video metadata"
+
+# Errors that go away by retrying, and when clients are asked to retry
+TRANSIENT_ERRORS = {UNAVAILABLE, TIMED_OUT}
+PROBE_RETRY_AFTER = 30
+
+# The YouTube extractor skips the DASH/HLS manifests, formats are not needed
+PROBE_OPTIONS = {
+    "quiet": True,
+    "skip_download": True,
+    "extractor_args": {"youtube": {"skip": ["dash", "hls", "translated_subs"]}},
+}
+
+
+def probe_key(video_id: str) -> str:
+    return f"metadata:probe:{video_id}"
+
+
+# VideoMetadata row of a yt-dlp info dict. Unprocessed dicts (extract_info with
+# process=False) have no "thumbnail" yet, it is picked from "thumbnails" like yt-dlp does.
+# yt-dlp sets the fields it could not read to None, the NOT NULL columns get defaults.
+def from_info(info: dict) -> dict:
+    thumbnail = info.get("thumbnail")
+    if not thumbnail and info.get("thumbnails"):
+        thumbnail = max(
+            info["thumbnails"],
+            key=lambda t: (
+                t["preference"] if t.get("preference") is not None else -1,
+                t["width"] if t.get("width") is not None else -1,
+            ),
+        ).get("url")
+    return {
+        "id": info.get("id"),
+        "title": info.get("title") or "",
+        "duration": int(info.get("duration") or 0),
+        "views": info.get("view_count") or 0,
+        "likes": info.get("like_count"),
+        "channel": info.get("uploader") or "",
+        "thumbnail_url": thumbnail or "",
+        "published_date": datetime.strptime(
+            info.get("upload_date") or "19700101", "%Y%m%d"
+        ).date(),
+        "fetched_at": datetime.utcnow().isoformat(),
+    }
+
+
+def store(metadata: dict) -> None:
+    db = sessionLocal()
+    try:
+        db.execute(history.upsert_metadata([history.metadata_row(metadata)]))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Probe one video (no format selection, no download), store and return its metadata.
+# Failures worth retrying (throttling, server and network errors) are raised as
+# TransientDownloadError so lookups can tell them from missing videos.
+@shared_task
+def probe_metadata(video_id: str) -> dict:
+    try:
+        try:
+            with YoutubeDL(PROBE_OPTIONS) as ydl:
+                info = ydl.extract_info(
+                    canonical_video_url(video_id), download=False, process=False
+                )
+        except Exception as exc:
+            if download.is_transient(exc):
+                raise download.TransientDownloadError(str(exc)) from exc
+            raise
+        metadata = from_info(ydl.sanitize_info(info))
+        store(metadata)
+        return metadata
+    finally:
+        # Later lookups read the stored row (or probe again if this one failed)
+        try:
+            get_redis().delete(probe_key(video_id))
+        except RedisError:
+            pass
+
+
+# Start or join the probes of `video_ids` and return the task ID to wait on per video.
+# The first lookup of a video claims its probe key and publishes the probe, concurrent
+# lookups find the key and get the same task ID (one Redis round trip for all videos).
+async def probe(video_ids: list) -> dict:
+    task_ids = {video_id: str(uuid.uuid4()) for video_id in video_ids}
+    try:
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            for video_id, task_id in task_ids.items():
+                pipe.set(probe_key(video_id), task_id, nx=True, ex=PROBE_KEY_TTL)
+                pipe.get(probe_key(video_id))
+            replies = await pipe.execute()
+    except RedisError:
+        # Without Redis every lookup runs its own probes
+        replies = [True, None] * len(task_ids)
+
+    claimed = []
+    for (video_id, task_id), won, current in zip(
+        list(task_ids.items()), replies[0::2], replies[1::2]
+    ):
+        if won or current is None:
+            claimed.append((video_id, task_id))
+        else:
+            task_ids[video_id] = current.decode()
+
+    if claimed:
+        # Publishing blocks on the broker connection, keep it off the event loop
+        await asyncio.to_thread(publish_probes, claimed)
+    return task_ids
+
+
+# Publish probes over one producer connection; `claimed` are (video ID, task ID) pairs
+def publish_probes(claimed: list) -> None:
+    with probe_metadata.app.producer_or_acquire() as producer:
+        for video_id, task_id in claimed:
+            probe_metadata.apply_async(
+                (video_id,),
+                task_id=task_id,
+                queue=METADATA_QUEUE,
+                producer=producer,
+            )
+
+
+# Wait for probes (all of them within one `timeout`); returns video ID ->
+# (metadata, error) like lookup(). The results of every probe still running are read
+# from the result backend in one round trip per PROBE_POLL_INTERVAL.
+async def wait(task_ids: dict, timeout: float = METADATA_PROBE_TIMEOUT) -> dict:
+    backend = probe_metadata.app.backend
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = dict(task_ids)
+    found = {}
+    while pending:
+        keys = [backend.get_key_for_task(task_id) for task_id in pending.values()]
+        try:
+            raws = await get_async_backend_redis().mget(keys)
+        except RedisError:
+            # Keep waiting, the backend may come back before the deadline
+            raws = [None] * len(keys)
+        for video_id, raw in zip(list(pending), raws):
+            meta = backend.decode_result(raw) if raw is not None else None
+            # STARTED is stored as well (task_track_started), only final states count
+            if meta is None or meta["status"] not in states.READY_STATES:
+                continue
+            del pending[video_id]
+            if meta["status"] == states.SUCCESS:
+                found[video_id] = (meta["result"], None)
+            elif isinstance(
+                backend.exception_to_python(meta["result"]),
+                download.TransientDownloadError,
+            ):
+                found[video_id] = (None, UNAVAILABLE)
+            else:
+                found[video_id] = (None, NOT_FOUND)
+
+        remaining = deadline - loop.time()
+        if not pending or remaining <= 0:
+            break
+        await asyncio.sleep(min(PROBE_POLL_INTERVAL, remaining))
+
+    for video_id in pending:
+        found[video_id] = (None, TIMED_OUT)
+    return found
+
+
+# Metadata of many videos: video ID -> (metadata, None), or (None, error) for videos
+# that could not be probed
+async def lookup(db, video_ids: list) -> dict:
+    found = {}
+
+    rows = await db.execute(
+        select(VideoMetadata).where(VideoMetadata.id.in_(video_ids))
+    )
+    for row in rows.scalars():
+        found[row.id] = (
+            {column: getattr(row, column) for column in history.METADATA_COLUMNS},
+            None,
+        )
+    metrics.METADATA_LOOKUPS_TOTAL.labels("db").inc(len(found))
+
+    missing = [video_id for video_id in video_ids if video_id not in found]
+    if missing:
+        infos = await asyncio.to_thread(
+            info_cache.get_infos,
+            [canonical_video_url(video_id) for video_id in missing],
+        )
+        for video_id, info in zip(missing, infos):
+            if info:
+                found[video_id] = (from_info(info), None)
+                metrics.METADATA_LOOKUPS_TOTAL.labels("cache").inc()
+
+    missing = [video_id for video_id in video_ids if video_id not in found]
+    if missing:
+        task_ids = await probe(missing)
+        probed = await wait(task_ids)
+        for video_id, (metadata, error) in probed.items():
+            found[video_id] = (metadata, error)
+            metrics.METADATA_LOOKUPS_TOTAL.labels("failed" if error else "probe").inc()
+    return found
@@ -1,15 +1,22 @@
 # For JWT encoding/decoding
+import json
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from ..Schema import metadata
 
 from ..Database.models import model
 from ..Database import database
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID as uuid
+from redis.exceptions import RedisError
+from .config import USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_REDIS_TTL
+from .redis_client import get_async_redis
+from ..Utils.cache import TTLCache
 
 # Token endpoint used by OAuth2PasswordBearer dependency
 auth2_schema = OAuth2PasswordBearer(tokenUrl="login")
@@ -19,6 +26,10 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Principal cache so authenticated requests don't query the users table every time:
+# a bounded per-process LRU (short TTL) in front of a Redis tier shared by all API processes
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -52,8 +63,8 @@ def verify_access_token(token: str, credentials_exception):
     return token_data
 
 
-def get_current_user(
-    token: str = Depends(auth2_schema), db: Session = Depends(database.get_db)
+async def get_current_user(
+    token: str = Depends(auth2_schema), db: AsyncSession = Depends(database.get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,8 +74,91 @@ def get_current_user(
 
     # Validate and decode token
     curr_token = verify_access_token(token, credentials_exception)
+    return await load_user(db, curr_token.id)
+
+
+# WebSocket variant: browsers cannot set headers on WebSocket requests, so the token
+# may also be passed as the `token` query parameter. The dependencies of a WebSocket
+# route live as long as the socket, so the user is loaded in a session of its own
+# that is closed before the route starts (no pooled connection held while it is open).
+async def get_websocket_user(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+):
+    credentials_exception = WebSocketException(
+        code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials"
+    )
+    if token is None:
+        scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise credentials_exception
+
+    curr_token = verify_access_token(token, credentials_exception)
+    async with database.AsyncSessionLocal() as db:
+        user = await load_user(db, curr_token.id)
+    if user is None:
+        raise credentials_exception
+    return user
 
-    # Query database for user using ID from token
-    user = db.query(model.User).filter(model.User.id == curr_token.id).first()
+
+# Serve the user from the cache, only query the database on a miss
+async def load_user(db: AsyncSession, user_id):
+    user = await get_cached_user(user_id)
+    if user is None:
+        user = await db.scalar(select(model.User).where(model.User.id == user_id))
+        if user is not None:
+            await cache_user(user)
 
     return user
+
+
+def user_cache_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+# Look a user up in the local cache, then in Redis (returns a detached User or None)
+async def get_cached_user(user_id):
+    key = user_cache_key(user_id)
+    data = _user_cache.get(key)
+    if data is None:
+        try:
+            raw = await get_async_redis().get(key)
+        except RedisError:
+            return None
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        _user_cache.set(key, data)
+
+    # Only the fields the routes need are cached, never the password hash
+    return model.User(
+        id=uuid(data["id"]),
+        email=data["email"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+    )
+
+
+# Store a user in both cache tiers
+async def cache_user(user) -> None:
+    key = user_cache_key(user.id)
+    data = {
+        "id": str(user.id),
+        "email": user.email,
+        "created_at": user.created_at.isoformat(),
+    }
+    _user_cache.set(key, data)
+    try:
+        await get_async_redis().set(key, json.dumps(data), ex=USER_CACHE_REDIS_TTL)
+    except RedisError:
+        pass
+
+
+# Drop a user from the cache (call when a user is created, changed or deleted).
+# Other API processes drop their local copy within USER_CACHE_TTL seconds.
+async def invalidate_user(user_id) -> None:
+    key = user_cache_key(user_id)
+    _user_cache.delete(key)
+    try:
+        await get_async_redis().delete(key)
+    except RedisError:
+        pass
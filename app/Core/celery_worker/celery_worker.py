@@ -1,17 +1,116 @@
+import os
+import sys
+import tempfile
+
 # Import Celery for task queue management
 from celery import Celery
-from ...Core.config import BACKEND, BROKER
+from celery.signals import celeryd_init
+from kombu import Queue
+
+# The prefork pool processes only report metrics through PROMETHEUS_MULTIPROC_DIR, which
+# prometheus_client reads when it is first imported (by the metrics import below).
+# A worker started without it records into a fresh, empty directory of its own.
+if "worker" in sys.argv[1:] and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+from ...Core.config import (
+    BACKEND,
+    BROKER,
+    AUDIO_WORKER_CONCURRENCY,
+    VIDEO_WORKER_CONCURRENCY,
+    LARGE_WORKER_CONCURRENCY,
+    TRANSCODE_WORKER_CONCURRENCY,
+    METADATA_WORKER_CONCURRENCY,
+    JANITOR_INTERVAL,
+)
+from ...Core.Service.scheduling import (
+    DEFAULT_QUEUE,
+    AUDIO_QUEUE,
+    VIDEO_QUEUE,
+    LARGE_QUEUE,
+    TRANSCODE_QUEUE,
+    METADATA_QUEUE,
+    MAX_PRIORITY,
+)
+from ...Core import metrics  # noqa: F401  (queue wait + worker metrics server signals)
 
 # Initialize a Celery app with a custom name "worker"
 # BROKER is the message broker URL (e.g., Redis or RabbitMQ)
 # BACKEND is the result backend to store task results (e.g., Redis, RPC, database)
 celery_app = Celery("worker", broker=BROKER, backend=BACKEND)
 
+# Report STARTED while a task is running so /jobs/{id} can tell queued from running jobs
+celery_app.conf.task_track_started = True
+
+# Downloads are split into queues by expected cost so quick audio jobs never wait
+# behind large video downloads. A worker started without -Q consumes every queue.
+celery_app.conf.task_queues = [
+    Queue(DEFAULT_QUEUE),
+    Queue(AUDIO_QUEUE),
+    Queue(VIDEO_QUEUE),
+    Queue(LARGE_QUEUE),
+    Queue(TRANSCODE_QUEUE),
+    Queue(METADATA_QUEUE),
+]
+celery_app.conf.task_default_queue = DEFAULT_QUEUE
+celery_app.conf.task_routes = {
+    "app.Core.Service.download.download_video": {"queue": VIDEO_QUEUE},
+    "app.Core.Service.download.download_playlist_entry": {"queue": VIDEO_QUEUE},
+    "app.Core.Service.download.transcode_audio": {"queue": TRANSCODE_QUEUE},
+    "app.Core.Service.download.transcode_playlist_entry": {"queue": TRANSCODE_QUEUE},
+    "app.Core.Service.video_metadata.probe_metadata": {"queue": METADATA_QUEUE},
+}
+
+# Per-user fairness uses task priorities (see scheduling.claim). The Redis broker
+# keeps one list per priority level and serves 0 first; every level is kept so
+# priorities are not rounded into buckets.
+celery_app.conf.broker_transport_options = {
+    "priority_steps": list(range(MAX_PRIORITY + 1)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+# Only fetch a new task when a process is free, otherwise prefetched low priority
+# jobs would run ahead of higher priority ones published after them
+celery_app.conf.worker_prefetch_multiplier = 1
+
+# Storage janitor (run `celery beat` next to the workers)
+celery_app.conf.beat_schedule = {
+    "storage-janitor": {
+        "task": "app.Core.Service.janitor.enforce_storage_budget",
+        "schedule": JANITOR_INTERVAL,
+    },
+}
+
+# Worker pool size per download queue, applied to workers started with -Q.
+# Fetch and metadata pools are sized for I/O, the transcode pool runs one encode
+# per core.
+QUEUE_POOLS = {
+    AUDIO_QUEUE: {"concurrency": AUDIO_WORKER_CONCURRENCY},
+    VIDEO_QUEUE: {"concurrency": VIDEO_WORKER_CONCURRENCY},
+    LARGE_QUEUE: {"concurrency": LARGE_WORKER_CONCURRENCY},
+    TRANSCODE_QUEUE: {"concurrency": TRANSCODE_WORKER_CONCURRENCY},
+    METADATA_QUEUE: {"concurrency": METADATA_WORKER_CONCURRENCY},
+}
+
+
+# Size the pool from the queues this worker consumes (`--concurrency` still wins)
+@celeryd_init.connect
+def configure_queue_pool(conf=None, options=None, **kwargs):
+    queues = (options or {}).get("queues") or []
+    pools = [QUEUE_POOLS[queue] for queue in queues if queue in QUEUE_POOLS]
+    if pools and not options.get("concurrency"):
+        conf.worker_concurrency = sum(pool["concurrency"] for pool in pools)
+
 
 # Automatically discover and register tasks from the specified module path
-# This allows Celery to find all task functions defined under 'download.py'
+# This allows Celery to find all task functions defined under the Service modules
 celery_app.autodiscover_tasks(
     [
         "app.Core.Service.download",
+        "app.Core.Service.history",
+        "app.Core.Service.quota",
+        "app.Core.Service.janitor",
+        "app.Core.Service.singleflight",
+        "app.Core.Service.video_metadata",
     ]
 )
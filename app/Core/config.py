@@ -15,3 +15,127 @@ MAX_DURATION = int(os.getenv("MAX_DURATION", "18000"))
 
 # Size in bytes (3 GB)
 MAX_SIZE = int(os.getenv("MAX_SIZE", "3221225472"))
+
+# Redis used for shared caches (defaults to the Celery result backend)
+REDIS_URL = os.getenv("REDIS_URL", BACKEND or BROKER)
+
+# yt-dlp info dict cache: entries must expire before the signed format URLs do (~6 hours)
+INFO_CACHE_TTL = int(os.getenv("INFO_CACHE_TTL", "1800"))
+INFO_CACHE_SIZE = int(os.getenv("INFO_CACHE_SIZE", "256"))
+
+# Maximum number of playlist entries downloaded for one request
+PLAYLIST_MAX_ENTRIES = int(os.getenv("PLAYLIST_MAX_ENTRIES", "10"))
+
+# Maximum number of finished jobs written per transaction by the history writer
+RESULTS_FLUSH_BATCH_SIZE = int(os.getenv("RESULTS_FLUSH_BATCH_SIZE", "200"))
+
+# Page size for /history (default and maximum)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+
+# Short-term rate limit on download submissions (0 disables it)
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+
+# Authenticated user cache: per-process LRU in front of a shared Redis tier
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", "300"))
+
+# Password hashing: bcrypt work factor, process pool size and the number of hashes
+# allowed to wait for the pool before requests are rejected with 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))
+)
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8))
+)
+
+# Port of the Celery worker's Prometheus metrics server (0 disables it)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# Video downloads estimated above this size (or above this height when the size is
+# unknown) go to the large download queue
+LARGE_DOWNLOAD_BYTES = int(os.getenv("LARGE_DOWNLOAD_BYTES", str(500 * 1024 * 1024)))
+LARGE_DOWNLOAD_HEIGHT = int(os.getenv("LARGE_DOWNLOAD_HEIGHT", "1080"))
+
+# Worker processes per download queue, used when a worker is started with -Q <queue>
+AUDIO_WORKER_CONCURRENCY = int(os.getenv("AUDIO_WORKER_CONCURRENCY", "8"))
+VIDEO_WORKER_CONCURRENCY = int(os.getenv("VIDEO_WORKER_CONCURRENCY", "4"))
+LARGE_WORKER_CONCURRENCY = int(os.getenv("LARGE_WORKER_CONCURRENCY", "2"))
+
+# Storage of finished downloads: "local" keeps them in DOWNLOAD_DIR, "s3" uploads them
+# to an S3-compatible bucket (DOWNLOAD_DIR is then only the workers' scratch space)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", os.path.expanduser("~/Downloads"))
+
+# S3-compatible storage (set S3_ENDPOINT_URL for MinIO etc.); credentials come from
+# the usual AWS environment variables / config files
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "downloads/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "3600"))
+# Multipart uploads: part size in bytes and parts uploaded in parallel
+S3_MULTIPART_CHUNK_SIZE = int(
+    os.getenv("S3_MULTIPART_CHUNK_SIZE", str(16 * 1024 * 1024))
+)
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+
+# Storage janitor: byte budget for stored downloads and maximum time since a file
+# was last used (0 disables either limit), and how often the beat task runs
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", str(50 * 1024**3)))
+STORAGE_MAX_AGE_DAYS = int(os.getenv("STORAGE_MAX_AGE_DAYS", "30"))
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "600"))
+
+# Retries of downloads that failed transiently: attempts, first backoff and the cap
+# (seconds; delays double per attempt and are jittered)
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "5"))
+DOWNLOAD_RETRY_BACKOFF = int(os.getenv("DOWNLOAD_RETRY_BACKOFF", "10"))
+DOWNLOAD_RETRY_BACKOFF_MAX = int(os.getenv("DOWNLOAD_RETRY_BACKOFF_MAX", "600"))
+
+# Fragments (DASH/HLS segments) fetched in parallel by one download job, per queue
+AUDIO_FRAGMENT_CONCURRENCY = int(os.getenv("AUDIO_FRAGMENT_CONCURRENCY", "1"))
+VIDEO_FRAGMENT_CONCURRENCY = int(os.getenv("VIDEO_FRAGMENT_CONCURRENCY", "4"))
+LARGE_FRAGMENT_CONCURRENCY = int(os.getenv("LARGE_FRAGMENT_CONCURRENCY", "8"))
+
+# Cluster-wide bandwidth ceilings in bytes per second, shared by all workers through
+# Redis token buckets (0 = unlimited): all downloads, per queue and per user
+BANDWIDTH_LIMIT_TOTAL = int(os.getenv("BANDWIDTH_LIMIT_TOTAL", "0"))
+AUDIO_BANDWIDTH_LIMIT = int(os.getenv("AUDIO_BANDWIDTH_LIMIT", "0"))
+VIDEO_BANDWIDTH_LIMIT = int(os.getenv("VIDEO_BANDWIDTH_LIMIT", "0"))
+LARGE_BANDWIDTH_LIMIT = int(os.getenv("LARGE_BANDWIDTH_LIMIT", "0"))
+USER_BANDWIDTH_LIMIT = int(os.getenv("USER_BANDWIDTH_LIMIT", "0"))
+
+# Cluster-wide budget of open download connections (0 = unlimited): in total and
+# per user. A job holds one connection per parallel fragment.
+CONNECTION_LIMIT_TOTAL = int(os.getenv("CONNECTION_LIMIT_TOTAL", "0"))
+USER_CONNECTION_LIMIT = int(os.getenv("USER_CONNECTION_LIMIT", "0"))
+
+# MP3 encoding runs on its own CPU-bound "transcode" queue: worker processes (one per
+# core by default), ffmpeg threads per encode and the target bitrate
+TRANSCODE_WORKER_CONCURRENCY = int(
+    os.getenv("TRANSCODE_WORKER_CONCURRENCY", str(os.cpu_count() or 1))
+)
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "1"))
+MP3_BITRATE = os.getenv("MP3_BITRATE", "192k")
+
+# Identical downloads submitted while one is in flight join it instead of downloading
+# again; a job that never reports back stops collecting joiners after this many seconds
+SINGLE_FLIGHT_TTL = int(os.getenv("SINGLE_FLIGHT_TTL", str(3 * 60 * 60)))
+
+# Most downloads accepted by one POST /download/batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Download progress events (Redis pub/sub): minimum seconds between two progress
+# events of a job, and events buffered per subscriber before old ones are dropped
+PROGRESS_EVENT_INTERVAL = float(os.getenv("PROGRESS_EVENT_INTERVAL", "0.5"))
+PROGRESS_SUBSCRIBER_BUFFER = int(os.getenv("PROGRESS_SUBSCRIBER_BUFFER", "64"))
+
+# Metadata lookups (/metadata): videos not known yet are probed on the I/O-bound
+# "metadata" queue (worker processes), and a lookup waits this many seconds for them
+METADATA_WORKER_CONCURRENCY = int(os.getenv("METADATA_WORKER_CONCURRENCY", "16"))
+METADATA_PROBE_TIMEOUT = float(os.getenv("METADATA_PROBE_TIMEOUT", "20"))
+
+# Who may read a job (/jobs, /download/batch) is kept as long as Celery keeps results
+JOB_OWNER_TTL = int(os.getenv("JOB_OWNER_TTL", str(24 * 60 * 60)))
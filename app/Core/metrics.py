@@ -0,0 +1,129 @@
+import os
+import time
+from prometheus_client import Counter, Histogram, CollectorRegistry, start_http_server
+from prometheus_client import multiprocess
+from celery.signals import (
+    before_task_publish,
+    task_prerun,
+    worker_init,
+    worker_process_shutdown,
+)
+from celery.utils.log import get_task_logger
+from .config import WORKER_METRICS_PORT
+
+logger = get_task_logger(__name__)
+
+# Buckets for the download pipeline: from cache-hit milliseconds up to multi-hour streams
+PIPELINE_BUCKETS = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+    1800,
+    3600,
+)
+SIZE_BUCKETS = tuple(2**exp for exp in range(20, 36, 2))  # 1 MiB .. 32 GiB
+
+# ---------------------- Worker (download pipeline) ----------------------
+DOWNLOAD_PHASE_SECONDS = Histogram(
+    "download_phase_seconds",
+    "Time spent in each phase of download_video "
+    "(probe, fetch, trim = fetching a clip range, postprocess = merge/audio extraction, "
+    "transcode = mp3 encoding)",
+    ["phase", "format", "quality"],
+    buckets=PIPELINE_BUCKETS,
+)
+DOWNLOAD_RESULT_BYTES = Histogram(
+    "download_result_bytes",
+    "Size of the files produced by download_video",
+    ["format", "quality"],
+    buckets=SIZE_BUCKETS,
+)
+DOWNLOADS_TOTAL = Counter(
+    "downloads_total",
+    "Videos processed by download_video by outcome (downloaded, cache_hit, failed)",
+    ["format", "quality", "outcome"],
+)
+TRANSCODE_CPU_SECONDS = Histogram(
+    "transcode_cpu_seconds",
+    "CPU time (user + system) ffmpeg spent encoding one mp3",
+    buckets=PIPELINE_BUCKETS,
+)
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "task_queue_wait_seconds",
+    "Time between a task being published and a worker starting it",
+    ["task", "queue"],
+    buckets=PIPELINE_BUCKETS,
+)
+
+# ---------------------- API / database ----------------------
+ENQUEUE_SECONDS = Histogram(
+    "enqueue_seconds", "Time to publish a download job to the broker"
+)
+QUOTA_CHECK_SECONDS = Histogram(
+    "quota_check_seconds", "Time to reserve a download against the user's quota"
+)
+DB_COMMIT_SECONDS = Histogram("db_commit_seconds", "Time spent committing transactions")
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time for a session to get a connection from the pool when its transaction begins",
+)
+METADATA_LOOKUPS_TOTAL = Counter(
+    "metadata_lookups_total",
+    "Videos looked up by /metadata by where the metadata came from "
+    "(db, cache, probe, failed)",
+    ["source"],
+)
+
+
+# Stamp every published task so the worker can measure how long it waited in the queue
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def observe_queue_wait(task=None, **kwargs):
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is None:
+        published_at = (task.request.headers or {}).get("published_at")
+    if published_at is not None:
+        queue = (task.request.delivery_info or {}).get("routing_key") or ""
+        TASK_QUEUE_WAIT_SECONDS.labels(task.name, queue).observe(
+            max(0.0, time.time() - float(published_at))
+        )
+
+
+# Expose the worker's metrics. With the prefork pool the children record into
+# PROMETHEUS_MULTIPROC_DIR and the main process serves the aggregated values.
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    if not WORKER_METRICS_PORT:
+        return
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(WORKER_METRICS_PORT, registry=registry)
+    else:
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR is not set: metrics recorded in prefork pool "
+            "processes are not exported on port %s",
+            WORKER_METRICS_PORT,
+        )
+        start_http_server(WORKER_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
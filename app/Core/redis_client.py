@@ -0,0 +1,40 @@
+import redis
+import redis.asyncio
+from .config import REDIS_URL, BACKEND
+
+# Shared Redis connection (created on first use so importing this module never connects)
+_client = None
+
+
+# Return the process wide Redis client
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+
+# Asyncio client for the API (one per process, like the sync client)
+_async_client = None
+
+
+# Return the process wide asyncio Redis client
+def get_async_redis() -> redis.asyncio.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(REDIS_URL)
+    return _async_client
+
+
+# Asyncio client for the Celery result backend, so the API can read task results
+# without blocking (the shared client when the backend is the same Redis)
+_async_backend_client = None
+
+
+def get_async_backend_redis() -> redis.asyncio.Redis:
+    global _async_backend_client
+    if not BACKEND or BACKEND == REDIS_URL:
+        return get_async_redis()
+    if _async_backend_client is None:
+        _async_backend_client = redis.asyncio.Redis.from_url(BACKEND)
+    return _async_backend_client
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, make_url, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from ..Core.config import Database_Connection
+from ..Core import metrics
 
 conn = Database_Connection
 
@@ -27,19 +30,58 @@ engine = create_engine(conn, pool_size=10, max_overflow=20)
 
 
 # SessionLocal will be used to create session instances for interacting with the database
+# (synchronous: used by the Celery workers, table creation and Alembic)
 sessionLocal = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 
+# Async engine over asyncpg for the FastAPI routers, so DB round trips don't block the event loop
+async_engine = create_async_engine(
+    make_url(conn).set(drivername="postgresql+asyncpg"),
+    pool_size=10,
+    max_overflow=20,
+)
+
+# AsyncSessionLocal creates AsyncSession instances for the API
+# (expire_on_commit=False so objects stay usable after commit without another query)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+# Metrics for every session (sync and async sessions share the same Session events):
+# pool checkout = from the start of a transaction until it has its connection
+@event.listens_for(Session, "after_transaction_create")
+def _transaction_created(session, transaction):
+    if transaction.parent is None:
+        session.info["transaction_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_begin")
+def _connection_acquired(session, transaction, connection):
+    started = session.info.pop("transaction_started", None)
+    if started is not None:
+        metrics.DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
 # Base class for our models
 Base = declarative_base()
 
 
 # Dependency function that provides a database session instance
 # Use this in FastAPI routes via Depends() to interact with the DB
-def get_db():
+async def get_db():
     # Create a new session
-    db = sessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         # Yield the session so it can be used by FastAPI endpoints
         yield db
-    finally:
-        db.close()
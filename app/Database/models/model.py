@@ -1,4 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    String,
+    ForeignKey,
+    DateTime,
+    Date,
+    Text,
+    Boolean,
+    Index,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from ..database import Base
 from datetime import datetime
 import uuid
@@ -17,20 +29,23 @@ class User(Base):
 
 
 # ---------------------- Video Metadata Table ----------------------
+# One row per YouTube video, keyed by its video ID and shared by every download of
+# it (who downloaded what is recorded in DownloadHistory). Written with upserts that
+# refresh the counters when newer ones come in.
 class VideoMetadata(Base):
     __tablename__ = "video_metadata"
-    id = Column(UUID(as_uuid=True), primary_key=True)
+    id = Column(String, primary_key=True)
     title = Column(String, nullable=False)
-    duration = Column(String, nullable=False)
-    views = Column(Integer, nullable=False)
-    likes = Column(Integer)
+    # Seconds
+    duration = Column(Integer, nullable=False)
+    views = Column(BigInteger, nullable=False)
+    likes = Column(BigInteger)
     channel = Column(String, nullable=False)
     thumbnail_url = Column(String, nullable=False)
-    published_date = Column(String, nullable=False)
+    published_date = Column(Date, nullable=False)
+    # When views and likes were read from YouTube
+    fetched_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.now())
-    user_id = Column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
-    )
 
 
 # ---------------------- Download History Table ----------------------
@@ -39,9 +54,11 @@ class DownloadHistory(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     url = Column(Text, nullable=False)
     download_url = Column(Text, nullable=False)
+    # Location of the downloaded file on the worker/API host (served by /files/{id})
+    file_path = Column(Text)
     status = Column(String, nullable=False)
     video_id = Column(
-        UUID(as_uuid=True),
+        String,
         ForeignKey("video_metadata.id", ondelete="CASCADE"),
         nullable=False,
     )
@@ -49,3 +66,41 @@ class DownloadHistory(Base):
         UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     download_at = Column(DateTime, default=datetime.now())
+
+    # Serves /history: per-user keyset pagination newest first (a page reads its rows
+    # from the heap; URLs are too long to be copied into the index)
+    __table_args__ = (
+        Index(
+            "ix_download_history_user_id_download_at",
+            "user_id",
+            download_at.desc(),
+            id.desc(),
+        ),
+    )
+
+
+# ---------------------- Download Cache Table ----------------------
+# Index of files already present in the download directory, keyed by
+# (YouTube video ID, format, quality, start/end) so repeat downloads can be
+# served without going back to YouTube
+class DownloadCache(Base):
+    __tablename__ = "download_cache"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache_key = Column(String, nullable=False, unique=True, index=True)
+    video_id = Column(String, nullable=False, index=True)
+    format = Column(String, nullable=False)
+    quality = Column(String, nullable=False)
+    start_time = Column(String)
+    end_time = Column(String)
+    accurate_trim = Column(Boolean, nullable=False, default=False)
+    # Storage location, also how /files finds the entry to track access
+    file_path = Column(Text, nullable=False, index=True)
+    file_size = Column(BigInteger, nullable=False)
+    video_metadata = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Drives LRU eviction by the storage janitor. Not indexed, so bumping it on
+    # every cache hit stays a cheap (HOT) update
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Set when the janitor deleted the file; the row keeps what is needed to
+    # download it again if an evicted history entry is requested
+    evicted_at = Column(DateTime)
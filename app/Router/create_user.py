@@ -1,10 +1,12 @@
+from uuid import UUID
 from fastapi import status, HTTPException, Depends, APIRouter
 
 from ..Database.models import model
 from ..Schema import metadata
 from ..Utils import utils
+from ..Core import auth2
 from ..Database.database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Create an APIRouter instance to handle routes related to users
 router = APIRouter(prefix="/users", tags=["Create User"])
@@ -13,10 +15,10 @@ router = APIRouter(prefix="/users", tags=["Create User"])
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=metadata.Userout)
-def create_user(user: metadata.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: metadata.UserCreate, db: AsyncSession = Depends(get_db)):
     # Hash the password before saving it to the database
-    # Assuming utils.hash() is a function that hashes the password
-    hashed_password = utils.hash(user.password)
+    # bcrypt is CPU bound, so it runs in the password hashing process pool
+    hashed_password = await utils.hash_async(user.password)
     # Update the password in the user object to the hashed password
     user.password = hashed_password
 
@@ -24,9 +26,11 @@ def create_user(user: metadata.UserCreate, db: Session = Depends(get_db)):
     new_user = model.User(**user.dict())
     # Add the new user to the database session
     db.add(new_user)
-    db.commit()
+    await db.commit()
     # Refresh the object to ensure it has the updated information (e.g., the ID)
-    db.refresh(new_user)
+    await db.refresh(new_user)
+    # Make sure no stale principal is cached under this ID
+    await auth2.invalidate_user(new_user.id)
     return new_user
 
 
@@ -34,9 +38,9 @@ def create_user(user: metadata.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/{id}", response_model=metadata.Userout)
-def get_user(id: str, db: Session = Depends(get_db)):
+async def get_user(id: UUID, db: AsyncSession = Depends(get_db)):
     # Query the database to find a user by their ID
-    user = db.query(model.User).filter(model.User.id == id).first()
+    user = await db.get(model.User, id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
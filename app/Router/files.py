@@ -0,0 +1,144 @@
+import os
+import uuid
+import asyncio
+import mimetypes
+from fastapi import HTTPException, Depends, APIRouter
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+from app.Database.models.model import User, DownloadHistory
+from ..Core import auth2
+from ..Core.config import S3_PRESIGN_EXPIRES
+from ..Core.redis_client import get_async_redis
+from ..Core.Service import download_cache, janitor, ownership, scheduling, storage
+from ..Core.Service.download import download_video
+from ..Core.Service.history import restore_download
+from ..Database.database import get_db
+from ..Utils.utils import canonical_video_url
+
+# How long a re-download of an evicted file is shared by concurrent requests,
+# and when clients are asked to retry
+RESTORE_LOCK_TTL = 60 * 60
+RESTORE_RETRY_AFTER = 10
+
+router = APIRouter(tags=["Files"])
+
+
+# Route to fetch a downloaded file (id is the DownloadHistory id from /history)
+# Files kept in S3 are answered with a redirect to a presigned URL, evicted files are
+# downloaded again (202 with the job ID); local files are sent by FileResponse,
+# which streams them in chunks and handles Range/206, ETag and Content-Length.
+@router.get("/files/{id}")
+async def get_file(
+    id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth2.get_current_user),
+):
+    history = await db.scalar(
+        select(DownloadHistory).where(
+            DownloadHistory.id == id, DownloadHistory.user_id == current_user.id
+        )
+    )
+    if not history:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Rows written before file_path existed stored the path in download_url
+    location = history.file_path or history.download_url
+
+    # Evicted by the storage janitor: download it again and let the client retry
+    if history.status == janitor.EVICTED_STATUS:
+        entry = await download_cache.find_by_location(db, location)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="File no longer available")
+        job_id = await restore_file(entry, current_user.id)
+        return JSONResponse(
+            status_code=202,
+            content={
+                "job_id": job_id,
+                "status": "PENDING",
+                "detail": "The file was removed from storage and is being downloaded again.",
+            },
+            headers={"Retry-After": str(RESTORE_RETRY_AFTER)},
+        )
+
+    await download_cache.touch(db, location)
+
+    # Files in object storage are downloaded straight from the bucket; the lease
+    # keeps the janitor from deleting the object while the URL is valid
+    presigned_url = await asyncio.to_thread(storage.url, location)
+    if presigned_url:
+        await janitor.lease_async(location, S3_PRESIGN_EXPIRES)
+        return RedirectResponse(presigned_url, status_code=307)
+
+    file_path = storage.local_path(location)
+    if not file_path or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File no longer available")
+
+    # Leased while the response is being sent
+    await janitor.lease_async(location)
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    return FileResponse(
+        file_path,
+        media_type=media_type,
+        filename=os.path.basename(file_path),
+        background=BackgroundTask(janitor.release_lease_async, location),
+    )
+
+
+# Enqueue the download of an evicted file once, however many requests ask for it;
+# the restore_download step then points the evicted history rows at the new copy
+async def restore_file(entry, user_id) -> str:
+    job_id = str(uuid.uuid4())
+    redis_client = get_async_redis()
+    key = f"storage:restore:{entry.cache_key}"
+    locked = False
+    try:
+        locked = await redis_client.set(key, job_id, nx=True, ex=RESTORE_LOCK_TTL)
+        if not locked:
+            existing = await redis_client.get(key)
+            if existing:
+                await ownership.grant([(existing.decode(), user_id)])
+                return existing.decode()
+    except RedisError:
+        pass
+
+    try:
+        await ownership.grant([(job_id, user_id)])
+
+        # The history URL may be a whole playlist, fetch just this video
+        url = canonical_video_url(entry.video_id)
+        queue = await asyncio.to_thread(
+            scheduling.choose_queue,
+            url,
+            entry.quality,
+            entry.format,
+            entry.start_time,
+            entry.end_time,
+        )
+        # Publishing blocks on the broker connection, keep it off the event loop
+        await asyncio.to_thread(
+            download_video.apply_async,
+            (
+                url,
+                entry.quality,
+                entry.format,
+                entry.start_time,
+                entry.end_time,
+                entry.accurate_trim,
+            ),
+            task_id=job_id,
+            queue=queue,
+            link=restore_download.s(entry.file_path),
+        )
+    except Exception:
+        # Nothing was queued: let the next request start the restore instead of
+        # joining a job that will never run
+        if locked:
+            try:
+                await redis_client.delete(key)
+            except RedisError:
+                pass
+        raise
+    return job_id
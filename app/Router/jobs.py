@@ -0,0 +1,282 @@
+import os
+import json
+import asyncio
+import mimetypes
+from typing import List
+from fastapi import (
+    HTTPException,
+    Depends,
+    APIRouter,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from celery.result import AsyncResult
+from starlette.background import BackgroundTask
+from app.Database.models.model import User
+from ..Core import auth2
+from ..Core.Service import janitor, ownership, progress, storage
+from ..Core.config import S3_PRESIGN_EXPIRES
+from ..Core.celery_worker.celery_worker import celery_app
+
+# Upper bound on the number of job IDs accepted by the batch lookup
+MAX_BATCH_LOOKUP = 100
+
+# Chunk size and poll interval used when following a file that is still being written
+FOLLOW_CHUNK_SIZE = 1024 * 1024
+FOLLOW_POLL_INTERVAL = 0.5
+
+# Keep-alive interval of idle event streams
+EVENT_HEARTBEAT_SECONDS = 15
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+# Jobs of other users are reported as missing (see ownership)
+def job_not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="Job not found")
+
+
+# Build the status payload for a single job from its Celery state
+def job_status(job_id: str) -> dict:
+    task_result = AsyncResult(job_id, app=celery_app)
+    state = task_result.state
+    payload = {"job_id": job_id, "status": state}
+
+    if state == "SUCCESS":
+        downloaded = []
+        for filepath, metadata in task_result.result or []:
+            if not filepath:
+                continue
+            downloaded.append(
+                {
+                    "Status": "Success",
+                    "filepath": filepath,
+                    "download_url": storage.url(filepath),
+                    "title": metadata.get("title"),
+                    "duration": metadata.get("duration"),
+                    "views": metadata.get("views"),
+                    "likes": metadata.get("likes"),
+                    "channel": metadata.get("channel"),
+                    "thumbnail_url": metadata.get("thumbnail_url"),
+                    "published_date": metadata.get("published_date"),
+                }
+            )
+        payload["downloaded_videos"] = downloaded
+    elif state in ("FAILURE", "RETRY"):
+        # RETRY: a transient failure, the job is retried after a backoff
+        payload["error"] = str(task_result.result)
+
+    return payload
+
+
+# Route to look up several jobs at once (/jobs?ids=<id>&ids=<id>)
+@router.get("")
+def get_jobs(
+    ids: List[str] = Query(...),
+    current_user: User = Depends(auth2.get_current_user),
+):
+    if len(ids) > MAX_BATCH_LOOKUP:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_LOOKUP} job IDs can be looked up at once.",
+        )
+
+    return {
+        "jobs": [
+            (job_status(job_id) if owned else {"job_id": job_id, "status": "NOT_FOUND"})
+            for job_id, owned in zip(ids, ownership.owned(ids, current_user.id))
+        ]
+    }
+
+
+# Route to get the status (and result once finished) of a download job
+@router.get("/{job_id}")
+def get_job(job_id: str, current_user: User = Depends(auth2.get_current_user)):
+    if not ownership.owns(job_id, current_user.id):
+        raise job_not_found()
+    return job_status(job_id)
+
+
+# State of a job in the result backend (a fresh AsyncResult per call, called in a thread)
+def job_state(job_id: str) -> str:
+    return AsyncResult(job_id, app=celery_app).state
+
+
+# Wait until a followed job may have written more, and return whether its file is
+# still being written. Progress events wake the reader up; without events the result
+# backend is asked every FOLLOW_POLL_INTERVAL seconds. A job that is retried or fails
+# while its file is streamed aborts the response, so the client never takes a
+# truncated file for a complete one.
+async def still_writing(job_id: str, queue: asyncio.Queue) -> bool:
+    try:
+        event = json.loads(await asyncio.wait_for(queue.get(), FOLLOW_POLL_INTERVAL))
+    except asyncio.TimeoutError:
+        state = await asyncio.to_thread(job_state, job_id)
+    else:
+        if event.get("event") == "progress":
+            return event.get("status") != "finished"
+        state = event.get("state")
+    if state in ("RETRY", "FAILURE"):
+        raise RuntimeError(f"Job {job_id} stopped while its file was streamed: {state}")
+    return state in ("DOWNLOADING", None)
+
+
+# Read a file that yt-dlp is still writing and yield new bytes as they arrive.
+# The file descriptor survives yt-dlp renaming the .part file, so reading stops
+# once the download has finished and everything has been read.
+async def follow_file(path: str, job_id: str):
+    async with progress.hub.subscribe(job_id) as queue:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, FOLLOW_CHUNK_SIZE)
+                if chunk:
+                    yield chunk
+                    continue
+                if not await still_writing(job_id, queue):
+                    # Drain whatever was written between the last read and the end
+                    chunk = await asyncio.to_thread(f.read, FOLLOW_CHUNK_SIZE)
+                    while chunk:
+                        yield chunk
+                        chunk = await asyncio.to_thread(f.read, FOLLOW_CHUNK_SIZE)
+                    return
+
+
+# Route to stream a job's file: finished single-video jobs are served like /files/{id},
+# jobs still downloading a streamable (single-file) format are followed while written
+@router.get("/{job_id}/file")
+def get_job_file(job_id: str, current_user: User = Depends(auth2.get_current_user)):
+    if not ownership.owns(job_id, current_user.id):
+        raise job_not_found()
+    task_result = AsyncResult(job_id, app=celery_app)
+    state = task_result.state
+
+    if state == "SUCCESS":
+        result = task_result.result or []
+        if len(result) != 1:
+            raise HTTPException(status_code=404, detail="File not found")
+        location = result[0][0]
+        presigned_url = storage.url(location)
+        if presigned_url:
+            janitor.lease(location, S3_PRESIGN_EXPIRES)
+            return RedirectResponse(presigned_url, status_code=307)
+        file_path = storage.local_path(location)
+        if not file_path or not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        # Leased so the storage janitor keeps the file while it is being sent
+        janitor.lease(location)
+        media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return FileResponse(
+            file_path,
+            media_type=media_type,
+            filename=os.path.basename(file_path),
+            background=BackgroundTask(janitor.release_lease, location),
+        )
+
+    if state == "DOWNLOADING":
+        stream_path = (task_result.info or {}).get("stream_path")
+        if stream_path and os.path.isfile(stream_path):
+            filename = os.path.basename((task_result.info or {}).get("filename") or "")
+            media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            return StreamingResponse(
+                follow_file(stream_path, job_id),
+                media_type=media_type,
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            )
+
+    if state == "FAILURE":
+        raise HTTPException(status_code=404, detail="Download failed")
+
+    raise HTTPException(
+        status_code=409,
+        detail=f"File is not available for streaming yet (job status: {state})",
+    )
+
+
+# Events of a job for /jobs/{job_id}/events: a job that has already finished yields
+# its final status once (one result backend read, the backend is never polled);
+# otherwise the last published event, then live events until the job finishes.
+# None is yielded when no event arrived for EVENT_HEARTBEAT_SECONDS (keep-alive).
+async def job_events(job_id: str):
+    async with progress.hub.subscribe(job_id) as queue:
+        payload = await asyncio.to_thread(job_status, job_id)
+        if payload["status"] in progress.TERMINAL_STATES:
+            yield json.dumps({"event": "state", "state": payload["status"], **payload})
+            return
+
+        last = await progress.last_event(job_id)
+        if last:
+            yield last.decode()
+            if progress.is_terminal(last):
+                return
+
+        while True:
+            try:
+                raw = await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield raw.decode()
+            if progress.is_terminal(raw):
+                return
+
+
+# Route to follow a job's progress as Server-Sent Events
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str, current_user: User = Depends(auth2.get_current_user)
+):
+    if not await ownership.owns_async(job_id, current_user.id):
+        raise job_not_found()
+
+    async def stream():
+        async for event in job_events(job_id):
+            yield ": keep-alive\n\n" if event is None else f"data: {event}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# WebSocket variant of /jobs/{job_id}/events: one JSON message per event, the socket
+# is closed by the server once the job has finished
+@router.websocket("/{job_id}/events")
+async def job_events_socket(
+    websocket: WebSocket,
+    job_id: str,
+    current_user: User = Depends(auth2.get_websocket_user),
+):
+    if not await ownership.owns_async(job_id, current_user.id):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    await websocket.accept()
+
+    async def forward():
+        async for event in job_events(job_id):
+            if event is not None:
+                await websocket.send_text(event)
+
+    # Watch for the client going away while no events arrive
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    forwarder = asyncio.create_task(forward())
+    watcher = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait(
+            {forwarder, watcher}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if forwarder in done:
+            forwarder.result()
+            await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        forwarder.cancel()
+        watcher.cancel()
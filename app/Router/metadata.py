@@ -0,0 +1,59 @@
+from fastapi import HTTPException, Depends, APIRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.Database.models.model import User
+from ..Core import auth2
+from ..Core.Service import video_metadata
+from ..Database.database import get_db
+from ..Schema.metadata import (
+    MetadataBatchRequest,
+    MetadataBatchResponse,
+    VideoMetadataResponse,
+    YOUTUBE_URL_REGEX,
+)
+from ..Utils.utils import extract_video_id, is_playlist_url
+
+router = APIRouter(prefix="/metadata", tags=["Metadata"])
+
+
+# Route to get the metadata of a video without downloading it (no quota is used).
+# Known videos are a primary key read; unknown ones are probed (see video_metadata).
+@router.get("", response_model=VideoMetadataResponse)
+async def get_metadata(
+    url: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth2.get_current_user),
+):
+    # Same URLs as POST /metadata and /download: single YouTube videos only
+    video_id = extract_video_id(url)
+    if not video_id or not YOUTUBE_URL_REGEX.match(url) or is_playlist_url(url):
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL format.")
+
+    metadata, error = (await video_metadata.lookup(db, [video_id]))[video_id]
+    # The probe was slow or YouTube failed: worth retrying, unlike a missing video
+    if error in video_metadata.TRANSIENT_ERRORS:
+        raise HTTPException(
+            status_code=504 if error == video_metadata.TIMED_OUT else 503,
+            detail=error,
+            headers={"Retry-After": str(video_metadata.PROBE_RETRY_AFTER)},
+        )
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return metadata
+
+
+# Route to get the metadata of many videos at once, one entry per URL in request order.
+# The lookup costs one database query, one cache read and one probe round for the batch.
+@router.post("", response_model=MetadataBatchResponse)
+async def get_metadata_batch(
+    batch: MetadataBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth2.get_current_user),
+):
+    video_ids = [extract_video_id(url) for url in batch.urls]
+    found = await video_metadata.lookup(db, list(dict.fromkeys(video_ids)))
+
+    items = []
+    for url, video_id in zip(batch.urls, video_ids):
+        metadata, error = found[video_id]
+        items.append({"url": url, "metadata": metadata, "error": error})
+    return {"items": items}
@@ -1,139 +1,379 @@
-from fastapi import HTTPException, Depends, APIRouter
+import uuid
+import base64
+import asyncio
+from collections import Counter
+from typing import Optional
+from fastapi import HTTPException, Depends, APIRouter, Query, status
 from app.Database.models.model import User
-from ..Core import auth2
-from sqlalchemy.orm import Session
+from ..Core import auth2, metrics
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..Database.database import get_db
-from ..Schema.metadata import DownloadRequest
-from ..Core.Service.download import download_video
-from app.Database.models.model import VideoMetadata, DownloadHistory
-from datetime import datetime, timedelta
-from sqlalchemy import func, and_
-from ..Core.config import DOWNLOAD_LIMIT_PER_DAY
-
-DOWNLOAD_LIMIT = DOWNLOAD_LIMIT_PER_DAY
+from ..Schema.metadata import DownloadRequest, DownloadBatchRequest
+from ..Core.Service.download import download_video, download_playlist
+from ..Core.Service.history import record_download
+from ..Core.Service import download_cache, ownership, quota, scheduling, singleflight
+from ..Core.Service.quota import release_quota
+from ..Core.celery_worker.celery_worker import celery_app
+from .jobs import job_status
+from celery.result import AsyncResult, GroupResult
+from app.Database.models.model import DownloadHistory
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from ..Core.config import HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from ..Utils.utils import (
+    is_playlist_url,
+    extract_video_id,
+    canonical_video_url,
+    clip_range,
+)
 
 router = APIRouter(tags=["User Information"])
 
 
-# Route to get the download history of a user
+# Cursor for keyset pagination: the (download_at, id) of the last row of a page
+def encode_cursor(download_at: datetime, id: int) -> str:
+    raw = f"{download_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        download_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(download_at), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Route to get the download history of a user, newest first.
+# Pages are read with keyset pagination on (download_at, id), which is served by the
+# (user_id, download_at DESC, id DESC) index, so every page costs the same.
 @router.get("/history")
 async def get_download_history(
-    db: Session = Depends(get_db), current_user: int = Depends(auth2.get_current_user)
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth2.get_current_user),
 ):
-    # Query the DownloadHistory table to fetch all download history for the current user
-    history = db.query(DownloadHistory).all()
+    # Only select the columns the response needs, no ORM objects
+    query = select(
+        DownloadHistory.id,
+        DownloadHistory.url,
+        DownloadHistory.status,
+        DownloadHistory.download_at,
+        DownloadHistory.download_url,
+    ).where(DownloadHistory.user_id == current_user.id)
 
-    if not history:
+    if status_filter:
+        query = query.where(DownloadHistory.status == status_filter)
+    if since:
+        query = query.where(DownloadHistory.download_at >= since)
+    if until:
+        query = query.where(DownloadHistory.download_at < until)
+    if cursor:
+        query = query.where(
+            tuple_(DownloadHistory.download_at, DownloadHistory.id)
+            < tuple_(*decode_cursor(cursor))
+        )
+
+    # Fetch one extra row to know whether there is a next page
+    query = query.order_by(
+        DownloadHistory.download_at.desc(), DownloadHistory.id.desc()
+    ).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    if not rows and not cursor:
         raise HTTPException(status_code=404, detail="No download history found")
 
-    return [
-        {
-            "url": item.url,
-            "status": item.status,
-            "download_at": item.download_at,
-            "download_url": item.download_url,
-        }
-        for item in history
-    ]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].download_at, rows[-1].id)
 
+    return {
+        "items": [
+            {
+                "url": row.url,
+                "status": row.status,
+                "download_at": row.download_at,
+                "download_url": row.download_url,
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+# Task, URL and single-flight key of a download request. Single videos are fetched
+# by their canonical URL and share a flight with identical requests (see singleflight).
+def describe_request(request: DownloadRequest) -> tuple:
+    if is_playlist_url(request.url):
+        return download_playlist, request.url, None
+    video_id = extract_video_id(request.url)
+    if not video_id:
+        return download_video, request.url, None
+    flight = download_cache.make_cache_key(
+        video_id,
+        request.format,
+        request.quality,
+        *clip_range(request.start_time, request.end_time, request.accurate_trim),
+    )
+    return download_video, canonical_video_url(video_id), flight
 
-# Route to initiate a download request
-@router.post("/download")
+
+# Signature of a download job. The metadata and history rows are written by the
+# `record_download` completion step on the worker, a failed download gives its quota
+# reservation back, and the job's flight hands its result to the joined requests.
+def job_signature(
+    task,
+    request: DownloadRequest,
+    url: str,
+    flight: Optional[str],
+    job_id: str,
+    user_id: str,
+    quota_day: str,
+    queue: str,
+    priority: int,
+):
+    links = [record_download.s(user_id, request.url)]
+    error_links = [release_quota.s(user_id, quota_day)]
+    if flight:
+        links.append(singleflight.complete_flight.s(flight, job_id))
+        error_links.append(singleflight.fail_flight.s(flight, job_id))
+    return task.signature(
+        (
+            url,
+            request.quality,
+            request.format,
+            request.start_time,
+            request.end_time,
+            request.accurate_trim,
+        ),
+        # Per-user bandwidth and connection limits on the worker
+        {"user_id": user_id},
+        task_id=job_id,
+        queue=queue,
+        priority=priority,
+        link=links,
+        link_error=error_links,
+    )
+
+
+# Route to initiate a download request (returns a job ID, see /jobs/{job_id})
+@router.post("/download", status_code=status.HTTP_202_ACCEPTED)
 async def download(
     request: DownloadRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth2.get_current_user),
 ):
 
-    today = datetime.utcnow().date()
-    start_of_day = datetime(today.year, today.month, today.day)
-    end_of_day = start_of_day + timedelta(days=1)
-
-    # 2. Count user’s downloads today
-    download_count = (
-        db.query(func.count(DownloadHistory.id))
-        .filter(
-            and_(
-                DownloadHistory.user_id == current_user.id,
-                DownloadHistory.download_at >= start_of_day,
-                DownloadHistory.download_at < end_of_day,
-            )
-        )
-        .scalar()
-    )
+    # Reserve the download against the daily quota and rate limit (one atomic Redis call)
+    quota_day, quota_token = await quota.reserve(db, current_user.id)
 
-    if download_count >= DOWNLOAD_LIMIT:
-        raise HTTPException(
-            status_code=403,
-            detail="Daily download limit reached. Login with another account or try again tomorrow.",
-        )
+    user_id = str(current_user.id)
+    job_id = str(uuid.uuid4())
+    task, url, flight = describe_request(request)
 
-    if request.start_time is None and request.end_time is None:
-        task_result = download_video.delay(request.url, request.quality, request.format)
+    # Identical downloads already in flight are joined instead of run again
+    if flight:
+        waiter = {"user_id": user_id, "url": request.url, "day": quota_day}
+        leader = await singleflight.join(flight, job_id, waiter)
+        if leader:
+            await ownership.grant([(leader, current_user.id)])
+            return {"job_id": leader, "status": "PENDING"}
+
+    # Playlists are probed once (on the default queue) and fanned out across the
+    # workers entry by entry; single videos go to the queue matching their cost
+    if task is download_playlist:
+        queue = scheduling.DEFAULT_QUEUE
+        priority = await scheduling.claim(current_user.id)
     else:
-        task_result = download_video.delay(
-            request.url,
+        queue, priority = await scheduling.plan(
+            current_user.id,
+            url,
             request.quality,
             request.format,
             request.start_time,
             request.end_time,
         )
 
+    # Enqueue the download and return immediately
+    signature = job_signature(
+        task, request, url, flight, job_id, user_id, quota_day, queue, priority
+    )
     try:
-        # Wait for the Celery task to complete and retrieve the result
-        result = task_result.get(timeout=99999999999)
-        if not isinstance(result, list):
-            result = [result]  # wrap single video result in a list
-        # filepath, metadata_dict = result
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error downloading video: {str(e)}"
+        await ownership.grant([(job_id, current_user.id)])
+        # Publishing blocks on the broker connection, keep it off the event loop
+        with metrics.ENQUEUE_SECONDS.time():
+            await asyncio.to_thread(signature.apply_async)
+    except Exception:
+        await quota.release(current_user.id, quota_day, token=quota_token)
+        await scheduling.release_async(current_user.id)
+        if flight:
+            await singleflight.abandon(flight, job_id)
+        raise
+
+    return {"job_id": job_id, "status": "PENDING"}
+
+
+# Publish signatures over one producer connection. Publishing blocks on the broker, so
+# this runs in a thread; `published` collects the signatures sent so far, letting the
+# caller give back what a failure left unpublished.
+def publish_all(signatures: list, published: list) -> None:
+    with celery_app.producer_or_acquire() as producer:
+        for signature in signatures:
+            signature.apply_async(producer=producer)
+            published.append(signature)
+
+
+# Route to submit many downloads at once (returns a batch ID and a job ID per item).
+# The whole batch is validated up front, identical items become one job, and the
+# quota check, flight joins, queue planning and publishing each cost one round trip
+# for the batch instead of one per item.
+@router.post("/download/batch", status_code=status.HTTP_202_ACCEPTED)
+async def download_batch(
+    batch: DownloadBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth2.get_current_user),
+):
+    user_id = str(current_user.id)
+
+    # Dedupe: items with the same variant (or the same playlist request) share a job
+    jobs = {}
+    item_keys = []
+    for request in batch.items:
+        task, url, flight = describe_request(request)
+        key = flight or (
+            url,
+            request.format,
+            request.quality,
+            *clip_range(request.start_time, request.end_time, request.accurate_trim),
         )
+        item_keys.append(key)
+        if key not in jobs:
+            jobs[key] = {
+                "request": request,
+                "task": task,
+                "url": url,
+                "flight": flight,
+                "job_id": str(uuid.uuid4()),
+            }
+
+    # One atomic reservation for every distinct download of the batch
+    quota_day, quota_token = await quota.reserve(db, current_user.id, len(jobs))
 
-    if not result:
-        raise HTTPException(status_code=400, detail="Download failed")
-
-    # Initialize a list to hold responses for each downloaded video
-    responses = []
-
-    # Iterate over the download results (file path and metadata)
-    for filepath, metadata_dict in result:
-        if not filepath:
-            continue
-
-        # Store metadata in DB
-        metadata = VideoMetadata(**metadata_dict)
-        metadata.user_id = current_user.id
-        db.add(metadata)
-        db.commit()
-        db.refresh(metadata)
-
-        # Store download history
-        history = DownloadHistory(
-            url=request.url,
-            video_id=metadata_dict["id"],
-            status="Success",
-            download_at=datetime.utcnow(),
-            download_url=filepath,
-            user_id=current_user.id,
+    # Join the downloads already in flight
+    flying = [job for job in jobs.values() if job["flight"]]
+    leaders = await singleflight.join_many(
+        [
+            (
+                job["flight"],
+                job["job_id"],
+                {"user_id": user_id, "url": job["request"].url, "day": quota_day},
+            )
+            for job in flying
+        ]
+    )
+    for job, leader in zip(flying, leaders):
+        if leader:
+            job["job_id"] = leader
+            job["joined"] = True
+
+    pending = [job for job in jobs.values() if not job.get("joined")]
+    signatures = []
+    if pending:
+        plans = await scheduling.plan_batch(
+            user_id,
+            [
+                (
+                    job["url"],
+                    job["request"].quality,
+                    job["request"].format,
+                    job["request"].start_time,
+                    job["request"].end_time,
+                )
+                for job in pending
+            ],
         )
-        db.add(history)
-        db.commit()
-        db.refresh(history)
+        signatures = [
+            job_signature(
+                job["task"],
+                job["request"],
+                job["url"],
+                job["flight"],
+                job["job_id"],
+                user_id,
+                quota_day,
+                queue,
+                priority,
+            )
+            for job, (queue, priority) in zip(pending, plans)
+        ]
 
-        # Append the result (metadata) to the response list
-        responses.append(
-            {
-                "Status": "Success",
-                "filepath": filepath,
-                "title": metadata.title,
-                "duration": metadata.duration,
-                "views": metadata.views,
-                "likes": metadata.likes,
-                "channel": metadata.channel,
-                "thumbnail_url": metadata.thumbnail_url,
-                "published_date": metadata.published_date,
-            }
+    # Only the submitter (and users joining its jobs) may read the batch and its jobs
+    batch_id = str(uuid.uuid4())
+    job_ids = list(dict.fromkeys(job["job_id"] for job in jobs.values()))
+
+    # Publish every job over one producer connection (in a thread, see publish_all)
+    published = []
+    try:
+        await ownership.grant(
+            [(job_id, current_user.id) for job_id in [batch_id, *job_ids]]
         )
+        with metrics.ENQUEUE_SECONDS.time():
+            await asyncio.to_thread(publish_all, signatures, published)
+    except Exception:
+        unpublished = pending[len(published) :]
+        await quota.release(
+            current_user.id, quota_day, len(unpublished), token=quota_token
+        )
+        await scheduling.release_async(current_user.id, len(unpublished))
+        for job in unpublished:
+            if job["flight"]:
+                await singleflight.abandon(job["flight"], job["job_id"])
+        raise
+
+    # The batch is a saved GroupResult over its jobs (see /download/batch/{batch_id})
+    await asyncio.to_thread(
+        GroupResult(
+            batch_id, [AsyncResult(job_id, app=celery_app) for job_id in job_ids]
+        ).save,
+        backend=celery_app.backend,
+    )
+
+    return {
+        "batch_id": batch_id,
+        "status": "PENDING",
+        "jobs": [
+            {"url": request.url, "job_id": jobs[key]["job_id"]}
+            for request, key in zip(batch.items, item_keys)
+        ],
+    }
+
+
+# Route to get the aggregate progress of a batch and the status of each of its jobs
+@router.get("/download/batch/{batch_id}")
+def get_download_batch(
+    batch_id: str, current_user: User = Depends(auth2.get_current_user)
+):
+    if not ownership.owns(batch_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch = GroupResult.restore(batch_id, app=celery_app)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
 
-    return {"downloaded_videos": responses}
+    jobs = [job_status(result.id) for result in batch.results]
+    counts = Counter(job["status"] for job in jobs)
+    finished = counts["SUCCESS"] + counts["FAILURE"]
+    return {
+        "batch_id": batch_id,
+        "status": "SUCCESS" if finished == len(jobs) else "PENDING",
+        "total": len(jobs),
+        "succeeded": counts["SUCCESS"],
+        "failed": counts["FAILURE"],
+        "pending": len(jobs) - finished,
+        "progress": finished / len(jobs) if jobs else 1.0,
+        "jobs": jobs,
+    }
@@ -1,9 +1,10 @@
 from fastapi import status, HTTPException, Depends, APIRouter
+from sqlalchemy import select
 from ..Database.models import model
 from ..Utils import utils
 from ..Core import auth2
 from ..Database.database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 
 # Create a new APIRouter instance for user authentication routes
@@ -12,15 +13,13 @@ router = APIRouter(tags=["User Login"])
 
 # Route to handle user login and generate access token
 @router.post("/login")
-def login(
+async def login(
     user_credentials: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # Query the User table to find a user by the provided email (username)
-    user = (
-        db.query(model.User)
-        .filter(model.User.email == user_credentials.username)
-        .first()
+    user = await db.scalar(
+        select(model.User).where(model.User.email == user_credentials.username)
     )
     if not user:
         raise HTTPException(
@@ -28,12 +27,21 @@ def login(
         )
 
     # Verify if the provided password matches the stored hashed password
-    if not utils.verify(user_credentials.password, user.password):
+    # (bcrypt is CPU bound, so it runs in the password hashing process pool)
+    valid, new_hash = await utils.verify_and_update_async(
+        user_credentials.password, user.password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email and passsword",
         )
 
+    # The stored hash uses an old work factor: replace it while we have the password
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
     # If credentials are valid, create an access token for the user
     access_token = auth2.create_access_token(data={"user_id": str(user.id)})
 
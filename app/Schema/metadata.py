@@ -1,8 +1,17 @@
-from pydantic import BaseModel, EmailStr, ConfigDict, field_validator
-from datetime import datetime
-from typing import Optional
+from pydantic import (
+    BaseModel,
+    EmailStr,
+    ConfigDict,
+    Field,
+    field_validator,
+    model_validator,
+)
+from datetime import date, datetime
+from typing import List, Optional
 from uuid import UUID as uuid
 import re
+from ..Core.config import BATCH_MAX_ITEMS
+from ..Utils.utils import to_seconds
 
 # Regular expression patterns to validate YouTube video and playlist URLs
 YOUTUBE_URL_REGEX = re.compile(
@@ -13,7 +22,8 @@ YOUTUBE_PLAYLIST_REGEX = re.compile(
 )
 
 # Set of allowed formats for downloading
-ALLOWED_FORMATS = {"mp4", "webm", "mp3"}
+# (m4a and opus are served as downloaded, without re-encoding; mp3 is encoded)
+ALLOWED_FORMATS = {"mp4", "webm", "mp3", "m4a", "opus"}
 
 
 # Pydantic model to handle user creation (with email and password)
@@ -56,6 +66,9 @@ class DownloadRequest(BaseModel):
     quality: str
     start_time: Optional[str] = None
     end_time: Optional[str] = None
+    # Re-encode around the cut points so clips start/end exactly on the requested time
+    # (default cuts on the nearest keyframes, which is faster)
+    accurate_trim: bool = False
 
     # Validator to ensure that both start_time and end_time are provided if one is given
     @field_validator("start_time", "end_time")
@@ -68,6 +81,14 @@ class DownloadRequest(BaseModel):
                 raise ValueError(f"Invalid time format for {value}. Use HH:MM:SS.")
         return value
 
+    # Validator to reject empty or inverted clips before any quota is reserved
+    @model_validator(mode="after")
+    def validate_clip_range(self):
+        if self.start_time and self.end_time:
+            if to_seconds(self.end_time) <= to_seconds(self.start_time):
+                raise ValueError("end_time must be after start_time.")
+        return self
+
     # Validator for the 'url' field to check if it is a valid YouTube URL
     @field_validator("url")
     @classmethod
@@ -86,12 +107,46 @@ class DownloadRequest(BaseModel):
         return value
 
 
+# Pydantic model for a batch of download requests (every item is validated)
+class DownloadBatchRequest(BaseModel):
+    items: List[DownloadRequest] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+# Pydantic model for a batch metadata lookup (every URL is validated)
+class MetadataBatchRequest(BaseModel):
+    urls: List[str] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+    # Validator for the 'urls' field: single YouTube videos only
+    @field_validator("urls")
+    @classmethod
+    def validate_youtube_urls(cls, value):
+        for url in value:
+            DownloadRequest.validate_youtube_url(url)
+        return value
+
+
 # Pydantic model for the response returned when querying video metadata
 class VideoMetadataResponse(BaseModel):
+    # YouTube video ID
+    id: str
     title: str
-    duration: str
+    # Seconds
+    duration: int
     views: int
-    likes: int
-    channel: str
-    thumbnail_url: str
-    published_date: str
+    likes: Optional[int] = None
+    # Missing for some videos when served from a probe or the probe cache
+    channel: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    published_date: date
+
+
+# Pydantic model for one entry of a batch metadata lookup (metadata or an error)
+class MetadataBatchItem(BaseModel):
+    url: str
+    metadata: Optional[VideoMetadataResponse] = None
+    error: Optional[str] = None
+
+
+# Pydantic model for the response of a batch metadata lookup, in request order
+class MetadataBatchResponse(BaseModel):
+    items: List[MetadataBatchItem]
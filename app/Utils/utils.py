@@ -1,7 +1,31 @@
+import re
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from ..Core.config import (
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+)
 
 # Create a CryptContext object to manage password hashing algorithms (using bcrypt)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# The work factor comes from BCRYPT_ROUNDS; hashes made with a different cost are
+# reported by verify_and_update() so they get rehashed on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt is CPU bound, so hashing runs in a dedicated process pool (scales past the GIL
+# and keeps the event loop and the request threadpool free). Created on first use.
+_hash_pool = None
+_pending_hashes = 0
 
 
 # Function to hash the password
@@ -14,3 +38,86 @@ def hash(password: str):
 def verify(plain_password, hashed_password):
     # Check if the plain password matches the hashed password using bcrypt
     return pwd_context.verify(plain_password, hashed_password)
+
+
+# Function to verify a password and get a new hash back if the stored one uses an old cost
+def verify_and_update(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # spawn: forking a process that runs an event loop and threads is not safe
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hash_pool
+
+
+# Run a hashing function in the pool; when too many hashes are already waiting,
+# fail fast with 503 instead of letting login latency pile up
+async def run_in_hash_pool(func, *args):
+    global _pending_hashes
+    if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_pool(), func, *args)
+    finally:
+        _pending_hashes -= 1
+
+
+# Async versions of hash() / verify_and_update() for the routers
+async def hash_async(password: str) -> str:
+    return await run_in_hash_pool(hash, password)
+
+
+async def verify_and_update_async(plain_password, hashed_password) -> tuple:
+    return await run_in_hash_pool(verify_and_update, plain_password, hashed_password)
+
+
+# Pattern used to pull the 11 character video ID out of a YouTube URL
+YOUTUBE_ID_REGEX = re.compile(
+    r"(?:v=|youtu\.be/|youtube\.com/(?:shorts/|embed/)?)([\w\-]{11})(?![\w\-])"
+)
+
+
+# Function to extract the YouTube video ID from a URL (None if the URL has no video ID)
+def extract_video_id(url: str) -> Optional[str]:
+    match = YOUTUBE_ID_REGEX.search(url)
+    return match.group(1) if match else None
+
+
+# Function to build the canonical watch URL of a video, so the many URL forms of one
+# video (youtu.be, shorts, extra query parameters) share caches and in-flight jobs
+def canonical_video_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+# Function to check whether a URL points at a playlist (watch?v=...&list=... included)
+def is_playlist_url(url: str) -> bool:
+    return "list=" in url
+
+
+# Utility function to convert "HH:MM:SS" into seconds
+def to_seconds(value: str) -> int:
+    hours, minutes, seconds = (int(part) for part in value.split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+# Utility function to normalise a requested clip: trimming only happens when both
+# ends are given, otherwise it is a full download (and accurate trim does not apply)
+def clip_range(
+    start_time: Optional[str], end_time: Optional[str], accurate_trim: bool = False
+) -> tuple:
+    if not (start_time and end_time):
+        return None, None, False
+    return start_time, end_time, accurate_trim
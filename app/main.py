@@ -1,8 +1,9 @@
 from fastapi import FastAPI
-from app.Router import create_user, post, user_login
+from app.Router import create_user, post, user_login, jobs, files, metadata
 from app.Database.models.model import Base
 from .Database.database import engine
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 
 # Create the database tables defined by the models (i.e., `User`, `VideoMetadata`, `DownloadHistory`, etc.)
 Base.metadata.create_all(bind=engine)
@@ -31,7 +32,14 @@ def root():
     return {"message": "Welcome to the YouTube Downloader API", "status": "Running"}
 
 
+# Prometheus metrics (queue wait, DB commit/pool checkout, quota check, enqueue time)
+app.mount("/metrics", make_asgi_app())
+
+
 # Include the routers for different routes of the application
 app.include_router(post.router)
+app.include_router(jobs.router)
+app.include_router(files.router)
+app.include_router(metadata.router)
 app.include_router(user_login.router)
 app.include_router(create_user.router)
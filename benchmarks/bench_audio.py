@@ -0,0 +1,114 @@
+"""CPU-seconds per audio minute of the audio pipeline.
+
+Compares the previous mp3 path (yt-dlp's FFmpegExtractAudio re-encoding to 192k mp3
+inside the download job) with the paths used now: m4a and opus passthrough (the
+same post-processor, which only remuxes when the track already has the codec) and
+the transcode pool's mp3 encode at different ffmpeg thread counts. CPU time is the
+user + system time of the ffmpeg/ffprobe child processes. Requires ffmpeg.
+
+    python -m benchmarks.bench_audio --minutes 10 --threads 1 2 4
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+def child_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def make_source(path: str, minutes: int, codec: str) -> None:
+    # Pink noise under a tone: encoders work about as hard as on real music
+    source = (
+        f"anoisesrc=color=pink:amplitude=0.3:duration={minutes * 60}[n];"
+        f"sine=frequency=440:duration={minutes * 60}[s];[n][s]amix=inputs=2"
+    )
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+        + ["-filter_complex", source, "-ac", "2", "-ar", "48000"]
+        + (["-c:a", "aac", "-b:a", "128k"] if codec == "aac" else [])
+        + (["-c:a", "libopus", "-b:a", "128k"] if codec == "opus" else [])
+        + [path],
+        check=True,
+    )
+
+
+def measure(name: str, minutes: int, run) -> None:
+    cpu_before = child_cpu_seconds()
+    started = time.perf_counter()
+    run()
+    wall = time.perf_counter() - started
+    cpu = child_cpu_seconds() - cpu_before
+    print(
+        f"{name:<28} {cpu / minutes:8.3f} CPU-s/audio-min  "
+        f"{wall:7.2f} s wall  {minutes * 60 / wall:8.1f}x realtime"
+    )
+
+
+def extract_audio(directory: str, source: str, ext: str, codec: str, quality=None):
+    from yt_dlp import YoutubeDL
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+    # The post-processor works in place, so run it on a fresh copy every time
+    path = os.path.join(directory, f"run-{codec}.{ext}")
+    shutil.copyfile(source, path)
+
+    def run():
+        with YoutubeDL({"quiet": True}) as ydl:
+            pp = FFmpegExtractAudioPP(
+                ydl, preferredcodec=codec, preferredquality=quality
+            )
+            pp.run({"filepath": path, "ext": ext})
+
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=10)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        raise SystemExit("ffmpeg is required for this benchmark")
+
+    from app.Core.Service import transcode
+
+    with tempfile.TemporaryDirectory() as directory:
+        m4a = os.path.join(directory, "source.m4a")
+        webm = os.path.join(directory, "source.webm")
+        make_source(m4a, args.minutes, "aac")
+        make_source(webm, args.minutes, "opus")
+
+        measure(
+            "mp3 in job (previous path)",
+            args.minutes,
+            extract_audio(directory, m4a, "m4a", "mp3", "192"),
+        )
+        measure(
+            "m4a passthrough",
+            args.minutes,
+            extract_audio(directory, m4a, "m4a", "m4a"),
+        )
+        measure(
+            "opus passthrough",
+            args.minutes,
+            extract_audio(directory, webm, "webm", "opus"),
+        )
+        for threads in args.threads:
+            target = os.path.join(directory, f"threads-{threads}.mp3")
+            measure(
+                f"mp3 transcode threads={threads}",
+                args.minutes,
+                lambda: transcode.encode_mp3(m4a, target, threads),
+            )
+
+
+if __name__ == "__main__":
+    main()
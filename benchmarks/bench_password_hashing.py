@@ -0,0 +1,60 @@
+"""Logins per second per core for the bcrypt hashing pool.
+
+Runs bursts of concurrent password verifications through the same process pool
+the /login route uses and reports throughput for the configured work factor.
+
+    python -m benchmarks.bench_password_hashing --logins 400 --rounds 10 12
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+
+async def run_burst(utils, stored_hash: str, logins: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            utils.verify_and_update_async("benchmark-password", stored_hash)
+            for _ in range(logins)
+        )
+    )
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[12])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    for rounds in args.rounds:
+        # The pool reads its settings at import time, so configure before importing
+        os.environ["BCRYPT_ROUNDS"] = str(rounds)
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+        os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.logins)
+
+        import importlib
+        from app.Core import config
+        from app.Utils import utils
+
+        importlib.reload(config)
+        utils = importlib.reload(utils)
+
+        stored_hash = utils.hash("benchmark-password")
+        # Warm the pool so process start-up is not measured
+        asyncio.run(run_burst(utils, stored_hash, args.workers))
+        elapsed = asyncio.run(run_burst(utils, stored_hash, args.logins))
+        utils.get_hash_pool().shutdown()
+
+        per_second = args.logins / elapsed
+        print(
+            f"rounds={rounds:<3} workers={args.workers:<3} logins={args.logins:<5} "
+            f"{per_second:8.1f} logins/s  {per_second / args.workers:7.1f} logins/s/core"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Media fixtures served by the local media server.
+
+With ffmpeg available real (tiny) media is generated: a progressive mp4 with audio,
+a video-only DASH mp4 and an audio-only m4a, so merges and mp3 extraction run for
+real. Without ffmpeg only a progressive file of random bytes is written, which is
+enough for the download path (no merge or post-processing).
+"""
+
+import json
+import os
+import shutil
+import subprocess
+
+MANIFEST = "manifest.json"
+
+
+def ffmpeg(*args: str) -> None:
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", *args], check=True
+    )
+
+
+def generate(directory: str, duration: int = 60, size_mb: int = 8) -> dict:
+    """Create the fixtures in `directory` (once) and return the manifest."""
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    os.makedirs(directory, exist_ok=True)
+    formats = []
+
+    if shutil.which("ffmpeg"):
+        testsrc = f"testsrc2=size=640x360:rate=25:duration={duration}"
+        tone = f"sine=frequency=440:duration={duration}"
+        ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            testsrc,
+            "-f",
+            "lavfi",
+            "-i",
+            tone,
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            "-shortest",
+            os.path.join(directory, "progressive.mp4"),
+        )
+        ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            testsrc.replace("640x360", "1920x1080"),
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-an",
+            os.path.join(directory, "video-1080.mp4"),
+        )
+        ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            tone,
+            "-c:a",
+            "aac",
+            "-vn",
+            os.path.join(directory, "audio.m4a"),
+        )
+        formats = [
+            {
+                "format_id": "18",
+                "file": "progressive.mp4",
+                "ext": "mp4",
+                "height": 360,
+                "vcodec": "avc1",
+                "acodec": "mp4a",
+            },
+            {
+                "format_id": "137",
+                "file": "video-1080.mp4",
+                "ext": "mp4",
+                "height": 1080,
+                "vcodec": "avc1",
+                "acodec": "none",
+            },
+            {
+                "format_id": "140",
+                "file": "audio.m4a",
+                "ext": "m4a",
+                "vcodec": "none",
+                "acodec": "mp4a",
+            },
+        ]
+    else:
+        with open(os.path.join(directory, "progressive.mp4"), "wb") as f:
+            f.write(os.urandom(size_mb * 1024 * 1024))
+        formats = [
+            {
+                "format_id": "18",
+                "file": "progressive.mp4",
+                "ext": "mp4",
+                "height": 360,
+                "vcodec": "avc1",
+                "acodec": "mp4a",
+            },
+        ]
+
+    for fmt in formats:
+        fmt["filesize"] = os.path.getsize(os.path.join(directory, fmt["file"]))
+
+    manifest = {"duration": duration, "formats": formats}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest
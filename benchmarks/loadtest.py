@@ -0,0 +1,334 @@
+"""Offline load test for /download, /download/batch, /history, /login and playlists.
+
+Everything runs on one machine without network access: YouTube is replaced by a
+yt-dlp plugin (benchmarks/plugins) that resolves every video to the fixtures served
+by a local media server. PostgreSQL and Redis must be running locally and the usual
+settings (Database_Connection, BROKER, BACKEND) must be set in the environment/.env.
+
+Eager mode runs the API in-process (httpx ASGI transport) with Celery in eager mode,
+so each download runs inside the request - useful to measure per-request cost:
+
+    python -m benchmarks.loadtest --mode eager --scenarios download history login
+
+Worker mode drives a running API against real Celery workers. Start the media server
+and the worker with the plugin on the path first:
+
+    python -m benchmarks.media_server --port 8765
+    BENCH_MEDIA_SERVER=http://127.0.0.1:8765 PYTHONPATH=benchmarks/plugins \\
+        celery -A app.Core.celery_worker.celery_worker.celery_app worker
+    uvicorn app.main:app
+    python -m benchmarks.loadtest --mode worker --base-url http://127.0.0.1:8000
+
+Reported per scenario: throughput (requests and videos per second), p50/p95/p99
+latency, errors and worker utilisation (share of worker capacity busy with tasks
+during the scenario). The batch scenario submits --batch-size videos per request.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(BENCH_DIR, "plugins")
+SCENARIOS = ("download", "batch", "history", "login", "playlist")
+
+
+# ---------------------- Worker utilisation ----------------------
+class EagerUtilisation:
+    """Busy time of tasks run in this process (eager mode), from Celery signals."""
+
+    def __init__(self):
+        from celery.signals import task_prerun, task_postrun
+
+        self.busy = 0.0
+        self._started = {}
+        self._lock = threading.Lock()
+        task_prerun.connect(self._prerun, weak=False)
+        task_postrun.connect(self._postrun, weak=False)
+
+    def _prerun(self, task_id=None, **kwargs):
+        self._started[task_id] = time.perf_counter()
+
+    def _postrun(self, task_id=None, **kwargs):
+        started = self._started.pop(task_id, None)
+        if started is not None:
+            with self._lock:
+                self.busy += time.perf_counter() - started
+
+    def start(self):
+        self.busy = 0.0
+
+    def stop(self, wall: float) -> float:
+        # Eager tasks run one at a time inside the event loop: capacity is one task
+        return self.busy / wall if wall else 0.0
+
+
+class WorkerUtilisation:
+    """Samples active tasks on the real workers via Celery's remote control."""
+
+    def __init__(self, celery_app, interval: float = 0.5):
+        self.celery_app = celery_app
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _capacity(self) -> int:
+        stats = self.celery_app.control.inspect(timeout=1).stats() or {}
+        return sum(s["pool"].get("max-concurrency", 1) for s in stats.values()) or 1
+
+    def _run(self):
+        capacity = self._capacity()
+        while not self._stop.is_set():
+            active = (
+                self.celery_app.control.inspect(timeout=self.interval).active() or {}
+            )
+            busy = sum(len(tasks) for tasks in active.values())
+            self.samples.append(min(1.0, busy / capacity))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.samples = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wall: float) -> float:
+        self._stop.set()
+        self._thread.join()
+        return statistics.fmean(self.samples) if self.samples else 0.0
+
+
+# ---------------------- Scenarios ----------------------
+async def wait_for_job(client, headers, job_id: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/jobs/{job_id}", headers=headers)
+        state = response.json().get("status")
+        if state == "SUCCESS":
+            return True
+        if state == "FAILURE":
+            return False
+        await asyncio.sleep(0.1)
+    return False
+
+
+# A fresh video ID per request unless cache hits are being measured
+def video_url(ctx, i: int) -> str:
+    if ctx.unique_videos:
+        video_id = f"b{i % ctx.unique_videos:010d}"
+    else:
+        video_id = "b" + uuid.uuid4().hex[:10]
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+async def run_download(client, ctx, i: int, playlist: bool = False) -> bool:
+    url = video_url(ctx, i)
+    if playlist:
+        url += "&list=PLbenchmark"
+    response = await client.post(
+        "/download",
+        json={"url": url, "format": ctx.format, "quality": ctx.quality},
+        headers=ctx.headers,
+    )
+    if response.status_code != 202:
+        return False
+    return await wait_for_job(
+        client, ctx.headers, response.json()["job_id"], ctx.job_timeout
+    )
+
+
+async def run_batch(client, ctx, i: int) -> bool:
+    items = [
+        {
+            "url": video_url(ctx, i * ctx.batch_size + n),
+            "format": ctx.format,
+            "quality": ctx.quality,
+        }
+        for n in range(ctx.batch_size)
+    ]
+    response = await client.post(
+        "/download/batch", json={"items": items}, headers=ctx.headers
+    )
+    if response.status_code != 202:
+        return False
+
+    batch_id = response.json()["batch_id"]
+    deadline = time.perf_counter() + ctx.job_timeout
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/download/batch/{batch_id}", headers=ctx.headers)
+        batch = response.json()
+        if batch.get("status") == "SUCCESS":
+            return batch["failed"] == 0
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def run_history(client, ctx, i: int) -> bool:
+    response = await client.get("/history", params={"limit": 50}, headers=ctx.headers)
+    return response.status_code in (200, 404)
+
+
+async def run_login(client, ctx, i: int) -> bool:
+    response = await client.post(
+        "/login", data={"username": ctx.email, "password": ctx.password}
+    )
+    return response.status_code == 200
+
+
+async def run_scenario(client, ctx, name: str, requests: int, concurrency: int) -> dict:
+    runner = {
+        "download": run_download,
+        "batch": run_batch,
+        "history": run_history,
+        "login": run_login,
+        "playlist": lambda c, x, i: run_download(c, x, i, playlist=True),
+    }[name]
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await runner(client, ctx, i)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    ctx.utilisation.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    utilisation = ctx.utilisation.stop(wall)
+
+    cuts = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    videos = requests * (ctx.batch_size if name == "batch" else 1)
+    return {
+        "scenario": name,
+        "requests": requests,
+        "throughput": requests / wall,
+        "videos_per_second": videos / wall,
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "errors": errors,
+        "utilisation": utilisation,
+    }
+
+
+def print_report(results: list) -> None:
+    print(
+        f"{'scenario':<10} {'requests':>8} {'req/s':>9} {'videos/s':>9} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'workers':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['requests']:>8} {r['throughput']:>9.1f} "
+            f"{r['videos_per_second']:>9.1f} "
+            f"{r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f} "
+            f"{r['errors']:>7} {r['utilisation']:>7.0%}"
+        )
+
+
+class Context:
+    pass
+
+
+async def main_async(args) -> None:
+    ctx = Context()
+    ctx.format = args.format
+    ctx.quality = args.quality
+    ctx.unique_videos = args.unique_videos
+    ctx.job_timeout = args.job_timeout
+    ctx.batch_size = args.batch_size
+    ctx.email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    ctx.password = "benchmark-password"
+
+    from app.Core.celery_worker.celery_worker import celery_app
+
+    if args.mode == "eager":
+        celery_app.conf.task_always_eager = True
+        # /jobs and /download/batch read job states from the result backend
+        celery_app.conf.task_store_eager_result = True
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://benchmark"
+        ctx.utilisation = EagerUtilisation()
+    else:
+        transport = None
+        base_url = args.base_url
+        ctx.utilisation = WorkerUtilisation(celery_app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=args.job_timeout
+    ) as client:
+        response = await client.post(
+            "/users/", json={"email": ctx.email, "password": ctx.password}
+        )
+        response.raise_for_status()
+        response = await client.post(
+            "/login", data={"username": ctx.email, "password": ctx.password}
+        )
+        response.raise_for_status()
+        ctx.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = []
+        for name in args.scenarios:
+            results.append(
+                await run_scenario(client, ctx, name, args.requests, args.concurrency)
+            )
+
+    print_report(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("eager", "worker"), default="eager")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--format", default="mp4")
+    parser.add_argument("--quality", default="360p")
+    parser.add_argument(
+        "--unique-videos",
+        type=int,
+        default=0,
+        help="cycle through this many video IDs (0 = new ID per request, no cache hits)",
+    )
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--job-timeout", type=float, default=300)
+    parser.add_argument("--media-port", type=int, default=0)
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, ".fixtures"))
+    args = parser.parse_args()
+
+    # The extractor plugin must be importable before yt-dlp loads its plugins
+    sys.path.insert(0, PLUGIN_DIR)
+    from . import fixtures, media_server
+
+    if args.mode == "eager" or "BENCH_MEDIA_SERVER" not in os.environ:
+        fixtures.generate(args.fixtures)
+        server = media_server.start(args.fixtures, port=args.media_port)
+        os.environ["BENCH_MEDIA_SERVER"] = f"http://127.0.0.1:{server.server_port}"
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
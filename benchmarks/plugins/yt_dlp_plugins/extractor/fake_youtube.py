@@ -0,0 +1,61 @@
+"""yt-dlp plugin that answers YouTube URLs from the local benchmark media server.
+
+yt-dlp loads plugins from any `yt_dlp_plugins` package on sys.path and tries them
+before its built-in extractors, so with `benchmarks/plugins` on the path (and
+BENCH_MEDIA_SERVER set) download_video runs unchanged without any network access.
+Every video ID maps to the same fixtures; `&list=` URLs return a playlist of
+BENCH_PLAYLIST_SIZE generated video IDs.
+"""
+
+import os
+
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class BenchmarkYoutubeIE(InfoExtractor):
+    IE_NAME = "youtube:benchmark"
+    _VALID_URL = r"https?://(?:www\.)?(?:youtube\.com/(?:watch\?v=)?|youtu\.be/)(?P<id>[\w-]{11})"
+
+    def _real_extract(self, url):
+        server = os.environ["BENCH_MEDIA_SERVER"].rstrip("/")
+        video_id = self._match_id(url)
+
+        if "list=" in url and not self.get_param("noplaylist"):
+            size = int(os.getenv("BENCH_PLAYLIST_SIZE", "10"))
+            entries = [
+                self.url_result(
+                    f"https://www.youtube.com/watch?v=bench{i:06d}", BenchmarkYoutubeIE
+                )
+                for i in range(size)
+            ]
+            return self.playlist_result(
+                entries, f"PLbench-{video_id}", "Benchmark playlist"
+            )
+
+        # Fetching the manifest stands in for the watch page / player requests
+        manifest = self._download_json(f"{server}/manifest.json", video_id)
+        formats = []
+        for fmt in manifest["formats"]:
+            formats.append(
+                {
+                    "format_id": fmt["format_id"],
+                    "url": f"{server}/{fmt['file']}?v={video_id}",
+                    "ext": fmt["ext"],
+                    "height": fmt.get("height"),
+                    "vcodec": fmt["vcodec"],
+                    "acodec": fmt["acodec"],
+                    "filesize": fmt["filesize"],
+                }
+            )
+
+        return {
+            "id": video_id,
+            "title": f"Benchmark video {video_id}",
+            "duration": manifest["duration"],
+            "view_count": 1000,
+            "like_count": 10,
+            "uploader": "Benchmark",
+            "thumbnail": f"{server}/thumbnail.jpg",
+            "upload_date": "20250101",
+            "formats": formats,
+        }
@@ -0,0 +1,39 @@
+import pytest
+from app.Core.Service import bandwidth
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch, redis_client):
+    monkeypatch.setattr(bandwidth, "get_redis", lambda: redis_client)
+
+
+def test_bursts_within_capacity_do_not_wait():
+    # 1000 B/s with BURST_SECONDS of credit
+    buckets = [("bandwidth:total", 1000)]
+    assert bandwidth.consume(buckets, 1000 * bandwidth.BURST_SECONDS) == 0
+
+
+def test_debt_is_paid_back_at_the_rate():
+    buckets = [("bandwidth:total", 1000)]
+    bandwidth.consume(buckets, 1000 * bandwidth.BURST_SECONDS)
+    # 500 bytes over the credit at 1000 B/s: half a second (less what refilled since)
+    assert 0.4 < bandwidth.consume(buckets, 500) <= 0.5
+
+
+def test_slowest_bucket_sets_the_pause():
+    buckets = [("bandwidth:total", 10_000), ("bandwidth:user:u1", 1000)]
+    assert bandwidth.consume(buckets, 3000) == pytest.approx(1.0, abs=0.1)
+
+
+def test_keys_expire_once_refilled(redis_client):
+    bandwidth.consume([("bandwidth:total", 1000)], 100)
+    ttl_ms = redis_client.pttl("bandwidth:total")
+    assert 0 < ttl_ms <= bandwidth.BURST_SECONDS * 1000 + 60_000
+
+
+def test_unlimited_buckets_are_left_out(monkeypatch):
+    monkeypatch.setattr(bandwidth, "BANDWIDTH_LIMIT_TOTAL", 0)
+    monkeypatch.setattr(bandwidth, "USER_BANDWIDTH_LIMIT", 500)
+    assert bandwidth.bandwidth_buckets("downloads.video", "u1") == [
+        ("bandwidth:user:u1", 500)
+    ]
@@ -0,0 +1,80 @@
+import io
+import sys
+import http.client
+import pytest
+from yt_dlp.networking import Response
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import DownloadError, ExtractorError
+from app.Core.Service.download import (
+    PermanentDownloadError,
+    TransientDownloadError,
+    is_transient,
+)
+
+
+def http_error(status: int) -> HTTPError:
+    return HTTPError(
+        Response(io.BytesIO(b""), "https://example.com", {}, status=status)
+    )
+
+
+# yt-dlp reports the underlying error through DownloadError.exc_info
+def download_error(cause: BaseException) -> DownloadError:
+    try:
+        raise cause
+    except BaseException:
+        return DownloadError(str(cause), exc_info=sys.exc_info())
+
+
+@pytest.mark.parametrize("status", [403, 429, 500, 503])
+def test_retryable_http_statuses_are_transient(status):
+    assert is_transient(download_error(http_error(status)))
+
+
+@pytest.mark.parametrize("status", [400, 404, 410])
+def test_other_http_statuses_are_permanent(status):
+    assert not is_transient(download_error(http_error(status)))
+
+
+@pytest.mark.parametrize(
+    "cause",
+    [
+        TransportError("connection reset"),
+        http.client.IncompleteRead(b""),
+        ConnectionResetError(),
+        TimeoutError(),
+    ],
+)
+def test_network_errors_are_transient(cause):
+    assert is_transient(download_error(cause))
+
+
+def test_errors_are_found_through_cause_and_context():
+    wrapped = ExtractorError("Unable to download webpage", cause=TimeoutError())
+    assert is_transient(download_error(wrapped))
+    try:
+        try:
+            raise ConnectionError("reset")
+        except ConnectionError:
+            raise RuntimeError("Download failed")
+    except RuntimeError as exc:
+        assert is_transient(exc)
+
+
+def test_expected_extractor_errors_are_permanent():
+    assert not is_transient(
+        download_error(ExtractorError("Private video", expected=True))
+    )
+
+
+def test_permanent_download_error_wins_over_its_cause():
+    try:
+        raise PermanentDownloadError("too long") from TimeoutError()
+    except PermanentDownloadError as exc:
+        assert not is_transient(exc)
+
+
+def test_unknown_errors_and_none_are_permanent():
+    assert not is_transient(None)
+    assert not is_transient(ValueError("bad format"))
+    assert not is_transient(TransientDownloadError("no cause"))
@@ -0,0 +1,27 @@
+from app.Core.Service.download_cache import make_cache_key
+
+
+def test_cache_key_is_stable_and_per_variant():
+    key = make_cache_key("abcdefghijk", "mp4", "720p")
+    assert key == make_cache_key("abcdefghijk", "mp4", "720p", None, None)
+    assert key != make_cache_key("abcdefghijk", "mp4", "1080p")
+    assert key != make_cache_key("abcdefghijk", "webm", "720p")
+    assert key != make_cache_key("bbbbbbbbbbb", "mp4", "720p")
+
+
+def test_cache_key_ignores_quality_for_audio():
+    assert make_cache_key("abcdefghijk", "mp3", "360p") == make_cache_key(
+        "abcdefghijk", "mp3", "1080p"
+    )
+
+
+def test_cache_key_separates_clips_and_accurate_trims():
+    full = make_cache_key("abcdefghijk", "mp4", "720p")
+    clip = make_cache_key("abcdefghijk", "mp4", "720p", "00:00:10", "00:00:20")
+    other = make_cache_key("abcdefghijk", "mp4", "720p", "00:00:10", "00:00:30")
+    accurate = make_cache_key(
+        "abcdefghijk", "mp4", "720p", "00:00:10", "00:00:20", accurate_trim=True
+    )
+    assert len({full, clip, other, accurate}) == 4
+    # Accurate trim only matters for clips
+    assert full == make_cache_key("abcdefghijk", "mp4", "720p", accurate_trim=True)
@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.Router import files
+
+ENTRY = SimpleNamespace(
+    cache_key="variant",
+    video_id="abcdefghijk",
+    quality="720p",
+    format="mp4",
+    start_time=None,
+    end_time=None,
+    accurate_trim=False,
+    file_path="/downloads/video.mp4",
+)
+LOCK_KEY = "storage:restore:variant"
+
+
+@pytest.fixture
+def published(monkeypatch, async_redis_client):
+    published = []
+
+    async def grant(pairs):
+        pass
+
+    monkeypatch.setattr(files, "get_async_redis", lambda: async_redis_client)
+    monkeypatch.setattr(files.ownership, "grant", grant)
+    monkeypatch.setattr(files.scheduling, "choose_queue", lambda *args: "q")
+    monkeypatch.setattr(
+        files.download_video,
+        "apply_async",
+        lambda args, task_id, **options: published.append(task_id),
+    )
+    return published
+
+
+def test_concurrent_restores_share_one_job(published, redis_client):
+    first = asyncio.run(files.restore_file(ENTRY, "u1"))
+    second = asyncio.run(files.restore_file(ENTRY, "u2"))
+    assert first == second
+    assert published == [first]
+    assert redis_client.get(LOCK_KEY) == first.encode()
+
+
+# A restore that could not be queued must not leave later requests waiting on it
+def test_failed_publish_releases_the_restore_lock(monkeypatch, published, redis_client):
+    def apply_async(*args, **options):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(files.download_video, "apply_async", apply_async)
+    with pytest.raises(ConnectionError):
+        asyncio.run(files.restore_file(ENTRY, "u1"))
+    assert not redis_client.exists(LOCK_KEY)
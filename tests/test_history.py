@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from app.Core.Service import history
+from app.Router.post import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    download_at = datetime(2026, 10, 18, 12, 30, 45, 123456)
+    assert decode_cursor(encode_cursor(download_at, 42)) == (download_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm8tc2VwYXJhdG9y", "YXxi"])
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+# A stand-in for the database write that rejects the jobs of one URL
+class FakeWriter:
+    def __init__(self, poison: str):
+        self.poison = poison
+        self.batches = []
+
+    def __call__(self, jobs: list) -> None:
+        if any(job["url"] == self.poison for job in jobs):
+            raise ValueError(
+                'null value in column "views" violates not-null constraint'
+            )
+        self.batches.append([job["url"] for job in jobs])
+
+
+def queue_jobs(client, *urls):
+    for url in urls:
+        job = {"user_id": "u1", "url": url, "result": [["/f", {"id": url}]]}
+        client.rpush(history.RESULTS_QUEUE_KEY, json.dumps(job))
+
+
+@pytest.fixture
+def writer(monkeypatch, redis_client):
+    writer = FakeWriter(poison="bad")
+    monkeypatch.setattr(history, "get_redis", lambda: redis_client)
+    monkeypatch.setattr(history, "save_download_results", writer)
+    return writer
+
+
+def test_flush_writes_queued_jobs_in_one_batch(writer, redis_client):
+    queue_jobs(redis_client, "a", "b", "c")
+    history.flush_download_results()
+    assert writer.batches == [["a", "b", "c"]]
+    assert redis_client.llen(history.RESULTS_QUEUE_KEY) == 0
+
+
+# A job the database rejects is set aside instead of blocking every later flush
+def test_poison_job_goes_to_dead_letters_and_the_rest_is_written(writer, redis_client):
+    queue_jobs(redis_client, "a", "bad", "c")
+    history.flush_download_results()
+    assert writer.batches == [["a"], ["c"]]
+    assert redis_client.llen(history.RESULTS_QUEUE_KEY) == 0
+    dead = redis_client.lrange(history.DEAD_RESULTS_KEY, 0, -1)
+    assert [json.loads(raw)["url"] for raw in dead] == ["bad"]
+
+    queue_jobs(redis_client, "d")
+    history.flush_download_results()
+    assert writer.batches[-1] == ["d"]
+
+
+def test_flush_leaves_the_queue_to_the_lock_holder(writer, redis_client):
+    queue_jobs(redis_client, "a")
+    lock = redis_client.lock(history.FLUSH_LOCK_KEY, timeout=history.FLUSH_LOCK_TIMEOUT)
+    assert lock.acquire(blocking=False)
+    history.flush_download_results()
+    assert writer.batches == []
+    lock.release()
+    history.flush_download_results()
+    assert writer.batches == [["a"]]
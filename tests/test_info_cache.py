@@ -0,0 +1,98 @@
+import copy
+import pytest
+from yt_dlp import YoutubeDL
+from app.Core.Service import info_cache
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+# An extracted (unprocessed) video: yt-dlp selects formats when processing it
+RAW = {
+    "id": "abcdefghijk",
+    "title": "A video",
+    "duration": 10,
+    "extractor": "youtube",
+    "extractor_key": "Youtube",
+    "webpage_url": URL,
+    "formats": [
+        {
+            "format_id": "137",
+            "url": "https://example.com/137",
+            "ext": "mp4",
+            "vcodec": "avc1",
+            "acodec": "none",
+            "width": 1920,
+            "height": 1080,
+            "tbr": 4000,
+            "filesize": 1000,
+            "protocol": "https",
+        },
+        {
+            "format_id": "140",
+            "url": "https://example.com/140",
+            "ext": "m4a",
+            "vcodec": "none",
+            "acodec": "mp4a",
+            "abr": 128,
+            "language": "de",
+            "filesize": 100,
+            "protocol": "https",
+        },
+        {
+            "format_id": "18",
+            "url": "https://example.com/18",
+            "ext": "mp4",
+            "vcodec": "avc1",
+            "acodec": "mp4a",
+            "width": 640,
+            "height": 360,
+            "filesize_approx": 50,
+            "protocol": "https",
+        },
+    ],
+}
+
+
+def probe(info: dict, format_spec: str) -> dict:
+    with YoutubeDL({"format": format_spec, "quiet": True}) as ydl:
+        processed = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        info = ydl.sanitize_info(processed)
+    # The processing time differs between two probes
+    info.pop("epoch", None)
+    return info
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch, redis_client):
+    monkeypatch.setattr(info_cache, "get_redis", lambda: redis_client)
+    info_cache._local.clear()
+
+
+# Round trip through both tiers, as another worker would read the entry
+def cache(info: dict) -> dict:
+    info_cache.set_info(URL, info)
+    info_cache._local.clear()
+    return info_cache.get_info(URL)
+
+
+# A download served from the cache selects its formats like one that probed again
+@pytest.mark.parametrize(
+    "cached_spec, spec",
+    [
+        ("18", "137+140"),
+        ("137", "18"),
+        ("137+140", "18"),
+        ("137+140", "140"),
+        ("137+140", "137+140"),
+    ],
+)
+def test_cached_probe_selects_like_a_fresh_one(cached_spec, spec):
+    cached = cache(probe(RAW, cached_spec))
+    assert probe(cached, spec) == probe(RAW, spec)
+
+
+# Only the fields of the selected format are stripped, not every key a format has
+def test_video_fields_shared_with_other_formats_are_kept():
+    cached = cache(probe({**RAW, "language": "en"}, "18"))
+    assert cached["language"] == "en"
+    for key in ("format_id", "requested_formats", "requested_downloads", "url"):
+        assert key not in cached
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from app.Core.Service import quota
+
+WINDOW_MS = quota.RATE_LIMIT_WINDOW_MS
+DAILY_KEY = quota.daily_key("u1", "20261018")
+RATE_KEY = quota.rate_key("u1")
+
+
+def reserve_script(client, n, daily_limit=10, now=1_000_000, rate_limit=5, token="t"):
+    return client.eval(
+        quota.RESERVE_SCRIPT,
+        2,
+        DAILY_KEY,
+        RATE_KEY,
+        n,
+        daily_limit,
+        now,
+        WINDOW_MS,
+        rate_limit,
+        token,
+        3600,
+    )
+
+
+def test_reserve_script_asks_for_seed_when_counter_missing(redis_client):
+    assert reserve_script(redis_client, 1) == [-1, 0]
+    assert redis_client.zcard(RATE_KEY) == 0
+
+
+def test_reserve_script_reserves_and_records_rate_entries(redis_client):
+    redis_client.set(DAILY_KEY, 2)
+    assert reserve_script(redis_client, 3, token="abc") == [1, 0]
+    assert int(redis_client.get(DAILY_KEY)) == 5
+    assert sorted(redis_client.zrange(RATE_KEY, 0, -1)) == [
+        b"abc:1",
+        b"abc:2",
+        b"abc:3",
+    ]
+
+
+# The daily limit answers with the delay passed in, not the counter's TTL
+def test_reserve_script_daily_limit_returns_seconds_until_reset(redis_client):
+    redis_client.set(DAILY_KEY, 9, ex=3600 + 7200)
+    assert reserve_script(redis_client, 2) == [0, 3600]
+    assert int(redis_client.get(DAILY_KEY)) == 9
+    assert redis_client.zcard(RATE_KEY) == 0
+
+
+def test_reserve_script_rate_limit_waits_for_oldest_entry(redis_client):
+    redis_client.set(DAILY_KEY, 0)
+    assert reserve_script(redis_client, 4, now=1_000_000, token="a") == [1, 0]
+    # 2 more would make 6 in the window: wait until the first entries leave it
+    assert reserve_script(redis_client, 2, now=1_010_000, token="b") == [0, 50]
+    assert int(redis_client.get(DAILY_KEY)) == 4
+    # Once the window has moved past them the reservation goes through
+    assert reserve_script(redis_client, 2, now=1_000_000 + WINDOW_MS + 1) == [1, 0]
+
+
+def test_reserve_seeds_counter_and_release_gives_everything_back(
+    monkeypatch, async_redis_client, redis_client
+):
+    async def count_downloads_today(db, user_id, now):
+        return 1
+
+    monkeypatch.setattr(quota, "get_async_redis", lambda: async_redis_client)
+    monkeypatch.setattr(quota, "count_downloads_today", count_downloads_today)
+
+    async def reserve_and_release():
+        day, token = await quota.reserve(None, "u2", 3)
+        assert int(redis_client.get(quota.daily_key("u2", day))) == 4
+        assert redis_client.zcard(quota.rate_key("u2")) == 3
+        await quota.release("u2", day, 3, token=token)
+        return day
+
+    day = asyncio.run(reserve_and_release())
+    assert int(redis_client.get(quota.daily_key("u2", day))) == 1
+    assert redis_client.zcard(quota.rate_key("u2")) == 0
+
+
+def test_reserve_over_daily_limit_raises_429(monkeypatch, async_redis_client):
+    async def count_downloads_today(db, user_id, now):
+        return quota.DOWNLOAD_LIMIT_PER_DAY
+
+    monkeypatch.setattr(quota, "get_async_redis", lambda: async_redis_client)
+    monkeypatch.setattr(quota, "count_downloads_today", count_downloads_today)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(quota.reserve(None, "u3"))
+    assert raised.value.status_code == 429
+    retry_after = int(raised.value.headers["Retry-After"])
+    assert 0 < retry_after <= quota.seconds_until_reset(datetime.utcnow()) + 1
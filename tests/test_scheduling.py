@@ -0,0 +1,73 @@
+import pytest
+from app.Core.Service import scheduling
+from app.Core.Service.scheduling import (
+    AUDIO_QUEUE,
+    LARGE_QUEUE,
+    VIDEO_QUEUE,
+    choose_queue,
+    estimate_size,
+)
+
+MB = 1024 * 1024
+
+INFO = {
+    "duration": 600,
+    "formats": [
+        {"vcodec": "avc1", "acodec": "none", "height": 720, "filesize": 100 * MB},
+        {"vcodec": "avc1", "acodec": "none", "height": 1080, "filesize": 300 * MB},
+        # Size from the bitrate: 8000 kbit/s over 600 s
+        {"vcodec": "vp9", "acodec": "none", "height": 2160, "tbr": 8000},
+        {"vcodec": "none", "acodec": "mp4a", "filesize_approx": 10 * MB},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def no_cached_probes(monkeypatch):
+    monkeypatch.setattr(scheduling.info_cache, "get_info", lambda url: None)
+
+
+def test_estimate_size_takes_best_video_up_to_height_plus_audio():
+    assert estimate_size(INFO, "720p") == 110 * MB
+    assert estimate_size(INFO, "1080p") == 310 * MB
+    assert estimate_size(INFO, "4K") == 8000 * 1000 // 8 * 600 + 10 * MB
+
+
+def test_estimate_size_scales_clips():
+    assert estimate_size(INFO, "720p", clip_length=60) == 11 * MB
+
+
+def test_estimate_size_without_sizes_is_unknown():
+    assert (
+        estimate_size({"duration": 60, "formats": [{"vcodec": "avc1"}]}, "720p") is None
+    )
+    assert estimate_size({}, "720p") is None
+
+
+def test_audio_goes_to_the_audio_queue():
+    assert choose_queue("u", "4K", "mp3", info=INFO) == AUDIO_QUEUE
+    assert choose_queue("u", "720p", "m4a") == AUDIO_QUEUE
+
+
+def test_video_is_split_on_the_estimated_size(monkeypatch):
+    monkeypatch.setattr(scheduling, "LARGE_DOWNLOAD_BYTES", 200 * MB)
+    assert choose_queue("u", "720p", "mp4", info=INFO) == VIDEO_QUEUE
+    assert choose_queue("u", "1080p", "mp4", info=INFO) == LARGE_QUEUE
+    # A short clip of a large variant stays on the video queue
+    assert (
+        choose_queue("u", "1080p", "mp4", "00:00:00", "00:01:00", info=INFO)
+        == VIDEO_QUEUE
+    )
+
+
+def test_cached_probe_is_used_when_no_info_is_given(monkeypatch):
+    monkeypatch.setattr(scheduling, "LARGE_DOWNLOAD_BYTES", 200 * MB)
+    monkeypatch.setattr(scheduling.info_cache, "get_info", lambda url: INFO)
+    assert choose_queue("u", "1080p", "mp4") == LARGE_QUEUE
+
+
+def test_without_a_probe_the_quality_decides():
+    assert choose_queue("u", "1080p", "mp4") == VIDEO_QUEUE
+    assert choose_queue("u", "2160p", "mp4") == LARGE_QUEUE
+    # Playlists are never sized from their probe
+    assert choose_queue("u", "720p", "mp4", info={"_type": "playlist"}) == VIDEO_QUEUE
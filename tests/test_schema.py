@@ -0,0 +1,29 @@
+import pytest
+from pydantic import ValidationError
+from app.Schema.metadata import DownloadRequest
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def test_clip_range_is_accepted():
+    request = DownloadRequest(
+        url=URL,
+        format="mp4",
+        quality="720p",
+        start_time="00:00:10",
+        end_time="00:01:00",
+    )
+    assert (request.start_time, request.end_time) == ("00:00:10", "00:01:00")
+
+
+# An empty or inverted clip is refused before any quota is reserved
+@pytest.mark.parametrize("end_time", ["00:00:10", "00:00:05"])
+def test_empty_or_inverted_clip_is_rejected(end_time):
+    with pytest.raises(ValidationError, match="end_time must be after start_time"):
+        DownloadRequest(
+            url=URL,
+            format="mp4",
+            quality="720p",
+            start_time="00:00:10",
+            end_time=end_time,
+        )
@@ -0,0 +1,76 @@
+import json
+from app.Core.Service import singleflight
+
+FLIGHT_KEY = singleflight.flight_key("variant")
+WAITERS_KEY = singleflight.waiters_key("variant")
+
+
+def join(client, job_id, waiter, ttl=60):
+    return client.eval(
+        singleflight.JOIN_SCRIPT,
+        2,
+        FLIGHT_KEY,
+        WAITERS_KEY,
+        job_id,
+        json.dumps(waiter),
+        ttl,
+    )
+
+
+def settle(client, job_id):
+    return client.eval(singleflight.SETTLE_SCRIPT, 2, FLIGHT_KEY, WAITERS_KEY, job_id)
+
+
+def test_first_join_leads_the_flight(redis_client):
+    assert join(redis_client, "job1", {"user_id": "u1"}) is None
+    assert redis_client.get(FLIGHT_KEY) == b"job1"
+    assert 0 < redis_client.ttl(FLIGHT_KEY) <= 60
+    assert redis_client.llen(WAITERS_KEY) == 0
+
+
+def test_later_joins_wait_on_the_leader(redis_client):
+    join(redis_client, "job1", {"user_id": "u1"})
+    assert join(redis_client, "job2", {"user_id": "u2"}) == b"job1"
+    assert join(redis_client, "job3", {"user_id": "u3"}) == b"job1"
+    assert [json.loads(w) for w in redis_client.lrange(WAITERS_KEY, 0, -1)] == [
+        {"user_id": "u2"},
+        {"user_id": "u3"},
+    ]
+
+
+def test_settle_returns_waiters_and_ends_the_flight(redis_client):
+    join(redis_client, "job1", {"user_id": "u1"})
+    join(redis_client, "job2", {"user_id": "u2"})
+    assert [json.loads(w) for w in settle(redis_client, "job1")] == [{"user_id": "u2"}]
+    assert not redis_client.exists(FLIGHT_KEY, WAITERS_KEY)
+    # The next submission leads a new flight
+    assert join(redis_client, "job3", {"user_id": "u3"}) is None
+
+
+# A leader whose flight expired and was taken over must not settle the new one
+def test_settle_by_another_job_changes_nothing(redis_client):
+    join(redis_client, "job1", {"user_id": "u1"})
+    join(redis_client, "job2", {"user_id": "u2"})
+    assert settle(redis_client, "old-job") == []
+    assert redis_client.get(FLIGHT_KEY) == b"job1"
+    assert redis_client.llen(WAITERS_KEY) == 1
+
+
+def test_complete_flight_records_every_waiter_despite_failures(
+    monkeypatch, redis_client
+):
+    join(redis_client, "job1", {"user_id": "u1", "url": "a"})
+    join(redis_client, "job2", {"user_id": "u2", "url": "b"})
+    join(redis_client, "job3", {"user_id": "u3", "url": "c"})
+    recorded = []
+
+    def record_result(result, user_id, url):
+        if user_id == "u2":
+            raise RuntimeError("database unavailable")
+        recorded.append(user_id)
+
+    monkeypatch.setattr(singleflight, "get_redis", lambda: redis_client)
+    monkeypatch.setattr(singleflight.history, "record_result", record_result)
+
+    assert singleflight.complete_flight([["/f", {"id": "v"}]], "variant", "job1") == 2
+    assert recorded == ["u3"]
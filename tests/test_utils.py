@@ -0,0 +1,14 @@
+from app.Utils.utils import clip_range, to_seconds
+
+
+def test_clip_range_needs_both_ends():
+    assert clip_range("00:00:10", "00:00:20") == ("00:00:10", "00:00:20", False)
+    assert clip_range("00:00:10", "00:00:20", True) == ("00:00:10", "00:00:20", True)
+    # One end only is a full download, and accurate trim does not apply to it
+    assert clip_range("00:00:10", None, True) == (None, None, False)
+    assert clip_range(None, "00:00:20") == (None, None, False)
+    assert clip_range(None, None) == (None, None, False)
+
+
+def test_to_seconds():
+    assert to_seconds("01:02:03") == 3723
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import date
+import pytest
+from celery import states
+from yt_dlp.utils import DownloadError, ExtractorError
+from app.Core.celery_worker.celery_worker import celery_app
+from app.Core.Service import video_metadata
+from app.Core.Service.download import TransientDownloadError
+from app.Core.Service.video_metadata import from_info
+
+
+def test_from_info_reads_the_video_fields():
+    metadata = from_info(
+        {
+            "id": "abcdefghijk",
+            "title": "A video",
+            "duration": 61.5,
+            "view_count": 1000,
+            "like_count": 10,
+            "uploader": "A channel",
+            "thumbnails": [
+                {"url": "https://i.ytimg.com/small.jpg", "preference": -5},
+                {"url": "https://i.ytimg.com/large.jpg", "preference": 0},
+            ],
+            "upload_date": "20261018",
+        }
+    )
+    assert metadata["duration"] == 61
+    assert (metadata["views"], metadata["likes"]) == (1000, 10)
+    assert metadata["thumbnail_url"] == "https://i.ytimg.com/large.jpg"
+    assert metadata["published_date"] == date(2026, 10, 18)
+
+
+# yt-dlp sets what it could not read to None (hidden counters, missing uploader)
+def test_from_info_fills_the_not_null_columns_of_sparse_info():
+    metadata = from_info(
+        {
+            "id": "abcdefghijk",
+            "title": None,
+            "duration": None,
+            "view_count": None,
+            "like_count": None,
+            "uploader": None,
+            "upload_date": None,
+        }
+    )
+    assert metadata["title"] == ""
+    assert metadata["duration"] == 0
+    assert metadata["views"] == 0
+    assert metadata["likes"] is None
+    assert metadata["channel"] == ""
+    assert metadata["thumbnail_url"] == ""
+    assert metadata["published_date"] == date(1970, 1, 1)
+
+
+def store_failure(client, task_id, exc):
+    backend = celery_app.backend
+    meta = {
+        "status": states.FAILURE,
+        "result": backend.prepare_exception(exc),
+        "task_id": task_id,
+    }
+    client.set(backend.get_key_for_task(task_id), backend.encode(meta))
+
+
+# Lookups answer 503 for probes YouTube failed and 404 for missing videos
+def test_wait_tells_transient_probe_failures_from_missing_videos(
+    monkeypatch, redis_client, async_redis_client
+):
+    monkeypatch.setattr(
+        video_metadata, "get_async_backend_redis", lambda: async_redis_client
+    )
+    store_failure(redis_client, "t1", TransientDownloadError("HTTP Error 429"))
+    store_failure(redis_client, "t2", DownloadError("Video unavailable"))
+
+    found = asyncio.run(
+        video_metadata.wait({"v1": "t1", "v2": "t2", "v3": "t3"}, timeout=0.2)
+    )
+    assert found == {
+        "v1": (None, video_metadata.UNAVAILABLE),
+        "v2": (None, video_metadata.NOT_FOUND),
+        "v3": (None, video_metadata.TIMED_OUT),
+    }
+
+
+# A stand-in for YoutubeDL whose extraction fails with `error`
+def failing_ydl(error):
+    class FailingYoutubeDL:
+        def __init__(self, options):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def extract_info(self, url, **options):
+            raise error
+
+    return FailingYoutubeDL
+
+
+def test_probe_raises_transient_failures_as_retryable(monkeypatch, redis_client):
+    monkeypatch.setattr(video_metadata, "get_redis", lambda: redis_client)
+    throttled = ExtractorError("Unable to download webpage", cause=TimeoutError())
+    monkeypatch.setattr(video_metadata, "YoutubeDL", failing_ydl(throttled))
+    with pytest.raises(TransientDownloadError):
+        video_metadata.probe_metadata("abcdefghijk")
+
+    removed = ExtractorError("Video unavailable", expected=True)
+    monkeypatch.setattr(video_metadata, "YoutubeDL", failing_ydl(removed))
+    with pytest.raises(ExtractorError):
+        video_metadata.probe_metadata("abcdefghijk")